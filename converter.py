@@ -1,20 +1,92 @@
 import os
 import sys
 import glob
+import functools
 import argparse
 import win32com.client
+import pythoncom
 import gc
 import shutil
+import signal
+import socket
+import struct
+import tempfile
+import subprocess
+import hashlib
+import json
+import sqlite3
 import logging
+import logging.handlers
+import multiprocessing
+import queue
+import threading
+import time
+import http.server
+import cProfile
+import inspect
+import io
+import pstats
+import zipfile
+import xml.etree.ElementTree as ET
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
 from pathlib import Path
 from datetime import datetime
+from collections import deque
+from itertools import count, zip_longest
 from dotenv import load_dotenv
 
+try:
+    import psutil  # Officeプロセスのメモリ監視用 (任意)
+except ImportError:
+    psutil = None
+
+try:
+    import olefile  # 旧形式・パスワード付きファイルの事前チェック用 (任意)
+except ImportError:
+    olefile = None
+
+try:
+    import pypdf  # PDFの後処理 (圧縮・メタデータ付与) 用 (任意)
+except ImportError:
+    pypdf = None
+
 # --- COM定数定義 ---
 ppSaveAsPDF = 32
+ppFixedFormatTypePDF = 2
+ppFixedFormatIntentScreen = 1
+ppFixedFormatIntentPrint = 2
 xlTypePDF = 0
+xlQualityStandard = 0
+xlQualityMinimum = 1
 xlSheetVisible = -1  # Excelの表示シート
+xlCalculationManual = -4135
+ppAlertsNone = 1
+wdAlertsNone = 0
+msoAutomationSecurityForceDisable = 3  # 開いたファイルのマクロを実行しない
 wdFormatPDF = 17
+wdExportFormatPDF = 17
+wdExportOptimizeForPrint = 0
+wdExportOptimizeForOnScreen = 1
+wdStatisticPages = 2
+
+LOGGER_NAME = "PDFConverter"
+TRACE_LOGGER_NAME = LOGGER_NAME + ".trace"  # 1件1行のJSON (--trace)
+EVENT_LOGGER_NAME = LOGGER_NAME + ".events"  # ワーカープロセスから親へ進捗イベントを送る経路
+JOURNAL_LOGGER_NAME = LOGGER_NAME + ".journal"  # ファイル毎の状態遷移 (--resume用)
+DONE_FOLDER_NAME = "done"
+QUARANTINE_FOLDER_NAME = "quarantine"  # 繰り返し失敗したファイルの移動先 (doneと同じ場所)
+SCAN_INDEX_FILE_NAME = "scan_index.json"
+CACHE_FILE_NAME = "conversion_cache.sqlite"
+CACHE_VERSION = 1  # 変換ロジック変更時に上げるとキャッシュを無効化できる
+HISTORY_FILE_NAME = "conversion_history.sqlite"
+JOURNAL_FILE_NAME = "conversion_journal.jsonl"
+FAILURES_FILE_NAME = "conversion_failures.sqlite"
+
+
+class NoVisibleSheetsError(Exception):
+    """ Excelブックに表示可能なシートが無い """
+
 
 def setup_logger(output_dir):
     """
@@ -23,9 +95,9 @@ def setup_logger(output_dir):
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     log_file_path = output_dir / f"conversion_log_{timestamp}.txt"
 
-    logger = logging.getLogger("PDFConverter")
+    logger = logging.getLogger(LOGGER_NAME)
     logger.setLevel(logging.INFO)
-    
+
     if logger.hasHandlers():
         logger.handlers.clear()
 
@@ -35,291 +107,3616 @@ def setup_logger(output_dir):
     file_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
     fh.setFormatter(file_formatter)
 
-    # ストリームハンドラ (コンソールへの表示)
-    sh = logging.StreamHandler()
-    sh.setLevel(logging.INFO)
-    console_formatter = logging.Formatter('%(message)s')
-    sh.setFormatter(console_formatter)
+    # ストリームハンドラ (コンソールへの表示)
+    sh = logging.StreamHandler()
+    sh.setLevel(logging.INFO)
+    console_formatter = logging.Formatter('%(message)s')
+    sh.setFormatter(console_formatter)
+
+    logger.addHandler(fh)
+    logger.addHandler(sh)
+
+    return logger, log_file_path
+
+def setup_trace(output_dir):
+    """
+    トレースの設定：1件毎の処理時間などをJSON Lines形式 (1件1行) でファイルへ出力する。
+    戻り値はトレースファイルのパスと、実行全体の集計 (TraceSummary)。
+    """
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    trace_file_path = output_dir / f"conversion_trace_{timestamp}.jsonl"
+
+    trace_logger = logging.getLogger(TRACE_LOGGER_NAME)
+    trace_logger.setLevel(logging.INFO)
+    trace_logger.propagate = False  # テキストログには出さない
+    trace_logger.handlers.clear()
+
+    fh = logging.FileHandler(trace_file_path, encoding='utf-8')
+    fh.setFormatter(logging.Formatter('%(message)s'))
+    summary = TraceSummary()
+
+    trace_logger.addHandler(fh)
+    trace_logger.addHandler(summary)
+
+    return trace_file_path, summary
+
+
+def emit_trace(record):
+    """ トレースへ1レコードを出力 (ワーカープロセスからはログと同じキューで親へ届く) """
+    logging.getLogger(TRACE_LOGGER_NAME).info(json.dumps(record, ensure_ascii=False), extra={'trace': record})
+
+
+def setup_journal(output_dir, resume=False):
+    """
+    ジャーナルの設定：ファイル毎の状態遷移 (queued → claimed → exported → moved、
+    または finished) を1行ずつ追記する。1件毎に書き出すため、異常終了しても直前までの状態が残る。
+    resume=Falseの場合は前回のジャーナルを破棄して新しく始める。戻り値はジャーナルのパス。
+    """
+    journal_path = output_dir / JOURNAL_FILE_NAME
+    if resume:
+        # 異常終了で途切れた行に続けて書かないよう、改行で終える
+        try:
+            with open(journal_path, 'rb+') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    f.write(b'\n')
+        except OSError:
+            pass
+    journal_logger = logging.getLogger(JOURNAL_LOGGER_NAME)
+    journal_logger.setLevel(logging.INFO)
+    journal_logger.propagate = False
+    journal_logger.handlers.clear()
+    fh = logging.FileHandler(journal_path, mode='a' if resume else 'w', encoding='utf-8', delay=True)
+    fh.setFormatter(logging.Formatter('%(message)s'))
+    journal_logger.addHandler(fh)
+    return journal_path
+
+
+def write_journal(state, file_path, **fields):
+    """ ジャーナルへ1件の状態を記録 (未設定なら何もしない。ワーカーからはログと同じキューで親へ届く) """
+    journal_logger = logging.getLogger(JOURNAL_LOGGER_NAME)
+    if not journal_logger.handlers:
+        return
+    record = {'ts': datetime.now().isoformat(timespec='milliseconds'), 'state': state,
+              'file': os.path.abspath(file_path)}
+    record.update(fields)
+    journal_logger.info(json.dumps(record, ensure_ascii=False))
+
+
+def replay_journal(journal_path, logger):
+    """
+    前回のジャーナルを読み、中断された処理を片付けて、まだ変換していないファイルを返す。
+    exportedのまま (PDFは確定済みで元ファイルの移動前) のファイルはdoneへ移動し、
+    claimedのまま (変換途中) のファイルは書きかけのPDFを削除して変換し直す。
+    """
+    states = {}  # 元ファイル -> 最後の記録 (最初に現れた順)
+    with open(journal_path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # 異常終了で途切れた行
+            states[record['file']] = record
+    pending = []
+    for file_name, record in states.items():
+        file_path = Path(file_name)
+        state = record['state']
+        if state in ('moved', 'finished'):
+            continue
+        if state == 'exported' and os.path.exists(record['pdf']):
+            if file_path.exists() and move_to_done(file_path, file_path.parent / DONE_FOLDER_NAME, logger):
+                write_journal('moved', file_path)
+            continue
+        if state == 'claimed':
+            try:
+                os.remove(partial_pdf_path(record['pdf']))
+                logger.info(f"[再開] 書きかけのPDFを削除: {file_path.name}")
+            except OSError:
+                pass
+        if file_path.exists():
+            pending.append(file_path)
+    return pending
+
+
+def percentile(values, pct):
+    """ 最近傍法によるパーセンタイル (valuesは空でないこと) """
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(pct / 100 * (len(values) - 1))))]
+
+
+class TraceSummary(logging.Handler):
+    """
+    トレースのレコードを形式毎に集計し、実行終了時に所要時間のパーセンタイルを求める。
+    スキップ・重複は変換していないため、所要時間の集計には含めない。
+    """
+    PERCENTILES = (50, 90, 95, 99)
+    TIMED_OUTCOMES = ('success', 'error', 'timeout')
+
+    def __init__(self):
+        super().__init__()
+        self.outcomes = {}
+        self.seconds = {}
+        self.phases = {}
+
+    def emit(self, record):
+        trace = getattr(record, 'trace', None)
+        if not trace or trace.get('type') != 'file':
+            return
+        kind = trace['kind']
+        outcomes = self.outcomes.setdefault(kind, {})
+        outcomes[trace['outcome']] = outcomes.get(trace['outcome'], 0) + 1
+        if trace['outcome'] in self.TIMED_OUTCOMES:
+            self.seconds.setdefault(kind, []).append(trace['seconds'])
+            phases = self.phases.setdefault(kind, {})
+            for name, seconds in trace['phases'].items():
+                phases[name] = phases.get(name, 0.0) + seconds
+
+    def summary(self):
+        """ 形式毎の件数・所要時間のパーセンタイル・工程別の合計時間 """
+        formats = {}
+        for kind, outcomes in self.outcomes.items():
+            seconds = self.seconds.get(kind, [])
+            entry = {'files': sum(outcomes.values()), 'outcomes': outcomes,
+                     'converted': len(seconds), 'total_seconds': round(sum(seconds), 3)}
+            if seconds:
+                for pct in self.PERCENTILES:
+                    entry[f'p{pct}'] = round(percentile(seconds, pct), 4)
+                entry['max'] = round(max(seconds), 4)
+            entry['phase_seconds'] = {name: round(value, 3) for name, value in self.phases.get(kind, {}).items()}
+            formats[kind] = entry
+        return {'type': 'summary', 'ts': datetime.now().isoformat(timespec='milliseconds'), 'formats': formats}
+
+
+@contextmanager
+def timed(timings, name):
+    """ ブロックの所要時間 (秒) をtimings[name]へ加算する """
+    begin = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - begin
+
+
+def move_to_done(file_path, done_folder, logger):
+    """
+    処理完了ファイルをdoneフォルダへ移動 (移動できたかを返す)
+    """
+    try:
+        done_folder.mkdir(exist_ok=True)
+        dst_path = done_folder / file_path.name
+        if dst_path.exists():
+            os.remove(dst_path) # 上書きのため既存削除
+        shutil.move(str(file_path), str(dst_path))
+    except Exception as e:
+        logger.warning(f"  [警告] ファイル移動失敗: {file_path.name} -> {e}")
+        return False
+    return True
+
+
+def partial_pdf_path(pdf_path):
+    """ 書き出し中のPDFの一時ファイル名 (拡張子は.pdfのまま。Officeが別の拡張子を付け足さないよう) """
+    base, ext = os.path.splitext(pdf_path)
+    return f"{base}.converting{ext}"
+
+
+def commit_output(tmp_path, pdf_path):
+    """ 書き出し終えた一時ファイルを正式な名前へ置き換える (途中で落ちても書きかけのPDFは残らない) """
+    os.replace(tmp_path, pdf_path)
+
+
+def new_stats():
+    """ 集計用の空の統計 """
+    return {'success': 0, 'skip': 0, 'error': 0, 'duplicate': 0, 'timeout': 0,
+            'rejected': 0, 'encrypted': 0, 'corrupt': 0, 'mismatch': 0,
+            'recycle': 0, 'recycle_seconds': 0.0, 'gc': 0, 'gc_seconds': 0.0, 'elsewhere': 0, 'backoff': 0, 'quarantined': 0,
+            'postprocessed': 0, 'postprocess_error': 0, 'pdf_bytes_in': 0, 'pdf_bytes_out': 0}
+
+
+def merge_stats(dst, src):
+    """ srcの件数をdstへ加算する (ワーカー毎の結果の集約用) """
+    for key, value in src.items():
+        dst[key] = dst.get(key, 0) + value
+    return dst
+
+
+def pdf_path_for(file_path, output_folder, source_root=None):
+    """ 出力PDFの絶対パス (source_root指定時は出力先に元のサブフォルダ構成を再現) """
+    pdf_name = file_path.with_suffix('.pdf').name
+    if output_folder:
+        if source_root is not None:
+            rel_dir = os.path.relpath(file_path.parent, source_root)
+            if rel_dir != os.curdir:
+                return str((output_folder / rel_dir / pdf_name).resolve())
+        return str((output_folder / pdf_name).resolve())
+    return str(file_path.with_suffix('.pdf').resolve())
+
+
+# --- フォルダ走査 ---
+
+class DirectoryIndex:
+    """
+    前回走査時のフォルダ更新時刻の記録 (JSON)。
+    更新時刻が変わらず変換対象も無かったフォルダは、次回の一覧取得を省略する。
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def get(self, folder):
+        return self.entries.get(folder)
+
+    def put(self, folder, mtime_ns, subdirs, pending):
+        self.entries[folder] = {'mtime_ns': mtime_ns, 'subdirs': subdirs, 'pending': pending}
+
+    def save(self):
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+def scan_files(target_folder, recursive=False, dir_index=None, exclude=()):
+    """
+    os.scandirで対象フォルダを1回だけ走査し、変換対象を (形式, Path) として順次返す。
+    done・quarantineフォルダとexcludeに含まれるフォルダ (出力先等) は対象外。
+    """
+    excluded = {os.path.normcase(os.path.abspath(p)) for p in exclude if p}
+    stack = [str(target_folder)]
+    while stack:
+        folder = stack.pop()
+
+        mtime_ns = None
+        if dir_index is not None:
+            try:
+                mtime_ns = os.stat(folder).st_mtime_ns
+            except OSError:
+                continue
+            entry = dir_index.get(folder)
+            if entry and entry['mtime_ns'] == mtime_ns and not entry['pending']:
+                # 前回から変化なし: 一覧は取得せずサブフォルダだけ辿る
+                if recursive:
+                    stack.extend(reversed(entry['subdirs']))
+                continue
+
+        subdirs = []
+        pending = False
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in (DONE_FOLDER_NAME, QUARANTINE_FOLDER_NAME) and \
+                                os.path.normcase(os.path.abspath(entry.path)) not in excluded:
+                            subdirs.append(entry.path)
+                        continue
+                    kind = EXTENSION_KINDS.get(os.path.splitext(entry.name)[1].lower())
+                    if kind:
+                        pending = True
+                        yield kind, Path(entry.path)
+        except OSError:
+            continue
+
+        if dir_index is not None:
+            dir_index.put(folder, mtime_ns, subdirs, pending)
+        if recursive:
+            stack.extend(reversed(subdirs))
+
+
+def classify_paths(paths):
+    """ 指定されたパスを拡張子で形式毎に振り分け、走査結果と同じ (形式, Path) の形で返す (対象外は除く) """
+    for path in paths:
+        path = Path(path)
+        kind = EXTENSION_KINDS.get(path.suffix.lower())
+        if kind:
+            yield kind, path
+
+
+def source_files(target_folder, paths=None, **scan_options):
+    """ 変換対象の (形式, Path)。pathsを指定した場合はフォルダを走査せず、そのファイルだけを対象にする """
+    if paths is not None:
+        return classify_paths(paths)
+    return scan_files(target_folder, **scan_options)
+
+
+def group_files(target_folder, paths=None, **scan_options):
+    """ 走査結果を形式毎のリストにまとめる """
+    groups = {kind: [] for kind in APP_CLASSES}
+    for kind, file_path in source_files(target_folder, paths, **scan_options):
+        groups[kind].append(file_path)
+    return groups
+
+
+def find_files(target_folder, kind, **scan_options):
+    """ 対象フォルダから指定形式のファイルを列挙 """
+    return [file_path for k, file_path in scan_files(target_folder, **scan_options) if k == kind]
+
+
+class OutputIndex:
+    """
+    出力先フォルダのファイル名一覧をフォルダ毎に1回だけ読み込んで保持し、
+    PDF既存判定をファイル毎のアクセス無しで行う。
+    """
+
+    def __init__(self):
+        self._folders = {}
+        self._lock = threading.Lock()
+
+    def _names(self, folder):
+        key = os.path.normcase(folder)
+        names = self._folders.get(key)
+        if names is None:
+            try:
+                with os.scandir(folder) as entries:
+                    names = {os.path.normcase(entry.name) for entry in entries}
+            except OSError:
+                names = set()
+            self._folders[key] = names
+        return names
+
+    def exists(self, pdf_path):
+        folder, name = os.path.split(pdf_path)
+        with self._lock:
+            return os.path.normcase(name) in self._names(folder)
+
+    def add(self, pdf_path):
+        folder, name = os.path.split(pdf_path)
+        with self._lock:
+            self._names(folder).add(os.path.normcase(name))
+
+
+# --- 変換キャッシュ (内容ハッシュによるスキップ・重複排除) ---
+
+def file_hash(file_path, chunk_size=1024 * 1024):
+    """ ファイル内容のSHA-256 """
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def file_size(path):
+    """ ファイルサイズ (バイト)。存在しない場合はNone """
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+
+def link_or_copy(src, dst):
+    """ ハードリンクで複製し、できない場合 (別ボリューム等) はコピー """
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+class IoQueue:
+    """
+    PDFの確定 (リネーム) や元ファイルのdoneへの移動を、変換スレッドとは別の1本のスレッドで
+    投入順に行う。ネットワーク共有上の移動 (コピーと削除) をOfficeが待たずに済む。
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._pending = []  # (ファイル名, Future)
+
+    def submit(self, name, fn, *args):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="io")
+        future = self._executor.submit(fn, *args)
+        self._pending.append((name, future))
+        return future
+
+    def drain(self):
+        """ 投入済みの処理の完了を待ち、失敗した (ファイル名, 例外) の一覧を返す """
+        failures = []
+        for name, future in self._pending:
+            try:
+                future.result()
+            except Exception as e:
+                failures.append((name, e))
+        self._pending = []
+        return failures
+
+    def close(self):
+        failures = self.drain()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        return failures
+
+
+class StagingArea:
+    """
+    ネットワーク共有上のファイルを、ローカルの作業フォルダを経由して変換する。
+    変換中に次のahead件の元ファイルをバックグラウンドでコピーしておき、Officeにはローカルのコピーを開かせる。
+    PDFもローカルに書き出し、I/Oスレッドが出力先へアップロードする。
+    作業フォルダの使用量 (コピー済みの元ファイルとアップロード待ちのPDF) はbudget_mbまでに抑え、
+    それより大きいファイルはコピーせず元の場所から開く。
+    ConversionCacheと同様、ワーカープロセスへは設定だけを引き継ぎ、各プロセスが自分の作業フォルダを作る。
+    """
+
+    def __init__(self, root=None, ahead=4, budget_mb=1024):
+        self.root = root
+        self.ahead = ahead
+        self.budget_mb = budget_mb
+        self.budget = budget_mb * 1024 * 1024
+        self._cond = threading.Condition()
+        self._used = 0
+        self._closed = False
+        self._dir = None
+        self._executor = None
+        self._staged = {}  # 元ファイル -> Future ((ローカルのパス, サイズ) またはNone)
+        self._seq = count()
+
+    def __getstate__(self):
+        return {'root': self.root, 'ahead': self.ahead, 'budget_mb': self.budget_mb}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    @property
+    def directory(self):
+        with self._cond:
+            if self._dir is None:
+                if self.root:
+                    os.makedirs(self.root, exist_ok=True)
+                self._dir = tempfile.mkdtemp(prefix="pdf-stage-", dir=self.root)
+            return self._dir
+
+    def _local_name(self, name):
+        # 同名ファイルが別フォルダにあっても衝突しないよう連番を付ける
+        return os.path.join(self.directory, f"{next(self._seq)}-{name}")
+
+    def _reserve(self, size):
+        """ 使用量に空きができるまで待って確保する。空なら予算超過でも1件は通す """
+        with self._cond:
+            while self._used and self._used + size > self.budget and not self._closed:
+                self._cond.wait()
+            if self._closed:
+                raise RuntimeError("staging area is closed")
+            self._used += size
+
+    def _release(self, size):
+        with self._cond:
+            self._used -= size
+            self._cond.notify_all()
+
+    def _copy(self, file_path):
+        size = os.path.getsize(file_path)
+        if size > self.budget:
+            return None
+        self._reserve(size)
+        local = self._local_name(file_path.name)
+        try:
+            shutil.copyfile(file_path, local)
+        except BaseException:
+            if os.path.exists(local):
+                os.remove(local)
+            self._release(size)
+            raise
+        return local, size
+
+    def prefetch(self, files, wanted=None):
+        """
+        filesを順に返しつつ、その先のahead件をバックグラウンドでコピーする。
+        wantedを渡すと、それがFalseを返すファイル (変換不要と分かっているもの) はコピーしない。
+        """
+        with self._cond:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stage")
+        window = deque()
+        try:
+            for file_path in files:
+                if wanted is None or wanted(file_path):
+                    self._staged[file_path] = self._executor.submit(self._copy, file_path)
+                window.append(file_path)
+                if len(window) > self.ahead:
+                    yield window.popleft()
+            while window:
+                yield window.popleft()
+        finally:
+            # 中断時: 変換しなかったファイルのコピーを取り消す
+            for file_path in window:
+                self.release_input(file_path)
+
+    def local_copy(self, file_path):
+        """ コピーの完了を待ってローカルのパスを返す。コピーしていない場合はNone (失敗時は例外) """
+        future = self._staged.get(file_path)
+        if future is None:
+            return None
+        result = future.result()
+        return result[0] if result else None
+
+    def release_input(self, file_path):
+        """ 変換を終えた元ファイルのコピーを削除する """
+        future = self._staged.pop(file_path, None)
+        if future is None or future.cancel():
+            return
+        try:
+            result = future.result()
+        except Exception:
+            return
+        if result:
+            local, size = result
+            try:
+                os.remove(local)
+            except OSError:
+                pass
+            self._release(size)
+
+    def output_path(self, pdf_path):
+        """ Officeに書き出させるローカルのPDFのパス """
+        return self._local_name(os.path.basename(pdf_path))
+
+    def hold_output(self, local_pdf):
+        """ アップロード待ちのPDFを使用量に加える (変換は止めない) """
+        size = os.path.getsize(local_pdf)
+        with self._cond:
+            self._used += size
+        return size
+
+    def upload(self, local_pdf, dst_path):
+        """ (I/Oスレッド) ローカルのPDFを出力先へコピーし、ローカルからは削除する """
+        size = os.path.getsize(local_pdf)
+        try:
+            shutil.copyfile(local_pdf, dst_path)
+        finally:
+            os.remove(local_pdf)
+            self._release(size)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+        self._staged = {}
+        if self._dir is not None:
+            shutil.rmtree(self._dir, ignore_errors=True)
+            self._dir = None
+        with self._cond:
+            self._used = 0
+            self._closed = False
+
+
+class LeaseQueue:
+    """
+    共有フォルダ上のリースファイルで、複数のホストが同じ入力フォルダを重複なく分担する。
+    変換前にファイル毎のリース (<キー>.lease) を排他作成 (O_EXCL) で取得し、取得できたホストだけが変換する。
+    保持中のリースは定期的に更新し、ttl秒更新されないリース (ホストの停止等) は他のホストが引き継ぐ。
+    変換を終えたファイルは完了記録 (<キー>.done) を残し、同じ内容のままなら他のホストは処理しない。
+    キーは入力フォルダ (root) からの相対パスで作るため、ホスト毎にドライブ割り当て等が違ってもよい。
+    ConversionCacheと同様、ワーカープロセスへは設定だけを引き継ぐ。
+    """
+
+    def __init__(self, lease_dir, root=None, host=None, ttl=300.0, retention_days=7):
+        self.lease_dir = str(lease_dir)
+        self.root = str(root) if root is not None else None
+        self.host = host or socket.gethostname()
+        self.ttl = ttl
+        self.retention_days = retention_days
+        self.owner = f"{self.host}/{os.getpid()}/{time.time_ns()}"
+        self._lock = threading.Lock()
+        self._held = {}  # キー -> (リースのパス, サイズ, 更新日時)
+        self._ready = False
+        self._stop = threading.Event()
+        self._heartbeat = None
+
+    def __getstate__(self):
+        return {'lease_dir': self.lease_dir, 'root': self.root, 'host': self.host, 'ttl': self.ttl,
+                'retention_days': self.retention_days}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def _prepare(self):
+        """ 初回のみ: フォルダを作り、古い完了記録と引き継ぎ残りを消す """
+        with self._lock:
+            if self._ready:
+                return
+            os.makedirs(self.lease_dir, exist_ok=True)
+            cutoff = time.time() - self.retention_days * 86400
+            with os.scandir(self.lease_dir) as entries:
+                for entry in entries:
+                    try:
+                        if entry.name.endswith('.stale') or (
+                                entry.name.endswith('.done') and entry.stat().st_mtime < cutoff):
+                            os.remove(entry.path)
+                    except OSError:
+                        pass
+            self._ready = True
+
+    def key(self, file_path):
+        path = os.path.abspath(file_path)
+        if self.root is not None:
+            try:
+                path = os.path.relpath(path, self.root)
+            except ValueError:  # 別ドライブ
+                pass
+        return hashlib.sha1(os.path.normcase(path).replace(os.sep, '/').encode('utf-8')).hexdigest()
+
+    def _path(self, key, suffix):
+        return os.path.join(self.lease_dir, key + suffix)
+
+    def is_done(self, key, size, mtime_ns):
+        """ 同じ内容 (サイズ・更新日時) のファイルが他のホスト等で処理済みか """
+        try:
+            with open(self._path(key, '.done'), encoding='utf-8') as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return False
+        return record.get('size') == size and record.get('mtime_ns') == mtime_ns
+
+    def _expired(self, lease_path):
+        try:
+            return time.time() - os.path.getmtime(lease_path) > self.ttl
+        except FileNotFoundError:
+            return True
+
+    def _create(self, lease_path, file_path):
+        fd = os.open(lease_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'owner': self.owner, 'file': str(file_path),
+                       'acquired': datetime.now().isoformat(timespec='seconds')}, f)
+
+    def _take_over(self, lease_path):
+        """ 期限切れのリースを退避する。リネームは1ホストしか成功しないため、引き継ぎも1ホストに限られる """
+        stale = f"{lease_path}.{self.host}.{os.getpid()}.{threading.get_ident()}.stale"
+        try:
+            os.rename(lease_path, stale)
+        except OSError:
+            return False
+        if not self._expired(stale):
+            # 退避する直前に持ち主が更新した: 返して諦める
+            try:
+                os.rename(stale, lease_path)
+            except OSError:
+                pass
+            return False
+        os.remove(stale)
+        return True
+
+    def claim(self, file_path):
+        """ リースを取得してキーを返す。他のホストが処理中・処理済みの場合はNone """
+        self._prepare()
+        key = self.key(file_path)
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return None
+        if self.is_done(key, st.st_size, st.st_mtime_ns):
+            return None
+        lease_path = self._path(key, '.lease')
+        try:
+            self._create(lease_path, file_path)
+        except FileExistsError:
+            if not self._expired(lease_path) or not self._take_over(lease_path):
+                return None
+            try:
+                self._create(lease_path, file_path)
+            except FileExistsError:
+                return None
+        # 取得までの間に他のホストが完了させていないか確認する
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            st = None
+        if st is None or self.is_done(key, st.st_size, st.st_mtime_ns):
+            self._remove(lease_path)
+            return None
+        with self._lock:
+            self._held[key] = (lease_path, st.st_size, st.st_mtime_ns)
+            if self._heartbeat is None:
+                self._stop.clear()
+                self._heartbeat = threading.Thread(target=self._renew, name="lease-heartbeat", daemon=True)
+                self._heartbeat.start()
+        return key
+
+    def _owns(self, lease_path):
+        """ リースがまだ自分のものか (更新が遅れて他のホストに引き継がれていないか) """
+        try:
+            with open(lease_path, encoding='utf-8') as f:
+                return json.load(f).get('owner') == self.owner
+        except (OSError, ValueError):
+            return False
+
+    def _renew(self):
+        while not self._stop.wait(self.ttl / 3):
+            with self._lock:
+                paths = [lease_path for lease_path, _, _ in self._held.values()]
+            for lease_path in paths:
+                if self._owns(lease_path):
+                    try:
+                        os.utime(lease_path)
+                    except OSError:
+                        pass
+
+    def _remove(self, lease_path):
+        if self._owns(lease_path):
+            try:
+                os.remove(lease_path)
+            except OSError:
+                pass
+
+    def complete(self, key, outcome):
+        """ 完了を記録してリースを返す (記録を先に書くため、他のホストが取り違えることはない) """
+        with self._lock:
+            lease_path, size, mtime_ns = self._held.pop(key)
+        done_path = self._path(key, '.done')
+        tmp_path = f"{done_path}.{self.host}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'owner': self.owner, 'outcome': outcome, 'size': size, 'mtime_ns': mtime_ns,
+                       'finished': datetime.now().isoformat(timespec='seconds')}, f)
+        os.replace(tmp_path, done_path)
+        self._remove(lease_path)
+
+    def release(self, key):
+        """ 完了を記録せずにリースを返す (Office停止等で変換できなかった場合) """
+        with self._lock:
+            lease_path, _, _ = self._held.pop(key)
+        self._remove(lease_path)
+
+    def close(self):
+        with self._lock:
+            held = list(self._held)
+        for key in held:
+            self.release(key)
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+            self._heartbeat = None
+
+
+class ConversionCache:
+    """
+    変換結果のマニフェスト (SQLite)。
+    出力PDF毎に、元ファイルの内容ハッシュと変換設定を記録する。
+    ワーカープロセスへ渡す際はパスだけを引き継ぎ、各プロセスで接続し直す。
+    """
+
+    def __init__(self, db_path):
+        self.db_path = str(db_path)
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def __getstate__(self):
+        return {'db_path': self.db_path}
+
+    def __setstate__(self, state):
+        self.__init__(state['db_path'])
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS manifest ("
+                " pdf_path TEXT PRIMARY KEY,"
+                " source_name TEXT NOT NULL,"
+                " content_hash TEXT NOT NULL,"
+                " settings TEXT NOT NULL,"
+                " converted_at TEXT NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS manifest_hash ON manifest (content_hash, settings)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def lookup(self, pdf_path):
+        """ 出力PDFに対応する記録 (content_hash, settings) """
+        with self._lock:
+            return self.conn.execute(
+                "SELECT content_hash, settings FROM manifest WHERE pdf_path = ?", (pdf_path,)
+            ).fetchone()
+
+    def find_duplicate(self, content_hash, settings, pdf_path):
+        """ 同一内容・同一設定で変換済みの別PDF (現存するもの) """
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT pdf_path FROM manifest WHERE content_hash = ? AND settings = ? AND pdf_path != ?",
+                (content_hash, settings, pdf_path)
+            ).fetchall()
+        for (path,) in rows:
+            if os.path.exists(path):
+                return path
+        return None
+
+    def record(self, source_name, pdf_path, content_hash, settings):
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO manifest VALUES (?, ?, ?, ?, ?)",
+                (pdf_path, source_name, content_hash, settings, datetime.now().isoformat())
+            )
+            self.conn.commit()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class FailureRegistry:
+    """
+    変換に失敗したファイルの記録 (SQLite)。内容ハッシュ毎に、失敗の種類・回数と次に再試行してよい日時を持つ。
+    再試行までの間隔は失敗する度に倍にし (retry_after秒, その2倍, 4倍 ...)、quarantine_after回失敗したら
+    元ファイルをdoneと同じ場所のquarantineフォルダへ移す (0の場合は移さない)。
+    記録するのは文書自体の失敗 (エラー・事前チェックでの除外) のみで、タイムアウトやOfficeの異常終了は数えない。
+    失敗の記録が無いサイズのファイルはハッシュを計算せずに通すため、正常なファイルの処理は遅くならない。
+    ConversionCacheと同様、ワーカープロセスへは設定だけを引き継ぐ。
+    """
+
+    def __init__(self, db_path, quarantine_after=0, retry_after=3600.0):
+        self.db_path = str(db_path)
+        self.quarantine_after = quarantine_after
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._conn = None
+        self._sizes = set()
+
+    def __getstate__(self):
+        return {'db_path': self.db_path, 'quarantine_after': self.quarantine_after,
+                'retry_after': self.retry_after}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS failures ("
+                " content_hash TEXT PRIMARY KEY,"
+                " source_name TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " category TEXT NOT NULL,"
+                " error TEXT,"
+                " attempts INTEGER NOT NULL,"
+                " failed_at TEXT NOT NULL,"
+                " retry_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+            self._sizes = {size for (size,) in self._conn.execute("SELECT DISTINCT size FROM failures")}
+        return self._conn
+
+    def may_have_failed(self, size):
+        """ 同じサイズの失敗記録があるか (無ければ内容ハッシュを調べるまでもない) """
+        with self._lock:
+            self.conn  # 接続時に記録済みのサイズを読み込む
+            return size in self._sizes
+
+    def lookup(self, content_hash):
+        """ 失敗の記録 (category, attempts, retry_at)。無ければNone """
+        with self._lock:
+            return self.conn.execute(
+                "SELECT category, attempts, retry_at FROM failures WHERE content_hash = ?", (content_hash,)
+            ).fetchone()
+
+    def record(self, content_hash, source_name, size, category, error):
+        """ 失敗を1回分記録し、通算の失敗回数を返す """
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT attempts FROM failures WHERE content_hash = ?", (content_hash,)
+            ).fetchone()
+            attempts = (row[0] if row else 0) + 1
+            retry_at = time.time() + self.retry_after * 2 ** (attempts - 1)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO failures VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (content_hash, source_name, size, category, error, attempts, datetime.now().isoformat(), retry_at)
+            )
+            self.conn.commit()
+            self._sizes.add(size)
+        return attempts
+
+    def clear(self, content_hash):
+        """ 変換できたファイルの失敗記録を消す """
+        with self._lock:
+            self.conn.execute("DELETE FROM failures WHERE content_hash = ?", (content_hash,))
+            self.conn.commit()
+
+    def should_quarantine(self, attempts):
+        return bool(self.quarantine_after) and attempts >= self.quarantine_after
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+# --- 変換履歴と所要時間の見積もり (長いものから順に割り当てる) ---
+
+class ConversionHistory:
+    """
+    1件毎の変換実績 (SQLite)。形式・ファイル名・サイズ毎に直近の所要時間とページ数を記録し、
+    次回以降の所要時間の見積もり (estimator) に使う。
+    ConversionCacheと同様、ワーカープロセスへはパスだけを引き継ぐ。
+    """
+
+    def __init__(self, db_path):
+        self.db_path = str(db_path)
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def __getstate__(self):
+        return {'db_path': self.db_path}
+
+    def __setstate__(self, state):
+        self.__init__(state['db_path'])
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS history ("
+                " kind TEXT NOT NULL,"
+                " source_name TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " pages INTEGER,"
+                " sheets INTEGER,"
+                " seconds REAL NOT NULL,"
+                " outcome TEXT NOT NULL,"
+                " converted_at TEXT NOT NULL,"
+                " PRIMARY KEY (kind, source_name, size))"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def record(self, kind, source_name, size, seconds, outcome, pages=None, sheets=None):
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO history VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (kind, source_name, size, pages, sheets, seconds, outcome, datetime.now().isoformat())
+            )
+            self.conn.commit()
+
+    def estimator(self):
+        """ 現在の履歴から見積もり用のモデルを作る """
+        with self._lock:
+            rows = self.conn.execute("SELECT kind, source_name, size, seconds FROM history").fetchall()
+        return RunTimeEstimator(rows)
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class RunTimeEstimator:
+    """
+    1件の所要時間 (秒) の見積もり。
+    同名・同サイズの実績があればその時間、無ければ形式毎にサイズからの一次式 (最小二乗) で求める。
+    履歴の無い形式は全形式の実績から、履歴が全く無い場合は仮の値 (DEFAULT_SECONDS + サイズ比例) を使う。
+    """
+    DEFAULT_SECONDS = 1.0
+    DEFAULT_SECONDS_PER_MB = 1.0
+
+    def __init__(self, rows):
+        self.exact = {}
+        samples = {}
+        for kind, name, size, seconds in rows:
+            self.exact[(kind, name, size)] = seconds
+            samples.setdefault(kind, []).append((size, seconds))
+            samples.setdefault(None, []).append((size, seconds))
+        self.models = {kind: self._fit(points) for kind, points in samples.items()}
+
+    @staticmethod
+    def _fit(points):
+        """ seconds = a + b * size を当てはめ (a, b) を返す (サイズが1種類しか無い場合は中央値) """
+        n = len(points)
+        mean_x = sum(x for x, _ in points) / n
+        mean_y = sum(y for _, y in points) / n
+        var_x = sum((x - mean_x) ** 2 for x, _ in points)
+        if var_x == 0:
+            return percentile([y for _, y in points], 50), 0.0
+        b = max(0.0, sum((x - mean_x) * (y - mean_y) for x, y in points) / var_x)
+        return max(0.0, mean_y - b * mean_x), b
+
+    def has_history(self, kind):
+        return kind in self.models
+
+    def estimate(self, kind, name, size):
+        size = size or 0
+        if (kind, name, size) in self.exact:
+            return self.exact[(kind, name, size)]
+        model = self.models.get(kind) or self.models.get(None)
+        if model is None:
+            return self.DEFAULT_SECONDS + self.DEFAULT_SECONDS_PER_MB * size / (1024 * 1024)
+        a, b = model
+        return a + b * size
+
+    def estimate_file(self, kind, file_path):
+        return self.estimate(kind, file_path.name, file_size(file_path))
+
+
+def partition_longest_first(items, n, weight):
+    """
+    LPT法: 重いものから順に、その時点で合計が最も小さいチャンクへ割り当てる。
+    戻り値は (合計, チャンク) のリスト (空のチャンクは除く、各チャンク内も重い順)。
+    """
+    chunks = [[0.0, i, []] for i in range(n)]
+    for item in sorted(items, key=weight, reverse=True):
+        chunk = min(chunks, key=lambda c: (c[0], c[1]))
+        chunk[0] += weight(item)
+        chunk[2].append(item)
+    return [(total, files) for total, _, files in chunks if files]
+
+
+def makespan(durations, n):
+    """ n並列で処理した場合の見込み所要時間 (LPT法で割り当てた最大の合計) """
+    if not durations:
+        return 0.0
+    return max(total for total, _ in partition_longest_first(durations, n, lambda d: d))
+
+
+def format_seconds(seconds):
+    """ 秒数を「1時間2分3秒」の形式にする """
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    if hours:
+        return f"{hours}時間{minutes}分{secs}秒"
+    if minutes:
+        return f"{minutes}分{secs}秒"
+    return f"{secs}秒"
+
+
+# --- Officeインスタンスの再起動 (リサイクル) ---
+
+def office_pids(process_name):
+    """ 指定名のプロセスID一覧 (psutil未導入時は空) """
+    if psutil is None:
+        return set()
+    pids = set()
+    for proc in psutil.process_iter(['name']):
+        if (proc.info['name'] or '').lower() == process_name.lower():
+            pids.add(proc.pid)
+    return pids
+
+
+def parse_per_format(value, cast=int):
+    """
+    形式毎の設定値を解釈する。
+    "200" は全形式に、"excel=100,word=300" は形式毎に適用する。
+    """
+    result = {}
+    if not value:
+        return result
+    for item in str(value).split(','):
+        item = item.strip()
+        if not item:
+            continue
+        if '=' in item:
+            kind, number = item.split('=', 1)
+            kind = kind.strip().lower()
+            if kind not in APP_CLASSES:
+                raise ValueError(f"不明な形式: {kind}")
+            result[kind] = cast(number)
+        else:
+            for kind in APP_CLASSES:
+                result[kind] = cast(item)
+    return result
+
+
+class RecyclePolicy:
+    """
+    Officeインスタンスを再起動する条件。
+    max_documents件変換した時点、またはプロセスのメモリ使用量がmax_rss_mbを超えた時点で再起動する。
+    """
+
+    def __init__(self, max_documents=None, max_rss_mb=None):
+        self.max_documents = max_documents
+        self.max_rss_mb = max_rss_mb
+
+    def reason(self, office):
+        """ 再起動すべきならその理由、不要ならNone """
+        if office.documents == 0:
+            return None
+        if self.max_documents and office.documents >= self.max_documents:
+            return f"{office.documents}件処理"
+        if self.max_rss_mb:
+            rss = office.memory_rss()
+            if rss is not None and rss > self.max_rss_mb * 1024 * 1024:
+                return f"メモリ {rss // (1024 * 1024)}MB"
+        return None
+
+
+def recycle_policies(max_documents=None, max_rss_mb=None):
+    """ 形式毎の設定 (parse_per_formatの結果) から形式毎のRecyclePolicyを作る """
+    max_documents = max_documents or {}
+    max_rss_mb = max_rss_mb or {}
+    return {
+        kind: RecyclePolicy(max_documents.get(kind), max_rss_mb.get(kind))
+        for kind in APP_CLASSES
+        if max_documents.get(kind) or max_rss_mb.get(kind)
+    }
+
+
+class GcPolicy:
+    """
+    ガベージコレクション (gc.collect) を行う条件。閉じた文書のCOM参照は参照カウントで即座に解放されるため、
+    循環参照の回収は、前回からevery件の文書を閉じた時点、またはPythonのヒープで確保中のブロック数が
+    heap_blocks以上増えた時点でだけ行う (0/Noneの条件は使わない)。
+    """
+
+    def __init__(self, every=50, heap_blocks=1_000_000):
+        self.every = every
+        self.heap_blocks = heap_blocks
+
+    def due(self, documents, growth_blocks):
+        if self.every and documents >= self.every:
+            return True
+        return bool(self.heap_blocks and growth_blocks is not None and growth_blocks >= self.heap_blocks)
+
+
+def python_heap_blocks():
+    """
+    Pythonのメモリアロケータで確保中のブロック数。回収できるのはPythonのオブジェクトだけのため、
+    Office側のメモリも含むプロセス全体の使用量ではなくこちらで判断する (pymallocを無効にしている場合は0)
+    """
+    return sys.getallocatedblocks()
+
+
+class ComLifecycle:
+    """
+    1つのOfficeインスタンスで開いた文書のCOM参照の後始末。文書は閉じてから参照を手放し (参照カウントで解放)、
+    循環参照の回収はGcPolicyの条件を満たした時だけ行う。回収の回数と所要時間を記録する。
+    """
+
+    def __init__(self, policy=None):
+        self.policy = policy or GcPolicy()
+        self.pending = 0  # 前回の回収以降に閉じた文書の数
+        self.collections = 0  # 回収の回数 (drainで0に戻す)
+        self.seconds = 0.0  # 回収の所要時間 (drainで0に戻す)
+        self._baseline = python_heap_blocks()
+        self._lock = threading.Lock()
+
+    def document_closed(self, timings=None):
+        """ 文書を1件閉じて参照を手放した後に呼ぶ。条件を満たせば回収する """
+        with self._lock:
+            self.pending += 1
+            pending = self.pending
+        growth = python_heap_blocks() - self._baseline if self.policy.heap_blocks else None
+        if self.policy.due(pending, growth):
+            self.collect(timings)
+
+    def collect(self, timings=None):
+        """ 循環参照を回収する (timingsを渡すと工程gcとして所要時間を加算する) """
+        begin = time.perf_counter()
+        gc.collect()
+        elapsed = time.perf_counter() - begin
+        if timings is not None:
+            timings['gc'] = timings.get('gc', 0.0) + elapsed
+        with self._lock:
+            self.pending = 0
+            self.collections += 1
+            self.seconds += elapsed
+        self._baseline = python_heap_blocks()
+
+    def drain(self):
+        """ 前回の呼び出し以降の (回収の回数, 所要時間) を返す """
+        with self._lock:
+            totals = (self.collections, self.seconds)
+            self.collections = 0
+            self.seconds = 0.0
+        return totals
+
+
+class SplitPolicy:
+    """
+    大きなブックを複数のExcelインスタンスで分担して出力する条件。
+    表示シートがmin_sheets以上、または過去の実績から見積もった所要時間がmin_seconds以上のブックを、
+    最大parts個のシートのまとまりに分ける (事前解析できる .xlsx/.xlsm のみ)。
+    """
+
+    def __init__(self, parts=4, min_sheets=50, min_seconds=None):
+        self.parts = parts
+        self.min_sheets = min_sheets
+        self.min_seconds = min_seconds
+
+    def parts_for(self, plan, expected_seconds=None):
+        """ 分割数 (分割しない場合は1) """
+        if plan is None or self.parts < 2:
+            return 1
+        sheets = len(plan.visible_sheets)
+        large = (self.min_sheets and sheets >= self.min_sheets) or \
+            (self.min_seconds and expected_seconds and expected_seconds >= self.min_seconds)
+        return min(self.parts, sheets) if large else 1
+
+
+def split_sheet_groups(sheet_names, parts):
+    """ シートを順番を保ったまま、枚数がほぼ均等なparts個のまとまりに分ける """
+    size, extra = divmod(len(sheet_names), parts)
+    groups = []
+    start = 0
+    for i in range(parts):
+        end = start + size + (1 if i < extra else 0)
+        if end > start:
+            groups.append(sheet_names[start:end])
+        start = end
+    return groups
+
+
+# --- ハング監視 ---
+
+def kill_process(pid):
+    """ プロセスを強制終了する """
+    if psutil is not None:
+        psutil.Process(pid).kill()
+    else:
+        os.kill(pid, signal.SIGTERM)  # WindowsではTerminateProcess
+
+
+class HangWatchdog:
+    """
+    1件毎の変換時間を別スレッドから監視し、期限を過ぎたらOfficeプロセスを強制終了する。
+    COMの呼び出しは同期的で中断できないため、プロセスを落として呼び出し側をエラーで戻らせる。
+    """
+
+    def __init__(self, logger):
+        self.logger = logger
+        self._cond = threading.Condition()
+        self._deadline = None
+        self._pid = None
+        self._fired = False
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="hang-watchdog", daemon=True)
+        self._thread.start()
+
+    def arm(self, pid, timeout):
+        """ 監視開始 (pidのプロセスをtimeout秒後に強制終了) """
+        with self._cond:
+            self._pid = pid
+            self._deadline = time.monotonic() + timeout
+            self._fired = False
+            self._cond.notify()
+
+    def disarm(self):
+        """ 監視終了。期限切れで強制終了していた場合はTrue """
+        with self._cond:
+            self._deadline = None
+            return self._fired
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+    def _run(self):
+        with self._cond:
+            while not self._closed:
+                if self._deadline is None:
+                    self._cond.wait()
+                    continue
+                remaining = self._deadline - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+                self._deadline = None
+                self._fired = True
+                try:
+                    kill_process(self._pid)
+                    self.logger.warning(f"  [警告] 応答の無いOfficeプロセスを強制終了しました (PID {self._pid})")
+                except Exception as e:
+                    self.logger.error(f"  [エラー] Officeプロセスの強制終了に失敗 (PID {self._pid}): {e}")
+
+
+# --- Excelブックの事前解析 (OOXMLを直接読み、COM呼び出しを減らす) ---
+
+OOXML_EXTENSIONS = ('.xlsx', '.xlsm')
+WORKBOOK_PART = 'xl/workbook.xml'
+WORKBOOK_RELS_PART = 'xl/_rels/workbook.xml.rels'
+PRINT_AREA_NAME = '_xlnm.Print_Area'
+
+
+class ExcelExportPlan:
+    """
+    事前解析したブックの出力計画。
+    visible_sheets: PDFに出力する表示シート (シート順)
+    fit_sheets: 印刷範囲が無く、横1ページに収める設定が必要なシート
+    """
+
+    def __init__(self, visible_sheets, fit_sheets, sheet_count):
+        self.visible_sheets = visible_sheets
+        self.fit_sheets = fit_sheets
+        self.sheet_count = sheet_count
+
+
+def _local_name(tag):
+    """ 名前空間を除いたXML要素・属性名 (Transitional/Strictの両方に対応するため) """
+    return tag.rsplit('}', 1)[-1]
+
+
+def _attribute(element, name):
+    for key, value in element.attrib.items():
+        if _local_name(key) == name:
+            return value
+    return None
+
+
+def scan_workbook(path):
+    """
+    .xlsx/.xlsmをZIPのまま読み、シートの表示状態と印刷範囲 (定義名) から出力計画を作る。
+    Officeを使わないため高速。.xlsや解析できないファイルはNoneを返す (従来通りCOMで調べる)。
+    """
+    if Path(path).suffix.lower() not in OOXML_EXTENSIONS:
+        return None
+    try:
+        with zipfile.ZipFile(path) as package:
+            workbook = ET.fromstring(package.read(WORKBOOK_PART))
+            rels = ET.fromstring(package.read(WORKBOOK_RELS_PART))
+    except (OSError, KeyError, zipfile.BadZipFile, ET.ParseError):
+        return None
+
+    # ワークシート以外 (グラフシート等) はWorksheetsに含まれないため除外する
+    worksheet_ids = {
+        rel.get('Id') for rel in rels
+        if _local_name(rel.tag) == 'Relationship' and (rel.get('Type') or '').endswith('/worksheet')
+    }
+
+    sheets = []  # (シート名, 表示, ワークシートか) ※localSheetIdはグラフシートも含めた順番
+    print_areas = set()
+    for element in workbook.iter():
+        name = _local_name(element.tag)
+        if name == 'sheet':
+            sheets.append((element.get('name'), element.get('state', 'visible') == 'visible',
+                           _attribute(element, 'id') in worksheet_ids))
+        elif name == 'definedName' and element.get('name') == PRINT_AREA_NAME:
+            local_id = element.get('localSheetId')
+            if local_id is not None and local_id.isdigit() and (element.text or '').strip():
+                print_areas.add(int(local_id))
+
+    if not sheets or any(name is None for name, _, _ in sheets):
+        return None
+    visible_sheets = []
+    fit_sheets = []
+    for index, (name, visible, is_worksheet) in enumerate(sheets):
+        if not (visible and is_worksheet):
+            continue
+        visible_sheets.append(name)
+        if index not in print_areas:
+            fit_sheets.append(name)
+    return ExcelExportPlan(visible_sheets, fit_sheets, sum(1 for _, _, ws in sheets if ws))
+
+
+# --- 事前チェック (Officeで開く前にパスワード保護・破損を検出) ---
+
+OLE_MAGIC = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'  # OLE複合ファイル (.xls/.doc/.ppt、パスワード付きOOXML)
+OLE_END_OF_CHAIN = 0xFFFFFFFA  # これ以上のセクタ番号は特殊値 (チェーン終端・未使用等)
+ZIP_MAGIC = b'PK'
+OOXML_SUFFIXES = ('.pptx', '.pptm', '.xlsx', '.xlsm', '.docx', '.docm')
+OOXML_CONTENT_TYPES = '[Content_Types].xml'
+PREFLIGHT_REASONS = {
+    'encrypted': 'パスワード保護',
+    'corrupt': '破損',
+    'mismatch': '拡張子と内容が不一致',
+}
+# 旧形式 (OLE) の本体ストリーム
+OLE_MAIN_STREAMS = {
+    'ppt': ('PowerPoint Document',),
+    'excel': ('Workbook', 'Book'),
+    'word': ('WordDocument',),
+}
+BIFF_BOF = (0x0809, 0x0409, 0x0209, 0x0009)
+BIFF_FILEPASS = 0x002F
+BIFF_EOF = 0x000A
+WORD_FIB_ENCRYPTED = 0x0100  # FibBaseのフラグ (オフセット0x0A) のfEncrypted
+
+
+class PreflightError(Exception):
+    """ 事前チェックで変換できないと判定したファイル (reasonはPREFLIGHT_REASONSのキー) """
+
+    def __init__(self, reason, detail):
+        super().__init__(f"{PREFLIGHT_REASONS[reason]}: {detail}")
+        self.reason = reason
+        self.detail = detail
+
+
+def preflight_check(path):
+    """
+    Officeで開かずにファイルの容器 (ZIP/OLE) を調べ、変換できないと分かるものはPreflightErrorを送出する。
+    判定できないものは通す (Office側で従来通り処理する)。
+    """
+    path = Path(path)
+    kind = EXTENSION_KINDS.get(path.suffix.lower())
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(len(OLE_MAGIC))
+    except OSError as e:
+        raise PreflightError('corrupt', f"読み込み失敗 ({e})")
+    if not head:
+        raise PreflightError('corrupt', "空のファイル")
+
+    if path.suffix.lower() in OOXML_SUFFIXES:
+        if head == OLE_MAGIC:
+            # パスワード付きのOOXMLはZIPではなく、EncryptionInfoを持つOLE複合ファイルとして保存される
+            if _ole_has_stream(path, 'EncryptionInfo'):
+                raise PreflightError('encrypted', "暗号化されたOOXML")
+            _check_ole(path, kind)  # 旧形式の中身が新形式の拡張子で保存されている
+            return
+        if not head.startswith(ZIP_MAGIC):
+            raise PreflightError('mismatch', "ZIP形式ではありません")
+        try:
+            with zipfile.ZipFile(path) as package:
+                names = set(package.namelist())
+        except (zipfile.BadZipFile, OSError) as e:
+            raise PreflightError('corrupt', f"ZIPの中央ディレクトリが読めません ({e})")
+        if OOXML_CONTENT_TYPES not in names:
+            raise PreflightError('mismatch', "Office文書のZIPではありません")
+    elif head == OLE_MAGIC:
+        _check_ole(path, kind)
+    # 旧形式の拡張子でOLE以外 (HTML/RTF/新形式等) はOfficeが開ける場合があるため通す
+
+
+def _ole_has_stream(path, name):
+    if olefile is None:
+        return name in _ole_directory_names(path)
+    try:
+        with olefile.OleFileIO(str(path)) as ole:
+            return ole.exists(name)
+    except Exception:
+        return False
+
+
+def _ole_directory_names(path, max_sectors=4096):
+    """ olefileが無い場合の簡易版: OLE複合ファイルのディレクトリ項目名を読む (読めなければ空) """
+    names = set()
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(512)
+            if len(header) < 512 or header[:8] != OLE_MAGIC:
+                return names
+            sector_size = 1 << struct.unpack_from('<H', header, 30)[0]
+            if sector_size not in (512, 4096):
+                return names
+            fat_count, first_dir = struct.unpack_from('<II', header, 44)
+            difat_sector, difat_count = struct.unpack_from('<II', header, 68)
+            per_sector = sector_size // 4
+
+            def read_sector(sector):
+                f.seek((sector + 1) * sector_size)
+                data = f.read(sector_size)
+                if len(data) < sector_size:
+                    raise ValueError(f"セクタ{sector}が途中で切れています")
+                return data
+
+            # FATセクタの位置はヘッダの109個と、足りない分はDIFATチェーンにある
+            fat_sectors = list(struct.unpack_from('<109I', header, 76))[:fat_count]
+            while len(fat_sectors) < fat_count and difat_count > 0 and difat_sector < OLE_END_OF_CHAIN:
+                entries = struct.unpack(f'<{per_sector}I', read_sector(difat_sector))
+                fat_sectors.extend(entries[:-1])
+                difat_sector = entries[-1]
+                difat_count -= 1
+            fat_sectors = fat_sectors[:fat_count]
+
+            sector = first_dir
+            for _ in range(max_sectors):
+                if sector >= OLE_END_OF_CHAIN:
+                    break
+                data = read_sector(sector)
+                for offset in range(0, sector_size, 128):
+                    length, entry_type = struct.unpack_from('<HB', data, offset + 64)
+                    if entry_type in (1, 2, 5) and 2 <= length <= 64:  # ストレージ・ストリーム・ルート
+                        names.add(data[offset:offset + length - 2].decode('utf-16-le', 'replace'))
+                index, slot = divmod(sector, per_sector)
+                if index >= len(fat_sectors):
+                    break
+                sector = struct.unpack_from('<I', read_sector(fat_sectors[index]), slot * 4)[0]
+    except (OSError, ValueError, struct.error):
+        pass  # 読めた分だけ返す (判定できない場合はOfficeに任せる)
+    return names
+
+
+def _check_ole(path, kind):
+    """ 旧形式 (OLE) のファイルの暗号化・破損を調べる (olefileが無い場合は調べない) """
+    if olefile is None:
+        _warn_without_olefile()
+        return
+    try:
+        ole = olefile.OleFileIO(str(path))
+    except Exception as e:
+        raise PreflightError('corrupt', f"OLE構造が壊れています ({e})")
+    with ole:
+        if ole.exists('EncryptionInfo'):
+            raise PreflightError('encrypted', "暗号化された文書")
+        stream = next((name for name in OLE_MAIN_STREAMS.get(kind, ()) if ole.exists(name)), None)
+        if stream is None:
+            raise PreflightError('mismatch', "対応する本体ストリームがありません")
+        try:
+            if kind == 'excel' and _biff_has_filepass(ole.openstream(stream).read(4096)):
+                raise PreflightError('encrypted', "暗号化されたブック")
+            if kind == 'word':
+                fib = ole.openstream(stream).read(12)
+                if len(fib) == 12 and int.from_bytes(fib[10:12], 'little') & WORD_FIB_ENCRYPTED:
+                    raise PreflightError('encrypted', "暗号化された文書")
+            if kind == 'ppt' and ole.exists('EncryptedSummary'):
+                raise PreflightError('encrypted', "暗号化されたプレゼンテーション")
+        except PreflightError:
+            raise
+        except Exception as e:
+            raise PreflightError('corrupt', f"本体ストリームが読めません ({e})")
+
+
+@functools.lru_cache(maxsize=None)
+def _warn_without_olefile():
+    """ olefileが無いことを1度だけ警告する (旧形式のパスワード保護はOfficeのダイアログで止まり得る) """
+    logging.getLogger(LOGGER_NAME).warning(
+        "[警告] olefileが無いため、旧形式 (.doc/.xls/.ppt) のパスワード保護・破損の事前チェックは行いません "
+        "(uv run --extra preflight ...)")
+
+
+def _biff_has_filepass(data):
+    """ Workbookストリーム先頭のBOF直後にFILEPASSレコード (パスワード保護) があるか """
+    offset = 0
+    first = True
+    while offset + 4 <= len(data):
+        record = int.from_bytes(data[offset:offset + 2], 'little')
+        size = int.from_bytes(data[offset + 2:offset + 4], 'little')
+        if first and record not in BIFF_BOF:
+            return False
+        if record == BIFF_FILEPASS:
+            return True
+        if record == BIFF_EOF:
+            return False
+        first = False
+        offset += 4 + size
+    return False
+
+
+# --- PDFの後処理 (圧縮・メタデータ付与。次のファイルの変換と並行して実行) ---
+
+PDF_CREATOR = "win-file-pdf-converter"
+
+
+class PdfPostProcessor:
+    """
+    出力PDFの後処理をスレッドプールで行う (Officeは待たずに次のファイルへ進む)。
+    コンテンツストリームの圧縮・重複オブジェクトの除去・メタデータ付与をpypdfで行い、
+    image_max_pxを指定すると最大辺がそれを超える画像を縮小して再圧縮する (Pillowが必要)。
+    qpdfコマンドがあれば、Web表示用の最適化 (リニアライズ) とオブジェクトストリーム化も行う。
+    ConversionCacheと同様、ワーカープロセスへは設定だけを引き継ぐ。
+    """
+
+    def __init__(self, workers=2, image_max_px=None, image_quality=75):
+        self.workers = workers
+        self.image_max_px = image_max_px
+        self.image_quality = image_quality
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def __getstate__(self):
+        return {'workers': self.workers, 'image_max_px': self.image_max_px, 'image_quality': self.image_quality}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def submit(self, pdf_path, source_name):
+        """ 後処理を投入し、(処理前, 処理後) のバイト数を返すFutureを返す """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="postprocess")
+            return self._executor.submit(self.process, pdf_path, source_name)
+
+    def process(self, pdf_path, source_name):
+        before = os.path.getsize(pdf_path)
+        tmp_path = pdf_path + ".postprocess.tmp"
+        try:
+            writer = pypdf.PdfWriter(clone_from=pdf_path)
+            for page in writer.pages:
+                if self.image_max_px:
+                    self._downsample_images(page)
+                page.compress_content_streams(level=9)
+            writer.compress_identical_objects()
+            writer.add_metadata({
+                '/Creator': PDF_CREATOR,
+                '/SourceFile': source_name,
+                '/ConvertedAt': datetime.now().strftime("D:%Y%m%d%H%M%S"),
+            })
+            with open(tmp_path, 'wb') as f:
+                writer.write(f)
+            self._linearize(tmp_path)
+            os.replace(tmp_path, pdf_path)  # 読み手が書きかけのPDFを見ないよう置き換える
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return before, os.path.getsize(pdf_path)
+
+    def _downsample_images(self, page):
+        for image in page.images:
+            pil_image = image.image
+            if max(pil_image.size) <= self.image_max_px:
+                continue
+            pil_image.thumbnail((self.image_max_px, self.image_max_px))
+            image.replace(pil_image, quality=self.image_quality)
+
+    @staticmethod
+    def _linearize(path):
+        qpdf = shutil.which("qpdf")
+        if not qpdf:
+            return
+        linearized = path + ".qpdf"
+        result = subprocess.run([qpdf, "--linearize", "--object-streams=generate", path, linearized],
+                                capture_output=True)
+        # qpdfは警告のみの場合に終了コード3を返す
+        if result.returncode in (0, 3) and os.path.exists(linearized):
+            os.replace(linearized, path)
+        elif os.path.exists(linearized):
+            os.remove(linearized)
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+
+def pdf_page_count(path):
+    """ PDFのページ数 (pypdfが無い場合や読めない場合はNone) """
+    if pypdf is None:
+        return None
+    try:
+        return len(pypdf.PdfReader(path).pages)
+    except Exception:
+        return None
+
+
+def merge_pdfs(part_paths, pdf_path):
+    """ 部分PDFを順に結合して1つのPDFにする """
+    writer = pypdf.PdfWriter()
+    for path in part_paths:
+        writer.append(path)
+    with open(pdf_path, 'wb') as f:
+        writer.write(f)
+
+
+def format_bytes(size):
+    """ バイト数を読みやすい単位 (KB/MB/GB) にする """
+    if abs(size) < 1024:
+        return f"{size}B"
+    for unit in ('KB', 'MB', 'GB'):
+        size /= 1024
+        if abs(size) < 1024 or unit == 'GB':
+            return f"{size:.1f}{unit}"
+
+
+# --- 出力品質プロファイル ---
+
+class ExportProfile:
+    """
+    PDFの出力品質の設定 (各形式のExportAsFixedFormatの引数に対応する)。
+    screen=Trueは画面表示向けの最小サイズ (Falseは標準品質)、structure_tagsは文書構造タグ、
+    bitmap_fontsは埋め込めないフォントのビットマップ化、pdfaはPDF/A (ISO 19005-1) 準拠、
+    doc_propertiesは文書プロパティを含めるかどうか。
+    Excelはscreenとdoc_propertiesのみ反映される (ExportAsFixedFormatに他の指定が無いため)。
+    """
+
+    def __init__(self, name, screen=False, structure_tags=True, bitmap_fonts=True, pdfa=False,
+                 doc_properties=True):
+        self.name = name
+        self.screen = screen
+        self.structure_tags = structure_tags
+        self.bitmap_fonts = bitmap_fonts
+        self.pdfa = pdfa
+        self.doc_properties = doc_properties
+
+    def key(self):
+        """ キャッシュキー用の文字列 (プロファイルの中身を変えたら別の出力として扱う) """
+        flags = (self.screen, self.structure_tags, self.bitmap_fonts, self.pdfa, self.doc_properties)
+        return f"{self.name}:" + "".join(str(int(flag)) for flag in flags)
+
+    def __repr__(self):
+        return f"<ExportProfile {self.key()}>"
+
+
+# 未指定の場合はプロファイルを使わず、従来通りSaveAs等の既定の設定で出力する
+EXPORT_PROFILES = {profile.name: profile for profile in (
+    ExportProfile('screen', screen=True, structure_tags=False, bitmap_fonts=False, doc_properties=False),
+    ExportProfile('print'),
+    ExportProfile('archive', pdfa=True),
+)}
+
+
+# --- COM呼び出しのプロファイル (--com-profile) ---
+
+_COM_VALUE_TYPES = (str, bytes, int, float, bool, type(None), datetime, tuple, list)
+
+
+class ComProxy:
+    """
+    COMオブジェクトの透過的なラッパー。プロパティの取得・設定とメソッド呼び出しの回数・所要時間を
+    呼び出し箇所 (例: Excel.Workbooks.Open().Worksheets[].Visible) 毎にprofilerへ記録する。
+    戻り値のCOMオブジェクトも同様にラップする (数値・文字列などの値はそのまま返す)。
+    """
+    __slots__ = ('_target', '_profiler', '_site')
+
+    def __init__(self, target, profiler, site):
+        object.__setattr__(self, '_target', target)
+        object.__setattr__(self, '_profiler', profiler)
+        object.__setattr__(self, '_site', site)
+
+    def __getattr__(self, name):
+        site = f"{self._site}.{name}"
+        begin = time.perf_counter()
+        try:
+            value = getattr(self._target, name)
+        except Exception:
+            self._profiler.record(site, 'get', time.perf_counter() - begin)
+            raise
+        elapsed = time.perf_counter() - begin
+        if inspect.isroutine(value):
+            # メソッドは呼び出し時に、名前解決の時間も含めて記録する
+            return _com_method(value, self._profiler, site, elapsed)
+        self._profiler.record(site, 'get', elapsed)
+        return _wrap_com(value, self._profiler, site)
+
+    def __setattr__(self, name, value):
+        begin = time.perf_counter()
+        try:
+            setattr(self._target, name, _unwrap_com(value))
+        finally:
+            self._profiler.record(f"{self._site}.{name}", 'set', time.perf_counter() - begin)
+
+    def __call__(self, *args, **kwargs):
+        # コレクションの要素の取得 (wb.Worksheets(names) 等)
+        return _com_method(self._target, self._profiler, self._site, 0.0)(*args, **kwargs)
+
+    def __iter__(self):
+        site = f"{self._site}[]"
+        iterator = iter(self._target)
+        while True:
+            begin = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self._profiler.record(site, 'next', time.perf_counter() - begin)
+            yield _wrap_com(item, self._profiler, site)
+
+    def __repr__(self):
+        return f"<ComProxy {self._site} {self._target!r}>"
+
+
+def _com_method(method, profiler, site, lookup_seconds):
+    def call(*args, **kwargs):
+        begin = time.perf_counter()
+        try:
+            result = method(*(_unwrap_com(a) for a in args), **{k: _unwrap_com(v) for k, v in kwargs.items()})
+        finally:
+            profiler.record(site, 'call', lookup_seconds + time.perf_counter() - begin)
+        return _wrap_com(result, profiler, f"{site}()")
+    return call
+
+
+def _wrap_com(value, profiler, site):
+    return value if isinstance(value, _COM_VALUE_TYPES) else ComProxy(value, profiler, site)
+
+
+def _unwrap_com(value):
+    return object.__getattribute__(value, '_target') if isinstance(value, ComProxy) else value
+
+
+class ComProfiler:
+    """
+    COM呼び出し (プロパティの取得・設定、メソッド呼び出し) の回数と所要時間を、呼び出し箇所毎と1件毎に集計する。
+    python=Trueの場合、1件毎の変換をcProfileでも計測し、Python側の関数の上位も報告する。
+    複数スレッド (大きなブックの分割出力) から記録されてもよい。
+    """
+
+    def __init__(self, python=False, top=20):
+        self.top = top
+        self.sites = {}  # (呼び出し箇所, 種別) -> [回数, 秒]
+        self.documents = []  # (ファイル名, 回数, 秒)
+        self.calls = 0
+        self.seconds = 0.0
+        self._document = None  # 変換中の1件の [回数, 秒]
+        self._lock = threading.Lock()
+        self._python = cProfile.Profile() if python else None
+
+    def record(self, site, op, seconds):
+        with self._lock:
+            entry = self.sites.setdefault((site, op), [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+            self.calls += 1
+            self.seconds += seconds
+            if self._document is not None:
+                self._document[0] += 1
+                self._document[1] += seconds
+
+    def begin_document(self):
+        with self._lock:
+            self._document = [0, 0.0]
+        if self._python is not None:
+            try:
+                self._python.enable()
+            except ValueError as e:
+                # 他のプロファイラが動いている (パイプライン実行の別スレッド等)
+                logging.getLogger(LOGGER_NAME).warning(f"  [警告] Python側のプロファイルを行いません: {e}")
+                self._python = None
+
+    def end_document(self, name):
+        """ 1件分の集計を終え、(COM呼び出し回数, 秒) を返す """
+        if self._python is not None:
+            self._python.disable()
+        with self._lock:
+            calls, seconds = self._document or (0, 0.0)
+            self._document = None
+            if calls:  # スキップ等、Officeを使わなかったファイルは数えない
+                self.documents.append((name, calls, seconds))
+        return calls, seconds
+
+    def report(self, logger, label):
+        """ 所要時間の合計が大きい呼び出し箇所の上位をログに出す """
+        if not self.calls:
+            return
+        n = len(self.documents)
+        per_document = f" (1件あたり {self.calls / n:,.0f}回 / {self.seconds / n:.2f}秒)" if n else ""
+        logger.info(f"[COMプロファイル] {label}: {n}件 / COM呼び出し {self.calls:,}回 / "
+                    f"{self.seconds:.2f}秒{per_document}")
+        logger.info(f"  {'合計(秒)':>10} {'回数':>10} {'平均(ms)':>10}  種別  呼び出し箇所")
+        ranked = sorted(self.sites.items(), key=lambda item: item[1][1], reverse=True)
+        for (site, op), (calls, seconds) in ranked[:self.top]:
+            logger.info(f"  {seconds:>10.3f} {calls:>10,} {seconds / calls * 1000:>10.2f}  {op:<4}  {site}")
+        busiest = sorted(self.documents, key=lambda d: d[1], reverse=True)[:5]
+        if busiest:
+            logger.info("  COM呼び出しの多いファイル: " +
+                        ", ".join(f"{name} ({calls:,}回 / {seconds:.2f}秒)" for name, calls, seconds in busiest))
+        if self._python is not None:
+            out = io.StringIO()
+            pstats.Stats(self._python, stream=out).sort_stats('tottime').print_stats(self.top)
+            logger.info(f"[Pythonプロファイル] {label} (関数内の所要時間の上位)\n{out.getvalue().rstrip()}")
+
+
+# --- Officeアプリ毎の処理 ---
+
+class OfficeApp:
+    """
+    Officeアプリ1インスタンス分の起動・変換・終了
+    """
+    kind = None
+    label = None
+    prog_id = None
+    process_name = None
+    extensions = ()
+    single_instance = False  # Trueの場合、Dispatchしても全員が同じ1つのプロセスを共有する
+    # 起動直後に変更し、終了前に元へ戻すアプリの設定 ((プロパティ, 値)、"Options.Pagination"のように辿れる)
+    required_settings = ()  # 無人で変換するために必要な設定 (常に適用)
+    session_settings = ()  # 変換の速度に効く設定 (tune_session=Trueの場合に適用)
+
+    def __init__(self, logger):
+        self.logger = logger
+        self.app = None
+        self.pid = None
+        self.documents = 0  # 現在のインスタンスで変換した件数
+        self.generation = 0  # 起動回数 (再起動の度に増える)
+        self.collect_details = False  # Trueの場合、ページ数などを取得する (トレース用)
+        self.profile = None  # ExportProfile (Noneは既定の設定で出力)
+        self.profiler = None  # ComProfiler (COM呼び出しを計測する場合)
+        self.tune_session = True  # Falseの場合、session_settingsを適用しない (比較用)
+        self.lifecycle = ComLifecycle()
+        self._saved_settings = []  # (オブジェクト, プロパティ, 元の値)
+        self.timings = {}  # 直近の1件の工程別所要時間 (秒)
+        self.details = {}  # 直近の1件のページ数・シート数など
+
+    def start(self):
+        before = office_pids(self.process_name)
+        self.app = win32com.client.Dispatch(self.prog_id)
+        if self.profiler is not None:
+            self.app = ComProxy(self.app, self.profiler, self.label)
+        self.configure()
+        self.documents = 0
+        self.generation += 1
+        self.pid = self._window_pid()
+        if self.pid is None:
+            started = office_pids(self.process_name) - before
+            self.pid = started.pop() if len(started) == 1 else None
+
+    def set_profiler(self, profiler):
+        """ COM呼び出しの計測先を設定する (起動済みのインスタンスにも反映する) """
+        self.profiler = profiler
+        if self.app is not None:
+            app = _unwrap_com(self.app)
+            self.app = ComProxy(app, profiler, self.label) if profiler is not None else app
+
+    @property
+    def instance_id(self):
+        """ トレース用のインスタンス識別子 (形式#起動回数@PID) """
+        return f"{self.kind}#{self.generation}@{self.pid or '?'}"
+
+    def window_handle(self):
+        """ アプリのウィンドウハンドル (プロセス特定用、取得できない場合はNone) """
+        return None
+
+    def _window_pid(self):
+        try:
+            import win32process
+            hwnd = self.window_handle()
+            return win32process.GetWindowThreadProcessId(hwnd)[1] if hwnd else None
+        except Exception:
+            return None
+
+    def memory_rss(self):
+        """ Officeプロセスのメモリ使用量 (バイト)。特定できない場合はNone """
+        if psutil is None or self.pid is None:
+            return None
+        try:
+            return psutil.Process(self.pid).memory_info().rss
+        except Exception:
+            return None
+
+    def recycle(self, reason):
+        """ インスタンスを終了して起動し直し、所要時間 (秒) を返す """
+        begin = time.perf_counter()
+        self.quit()
+        self.start()
+        elapsed = time.perf_counter() - begin
+        self.logger.info(f"[再起動] {self.label}: {reason} (所要 {elapsed:.1f}秒)")
+        return elapsed
+
+    def configure(self):
+        """ 起動直後のアプリ設定 (元の値を控えてから変更する) """
+        self._saved_settings = []
+        settings = self.required_settings + (self.session_settings if self.tune_session else ())
+        for name, value in settings:
+            self.apply_setting(name, value)
+
+    def apply_setting(self, name, value, target=None):
+        """
+        設定 (targetを省略した場合はアプリのプロパティ) を1つ変更し、restoreで戻せるよう元の値を控える。
+        バージョンにより無い設定は飛ばす
+        """
+        path, _, attr = name.rpartition('.')
+        try:
+            owner = self.app if target is None else target
+            for part in filter(None, path.split('.')):
+                owner = getattr(owner, part)
+            original = getattr(owner, attr)
+            setattr(owner, attr, value)
+        except Exception as e:
+            self.logger.debug(f"  {self.label}の設定 {name} を変更できません: {e}")
+            return False
+        self._saved_settings.append((owner, attr, original))
+        return True
+
+    def restore(self):
+        """ 終了前に変更した設定を逆順に戻す (Wordのオプション等はユーザーの設定として保存されるため) """
+        while self._saved_settings:
+            owner, attr, original = self._saved_settings.pop()
+            try:
+                setattr(owner, attr, original)
+            except Exception:
+                pass
+
+    def quit(self):
+        if self.app:
+            try:
+                self.restore()
+                self.app.Quit()
+            except:
+                pass
+            self.app = None
+            self.pid = None
+            if self.lifecycle.pending:
+                # 終了したインスタンスを指す参照が循環参照に残らないよう、次の起動の前に回収する
+                self.lifecycle.collect()
+
+    def responsive(self):
+        """ インスタンスがCOM呼び出しに応答するか (異常終了・強制終了した場合はFalse) """
+        if self.app is None:
+            return False
+        try:
+            self.app.Name
+            return True
+        except Exception:
+            return False
+
+    def kill(self):
+        """ プロセスを強制終了する (応答しないインスタンスを止める用) """
+        if self.pid is not None:
+            try:
+                kill_process(self.pid)
+            except Exception:
+                pass
+
+    def begin_document(self):
+        """ 1件分の工程別所要時間・詳細をリセット """
+        self.timings = {}
+        self.details = {}
+
+    def phase(self, name):
+        """ 工程 (open/prepare/export/close/gc) の所要時間を計測する """
+        return timed(self.timings, name)
+
+    def close_document(self, document, **close_args):
+        """ 文書を閉じる (失敗は無視する)。呼び出し側は参照を手放してからend_documentを呼ぶ """
+        with self.phase('close'):
+            try:
+                document.Close(**close_args)
+            except Exception:
+                pass
+
+    def end_document(self):
+        """ 1件分の後始末の最後に呼ぶ。GcPolicyの条件を満たした場合だけ循環参照を回収する """
+        self.lifecycle.document_closed(self.timings)
+
+    def detail(self, name, getter):
+        """ トレース有効時のみ詳細 (ページ数など) を取得する。取得失敗は変換に影響させない """
+        if not self.collect_details:
+            return
+        try:
+            self.details[name] = getter()
+        except Exception:
+            pass
+
+    def export(self, abs_path, pdf_path):
+        raise NotImplementedError
+
+    def log_error(self, file_path, e):
+        self.logger.error(f"[エラー] {file_path.name}: {e}")
+
+    def settings_key(self):
+        """ 変換結果に影響する設定 (キャッシュキーの一部) """
+        key = f"{self.kind}:v{CACHE_VERSION}"
+        if self.profile is not None:
+            key = f"{key}:{self.profile.key()}"
+        # マクロ・イベントの有無は出力内容を変え得るため、速度向けの設定を行わない場合は別扱い
+        return key if self.tune_session else f"{key}:untuned"
+
+
+class PowerPointApp(OfficeApp):
+    """ PowerPoint変換 """
+    kind = 'ppt'
+    label = 'PowerPoint'
+    prog_id = "PowerPoint.Application"
+    process_name = "POWERPNT.EXE"
+    extensions = (".pptx", ".pptm", ".ppt")
+    # 他のワーカーのQuit・タイムアウト時の強制終了・再起動が変換中のファイルを巻き込むため、1ワーカーだけで扱う
+    single_instance = True
+    required_settings = (('DisplayAlerts', ppAlertsNone),)
+    session_settings = (('AutomationSecurity', msoAutomationSecurityForceDisable),)
+
+    def window_handle(self):
+        return self.app.HWND
+
+    def export(self, abs_path, pdf_path):
+        deck = None
+        try:
+            with self.phase('open'):
+                deck = self.app.Presentations.Open(abs_path, ReadOnly=True, WithWindow=False)
+            self.detail('slides', lambda: deck.Slides.Count)
+            with self.phase('export'):
+                if self.profile is None:
+                    deck.SaveAs(pdf_path, ppSaveAsPDF)
+                else:
+                    profile = self.profile
+                    deck.ExportAsFixedFormat(
+                        pdf_path,
+                        ppFixedFormatTypePDF,
+                        Intent=ppFixedFormatIntentScreen if profile.screen else ppFixedFormatIntentPrint,
+                        IncludeDocProperties=profile.doc_properties,
+                        DocStructureTags=profile.structure_tags,
+                        BitmapMissingFonts=profile.bitmap_fonts,
+                        UseISO19005_1=profile.pdfa,
+                    )
+        finally:
+            if deck:
+                self.close_document(deck)
+                del deck
+            self.end_document()
+
+
+class ExcelApp(OfficeApp):
+    """ Excel変換 (強化版: ダイアログ抑制・非表示シート回避) """
+    kind = 'excel'
+    label = 'Excel'
+    prog_id = "Excel.Application"
+    process_name = "EXCEL.EXE"
+    extensions = (".xlsx", ".xlsm", ".xls")
+    split = None  # SplitPolicy (大きなブックを分担して出力する条件)
+    split_timeout = None  # 分担したインスタンスを待つ上限 (秒)
+    expected_seconds = None  # 変換中のブックの見積もり所要時間 (SplitPolicy.min_seconds用)
+    manual_calculation = False  # Trueの場合、手動計算にして保存されている計算結果のまま出力する
+
+    required_settings = (
+        ('DisplayAlerts', False),     # 警告抑制
+        ('AskToUpdateLinks', False),  # リンク更新確認抑制
+    )
+    session_settings = (
+        ('ScreenUpdating', False),    # 描画停止
+        ('EnableEvents', False),      # ブックのイベント (Workbook_Open等) を起こさない
+        ('AutomationSecurity', msoAutomationSecurityForceDisable),
+    )
+
+    def configure(self):
+        self.app.Visible = False
+        super().configure()
+        self._calculation_book = None
+        if self.manual_calculation:
+            # 計算方法はブックが開いていないと変更できないため、空のブックを開いたままにして手動計算にする
+            # (以降に開くブックは保存されている値のまま出力され、開く度の再計算を行わない。
+            #  揮発性の関数や計算結果を保存していないブックは出力内容が変わるため、既定では行わない)
+            try:
+                self._calculation_book = self.app.Workbooks.Add()
+            except Exception as e:
+                self.logger.debug(f"  Excelの計算方法を変更できません: {e}")
+            else:
+                self.apply_setting('Calculation', xlCalculationManual)
+
+    def restore(self):
+        super().restore()
+        if getattr(self, '_calculation_book', None) is not None:
+            try:
+                self._calculation_book.Close(SaveChanges=False)
+            except Exception:
+                pass
+            self._calculation_book = None
+
+    def settings_key(self):
+        key = super().settings_key()
+        return f"{key}:manual-calc" if self.manual_calculation else key
+
+    def window_handle(self):
+        return self.app.Hwnd
+
+    def export(self, abs_path, pdf_path):
+        # .xlsx/.xlsmはOfficeで開く前にシート構成を調べておく (.xls等はNone)
+        with self.phase('prescan'):
+            plan = scan_workbook(abs_path)
+        if plan is not None and not plan.visible_sheets:
+            raise NoVisibleSheetsError()
+
+        parts = self.split.parts_for(plan, self.expected_seconds) if self.split else 1
+        if parts > 1:
+            self.export_split(abs_path, pdf_path, plan, parts)
+        else:
+            self.export_sheets(abs_path, pdf_path, plan)
+
+    def export_sheets(self, abs_path, pdf_path, plan, sheet_names=None):
+        """ ブックを開き、表示シート (sheet_namesを指定した場合はそのうちの一部) をPDFに出力する """
+        wb = None
+        try:
+            # ダイアログを出させない強力なOpen設定
+            with self.phase('open'):
+                wb = self.app.Workbooks.Open(
+                    abs_path,
+                    UpdateLinks=0,
+                    ReadOnly=True,
+                    IgnoreReadOnlyRecommended=True,
+                    CorruptLoad=1,
+                    AddToMru=False
+                )
+
+            with self.phase('prepare'):
+                if plan is None:
+                    visible_sheets = self.prepare_sheets(wb)
+                elif sheet_names is None:
+                    visible_sheets = plan.visible_sheets
+                    self.fit_to_width(wb, plan.fit_sheets)
+                else:
+                    visible_sheets = sheet_names
+                    selected = set(sheet_names)
+                    self.fit_to_width(wb, [name for name in plan.fit_sheets if name in selected])
+            if sheet_names is None:
+                self.detail('sheets', lambda: plan.sheet_count if plan else wb.Worksheets.Count)
+                self.detail('visible_sheets', lambda: len(visible_sheets))
+
+            if not visible_sheets:
+                raise NoVisibleSheetsError()
+
+            # 可視シートのみを選択してPDF化
+            with self.phase('export'):
+                wb.Worksheets(visible_sheets).Select()
+                if self.profile is None:
+                    wb.ActiveSheet.ExportAsFixedFormat(xlTypePDF, pdf_path, IgnorePrintAreas=False)
+                else:
+                    wb.ActiveSheet.ExportAsFixedFormat(
+                        xlTypePDF,
+                        pdf_path,
+                        Quality=xlQualityMinimum if self.profile.screen else xlQualityStandard,
+                        IncludeDocProperties=self.profile.doc_properties,
+                        IgnorePrintAreas=False,
+                    )
+        finally:
+            if wb:
+                self.close_document(wb, SaveChanges=False)
+                del wb
+            self.end_document()
+
+    def export_split(self, abs_path, pdf_path, plan, parts):
+        """
+        表示シートを順番を保ったままparts個に分け、先頭のまとまりはこのインスタンス、残りは一時的に
+        起動した別のExcelインスタンスで並行して出力し、元のシート順に1つのPDFへ結合する。
+        まとまり毎に別々に出力するため、ヘッダー・フッターのページ番号 (&P/&N) はまとまり毎に1から数え直す。
+        """
+        groups = split_sheet_groups(plan.visible_sheets, parts)
+        self.detail('sheets', lambda: plan.sheet_count)
+        self.detail('visible_sheets', lambda: len(plan.visible_sheets))
+        self.detail('split_parts', lambda: len(groups))
+        base, ext = os.path.splitext(pdf_path)
+        part_paths = [f"{base}.part{i}{ext}" for i in range(len(groups))]
+        helpers = [ExcelApp(self.logger) for _ in groups[1:]]
+        for helper in helpers:
+            helper.profile = self.profile
+            helper.profiler = self.profiler
+            helper.tune_session = self.tune_session
+            helper.manual_calculation = self.manual_calculation
+            helper.lifecycle.policy = self.lifecycle.policy
+        try:
+            with ThreadPoolExecutor(max_workers=len(helpers), thread_name_prefix="excel-split") as executor:
+                futures = [executor.submit(_export_sheet_group, helper, abs_path, path, plan, group)
+                           for helper, path, group in zip(helpers, part_paths[1:], groups[1:])]
+                try:
+                    self.export_sheets(abs_path, part_paths[0], plan, groups[0])
+                    with self.phase('split_wait'):
+                        done, not_done = wait(futures, timeout=self.split_timeout)
+                    if not_done:
+                        raise TimeoutError(f"分割出力が{self.split_timeout}秒以内に完了しませんでした")
+                    for future in done:
+                        future.result()
+                except BaseException:
+                    # 残りのインスタンスを止めてから失敗とする
+                    for helper in helpers:
+                        helper.kill()
+                    raise
+            with self.phase('merge'):
+                merge_pdfs(part_paths, pdf_path)
+        finally:
+            for path in part_paths:
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def prepare_sheets(self, wb):
+        """ 全シートをCOMで確認し、表示シートの印刷設定を調整して名前の一覧を返す """
+        # 表示されているシートのみを抽出
+        visible_sheets = []
+        for ws in wb.Worksheets:
+            if ws.Visible == xlSheetVisible:
+                # 印刷設定の自動調整
+                if not ws.PageSetup.PrintArea:
+                    ws.PageSetup.Zoom = False
+                    ws.PageSetup.FitToPagesWide = 1
+                    ws.PageSetup.FitToPagesTall = False
+                visible_sheets.append(ws.Name)
+        return visible_sheets
+
+    def fit_to_width(self, wb, sheet_names):
+        """ 事前解析で印刷範囲が無いと分かったシートだけを横1ページに収める """
+        if not sheet_names:
+            return
+        # 印刷設定の変更毎にプリンターと通信しないよう、まとめて反映する (Excel 2010以降)
+        try:
+            self.app.PrintCommunication = False
+        except Exception:
+            pass
+        try:
+            for name in sheet_names:
+                page_setup = wb.Worksheets(name).PageSetup
+                page_setup.Zoom = False
+                page_setup.FitToPagesWide = 1
+                page_setup.FitToPagesTall = False
+        finally:
+            try:
+                self.app.PrintCommunication = True
+            except Exception:
+                pass
+
+    def log_error(self, file_path, e):
+        if isinstance(e, NoVisibleSheetsError):
+            self.logger.warning(f"[警告] {file_path.name}: 表示可能なシートがありません")
+        elif "Password" in str(e):
+            self.logger.error(f"[パスワード保護] {file_path.name}: 開けませんでした")
+        else:
+            super().log_error(file_path, e)
+
+
+def _export_sheet_group(helper, abs_path, pdf_path, plan, sheet_names):
+    """ (分担用スレッド) 専用のExcelインスタンスを起動してシートのまとまりを出力し、終了する """
+    pythoncom.CoInitialize()
+    try:
+        helper.start()
+        helper.export_sheets(abs_path, pdf_path, plan, sheet_names)
+    finally:
+        helper.quit()
+        pythoncom.CoUninitialize()
+
+
+class WordApp(OfficeApp):
+    """ Word変換 """
+    kind = 'word'
+    label = 'Word'
+    prog_id = "Word.Application"
+    process_name = "WINWORD.EXE"
+    extensions = (".docx", ".docm", ".doc")
+    required_settings = (
+        ('DisplayAlerts', wdAlertsNone),
+        ('Options.ConfirmConversions', False),
+        ('Options.UpdateLinksAtOpen', False),
+    )
+    session_settings = (
+        ('ScreenUpdating', False),
+        ('AutomationSecurity', msoAutomationSecurityForceDisable),
+        ('Options.Pagination', False),  # バックグラウンドでの再ページ付け
+        ('Options.BackgroundSave', False),
+        ('Options.CheckSpellingAsYouType', False),
+        ('Options.CheckGrammarAsYouType', False),
+    )
+
+    def configure(self):
+        self.app.Visible = False
+        super().configure()
+        if self.tune_session:
+            # 読み込まれているテンプレートのアドイン (Startupフォルダ等) をこのセッションの間だけ外す
+            try:
+                for addin in self.app.AddIns:
+                    if addin.Installed:
+                        self.apply_setting('Installed', False, target=addin)
+            except Exception as e:
+                self.logger.debug(f"  Wordのアドインを外せません: {e}")
+
+    def window_handle(self):
+        # Applicationにはウィンドウハンドルが無いため、空の文書を一時的に開いてそのウィンドウから取る (Word 2013以降)
+        doc = self.app.Documents.Add(Visible=False)
+        try:
+            return doc.ActiveWindow.Hwnd
+        finally:
+            doc.Close(SaveChanges=False)
+
+    def export(self, abs_path, pdf_path):
+        doc = None
+        try:
+            with self.phase('open'):
+                doc = self.app.Documents.Open(abs_path, ConfirmConversions=False, ReadOnly=True,
+                                              AddToRecentFiles=False, Visible=False, NoEncodingDialog=True)
+            self.detail('pages', lambda: doc.ComputeStatistics(wdStatisticPages))
+            with self.phase('export'):
+                if self.profile is None:
+                    doc.SaveAs2(pdf_path, FileFormat=wdFormatPDF)
+                else:
+                    profile = self.profile
+                    doc.ExportAsFixedFormat(
+                        pdf_path,
+                        wdExportFormatPDF,
+                        OptimizeFor=wdExportOptimizeForOnScreen if profile.screen else wdExportOptimizeForPrint,
+                        IncludeDocProps=profile.doc_properties,
+                        DocStructureTags=profile.structure_tags,
+                        BitmapMissingFonts=profile.bitmap_fonts,
+                        UseISO19005_1=profile.pdfa,
+                    )
+        finally:
+            if doc:
+                self.close_document(doc)
+                del doc
+            self.end_document()
+
+
+# 実行順 (PowerPoint -> Excel -> Word)
+APP_CLASSES = {cls.kind: cls for cls in (PowerPointApp, ExcelApp, WordApp)}
+EXTENSION_KINDS = {ext: cls.kind for cls in APP_CLASSES.values() for ext in cls.extensions}
+
+
+# --- 進捗イベント (ライブラリ用API convert_folder が返す) ---
 
-    logger.addHandler(fh)
-    logger.addHandler(sh)
+# 変換結果 -> イベント種別
+EVENT_TYPES = {
+    'success': 'succeeded',
+    'duplicate': 'succeeded',
+    'skip': 'skipped',
+    'rejected': 'failed',
+    'error': 'failed',
+    'timeout': 'failed',
+}
 
-    return logger, log_file_path
 
-def move_to_done(file_path, done_folder, logger):
+class ConversionEvent:
     """
-    処理完了ファイルをdoneフォルダへ移動
+    1件毎の進捗イベント。
+    type: queued (変換待ちに追加) / started (処理開始) / succeeded / skipped / failed / finished (全体の終了)
+    / recycled (Officeを再起動した。secondsは再起動の所要時間)
+    outcome: 変換結果 (success/duplicate/skip/rejected/error/timeout)、secondsは1件の所要時間、
+    phasesは工程別の所要時間。finishedではstatsに形式毎の統計を持つ。
     """
-    try:
-        dst_path = done_folder / file_path.name
-        if dst_path.exists():
-            os.remove(dst_path) # 上書きのため既存削除
-        shutil.move(str(file_path), str(dst_path))
-    except Exception as e:
-        logger.warning(f"  [警告] ファイル移動失敗: {file_path.name} -> {e}")
 
-def convert_ppt_to_pdf(target_folder, output_folder, logger):
-    """ PowerPoint変換 """
-    files = list(Path(target_folder).glob("*.pptx")) + \
-            list(Path(target_folder).glob("*.pptm")) + \
-            list(Path(target_folder).glob("*.ppt"))
-    
-    stats = {'success': 0, 'skip': 0, 'error': 0}
-    if not files:
-        return stats
-
-    done_folder = target_folder / "done"
-    done_folder.mkdir(exist_ok=True)
-
-    logger.info(f"--- PowerPoint変換開始: {len(files)}件 ---")
-    
-    powerpoint = None
+    def __init__(self, type, kind=None, path=None, pdf_path=None, outcome=None, seconds=None,
+                 phases=None, error=None, stats=None):
+        self.type = type
+        self.kind = kind
+        self.path = path
+        self.pdf_path = pdf_path
+        self.outcome = outcome
+        self.seconds = seconds
+        self.phases = phases or {}
+        self.error = error
+        self.stats = stats
+        self.ts = datetime.now()
+
+    def __repr__(self):
+        detail = f" {self.outcome}" if self.outcome else ""
+        return f"<ConversionEvent {self.type} {self.kind or ''} {self.path or ''}{detail}>"
+
+
+def notify(on_event, event):
+    """ イベントを通知する (受け取り側の例外で変換を止めない) """
+    if on_event is None:
+        return
     try:
-        powerpoint = win32com.client.Dispatch("PowerPoint.Application")
+        on_event(event)
     except Exception as e:
-        logger.error(f"PowerPoint起動失敗: {e}")
-        return stats
+        logging.getLogger(LOGGER_NAME).warning(f"  [警告] 進捗イベントの通知失敗: {e}")
 
-    try:
-        for i, file_path in enumerate(files):
-            if i % 10 == 0:
-                logger.info(f"PowerPoint 処理中... {i+1}/{len(files)}")
 
-            abs_path = str(file_path.resolve())
-            
-            if output_folder:
-                pdf_path = str((output_folder / file_path.with_suffix('.pdf').name).resolve())
-            else:
-                pdf_path = str(file_path.with_suffix('.pdf').resolve())
+def notify_queued(options, kind, file_path):
+    write_journal('queued', file_path)
+    notify(options.get('on_event'), ConversionEvent('queued', kind, file_path))
 
-            if os.path.exists(pdf_path):
-                logger.info(f"[スキップ] PDF既存: {file_path.name}")
-                stats['skip'] += 1
-                continue
-            
-            deck = None
-            success = False
+
+def _forward_event(event):
+    """ ワーカープロセス側のon_event: ログと同じキューで親プロセスへ送る """
+    logging.getLogger(EVENT_LOGGER_NAME).info(event.type, extra={'event': event})
+
+
+class _OfficeUnavailable(Exception):
+    """ Officeを起動・再起動できず、以降の変換を続けられない """
+
+
+class BatchConverter:
+    """
+    1つのOfficeインスタンスでファイルを1件ずつ変換する (convert_filesの1件分の処理)。
+    引数の意味はconvert_filesと同じ。集計はstatsに溜まる。
+    """
+
+    def __init__(self, office, output_folder, logger, cache=None, outputs=None, source_root=None,
+                 recycle=None, timeout=None, trace=False, preflight=True, history=None, on_event=None,
+                 postprocess=None, staging=None, leases=None, failures=None, split=None, profile=None,
+                 com_profile=False, python_profile=False, tune_session=True, manual_calculation=False,
+                 gc_policy=None):
+        self.office = office
+        self.output_folder = output_folder
+        self.logger = logger
+        self.cache = cache
+        self.outputs = outputs if outputs is not None else OutputIndex()
+        self.source_root = source_root
+        self.policy = (recycle or {}).get(office.kind)
+        self.timeout = (timeout or {}).get(office.kind)
+        self.trace = trace
+        self.preflight = preflight
+        self.history = history
+        self.on_event = on_event
+        self.postprocess = postprocess
+        self.staging = staging
+        self.leases = leases
+        self.failures = failures
+        self.split = split if office.kind == 'excel' else None
+        if self.split is not None and pypdf is None:
+            raise ValueError("大きなブックの分割出力にはpypdfが必要です")
+        if self.split is not None:
+            office.split = self.split
+            office.split_timeout = self.timeout
+        office.profile = profile
+        office.tune_session = tune_session
+        if office.kind == 'excel':
+            office.manual_calculation = manual_calculation
+        if gc_policy is not None:
+            office.lifecycle.policy = gc_policy
+        self.profiler = ComProfiler(python=python_profile) if com_profile or python_profile else None
+        office.set_profiler(self.profiler)
+        self._estimator = None
+        self._postprocessing = []  # (ファイル名, Future)
+        self._postprocessing_lock = threading.Lock()
+        self.io = IoQueue()
+        self.watchdog = None
+        self.stats = new_stats()
+        # ページ数の取得等は余分なCOM呼び出し (Wordは再ページ付け) になるため、トレース時のみ行う
+        office.collect_details = trace
+
+    def ensure_office(self):
+        """
+        Officeを起動し (起動済みならそのまま)、制限時間の監視を用意する。
+        スキップ・除外のみのバッチでOfficeを起動しないよう、変換が必要になった時点で呼ぶ。
+        """
+        if self.office.app is not None:
+            return
+        try:
+            self.office.start()
+        except Exception as e:
+            self.logger.error(f"{self.office.label}起動失敗: {e}")
+            raise _OfficeUnavailable() from e
+        if self.timeout:
+            if self.watchdog is None:
+                self.watchdog = HangWatchdog(self.logger)
+            if self.office.pid is None:
+                self.logger.warning(f"  [警告] {self.office.label}のプロセスを特定できないため、制限時間の監視は行いません")
+
+    def close(self, keep_open=False):
+        self.finish_io()
+        self.finish_postprocess()
+        if self.watchdog:
+            self.watchdog.close()
+            self.watchdog = None
+        if not keep_open:
+            self.office.quit()
+        self._count_gc()
+        if self.profiler is not None:
+            self.profiler.report(self.logger, self.office.label)
+
+    def convert(self, file_path):
+        """ 1件を変換し、結果 (success/duplicate/skip/rejected/error/timeout) を返す """
+        begin = time.perf_counter()
+        info = {'phases': {}}
+        self.office.begin_document()
+        notify(self.on_event, ConversionEvent('started', self.office.kind, file_path))
+        outcome = None
+        if self.profiler is not None:
+            self.profiler.begin_document()
+        try:
+            outcome = self._convert(file_path, info)
+            if self.failures is not None:
+                self._record_failure(file_path, outcome, info)
+            if outcome not in ('success', 'duplicate'):
+                write_journal('finished', file_path, outcome=outcome)
+        finally:
+            if self.profiler is not None:
+                calls, com_seconds = self.profiler.end_document(file_path.name)
+                self.office.details['com_calls'] = calls
+                self.office.details['com_seconds'] = round(com_seconds, 4)
+            if self.staging is not None:
+                self.staging.release_input(file_path)
+            if info.get('lease') is not None:
+                self._finish_lease(info['lease'], outcome)
+        seconds = time.perf_counter() - begin
+        event = ConversionEvent(
+            EVENT_TYPES[outcome], self.office.kind, file_path, pdf_path=info['pdf_path'], outcome=outcome,
+            seconds=seconds, phases=dict(info['phases']), error=info.get('error'))
+        if info.get('committed') is not None:
+            # PDFの確定はI/Oスレッドで行うため、成功の通知はその後に同じスレッドで行う
+            self.io.submit(file_path.name, self._notify_committed, info['committed'], event)
+        else:
+            notify(self.on_event, event)
+        if self.trace:
+            self._emit_trace(file_path, outcome, seconds, info)
+        if self.history is not None and outcome in ('success', 'timeout') and info.get('input_bytes') is not None:
+            self._record_history(file_path, outcome, seconds, info)
+        if outcome == 'timeout':
+            # 新しいインスタンスで続行
+            self._recycle("タイムアウト")
+        elif info.get('office_lost'):
+            self._recycle("応答しなくなったため")
+        self._count_gc()
+        return outcome
+
+    def _count_gc(self):
+        collections, seconds = self.office.lifecycle.drain()
+        self.stats['gc'] += collections
+        self.stats['gc_seconds'] += seconds
+
+    def _convert(self, file_path, info):
+        office, logger, stats, cache = self.office, self.logger, self.stats, self.cache
+        phases = info['phases']
+        abs_path = str(file_path.resolve())
+        pdf_path = pdf_path_for(file_path, self.output_folder, self.source_root)
+        done_folder = file_path.parent / DONE_FOLDER_NAME
+        info['pdf_path'] = pdf_path
+        if self.source_root is not None and self.output_folder:
+            os.makedirs(os.path.dirname(pdf_path), exist_ok=True)
+        if self.leases is not None:
             try:
-                deck = powerpoint.Presentations.Open(abs_path, WithWindow=False)
-                deck.SaveAs(pdf_path, ppSaveAsPDF)
-                logger.info(f"[成功] {file_path.name}")
-                success = True
-                stats['success'] += 1
-            except Exception as e:
-                logger.error(f"[エラー] {file_path.name}: {e}")
-                stats['error'] += 1
-            finally:
-                if deck:
-                    try:
-                        deck.Close()
-                    except:
-                        pass
-                    del deck
-                gc.collect()
+                info['lease'] = self.leases.claim(file_path)
+            except OSError as e:
+                logger.warning(f"  [警告] リースを取得できません: {file_path.name} -> {e}")
+                info['lease'] = None
+            if info['lease'] is None:
+                logger.info(f"[スキップ] 他のホストが処理中または処理済み: {file_path.name}")
+                stats['skip'] += 1
+                stats['elsewhere'] += 1
+                return 'skip'
+        write_journal('claimed', file_path, pdf=pdf_path)
+        if self.trace or self.history is not None:
+            info['input_bytes'] = file_size(abs_path)
+        source = abs_path
+        if self.staging is not None:
+            with timed(phases, 'stage'):
+                source = self._staged_source(file_path, abs_path)
+        info['source'] = source
+
+        content_hash = None
+        if cache:
+            settings = office.settings_key()
+            with timed(phases, 'hash'):
+                content_hash = info['content_hash'] = file_hash(source)
+            record = cache.lookup(pdf_path)
+            if self.outputs.exists(pdf_path) and record is None:
+                # キャッシュ導入前のPDF: 現在の内容で変換済みとみなして記録
+                cache.record(file_path.name, pdf_path, content_hash, settings)
+                record = (content_hash, settings)
+            if self.outputs.exists(pdf_path) and record == (content_hash, settings):
+                logger.info(f"[スキップ] 変換済み (内容変更なし): {file_path.name}")
+                stats['skip'] += 1
+                return 'skip'
+
+            # 複製元のPDFがまだ確定待ちの場合があるため、先に投入済みのI/Oを済ませる
+            self.finish_io()
+            duplicate = cache.find_duplicate(content_hash, settings, pdf_path)
+            if duplicate:
+                try:
+                    with timed(phases, 'copy'):
+                        link_or_copy(duplicate, partial_pdf_path(pdf_path))
+                    self.outputs.add(pdf_path)
+                    cache.record(file_path.name, pdf_path, content_hash, settings)
+                    logger.info(f"[成功] {file_path.name} (同一内容のPDFを複製: {Path(duplicate).name})")
+                    stats['success'] += 1
+                    stats['duplicate'] += 1
+                    info['output_bytes'] = file_size(partial_pdf_path(pdf_path))
+                    # 複製元が後処理前の場合もあり、メタデータ (元ファイル名) も異なるため、同じ後処理を行う
+                    info['committed'] = self.io.submit(file_path.name, self._finish_output, file_path, pdf_path,
+                                                       done_folder, self.postprocess is not None)
+                    return 'duplicate'
+                except Exception as e:
+                    logger.warning(f"  [警告] PDF複製失敗のため変換します: {file_path.name} -> {e}")
+        elif self.outputs.exists(pdf_path):
+            logger.info(f"[スキップ] PDF既存: {file_path.name}")
+            stats['skip'] += 1
+            return 'skip'
 
-            if success:
-                move_to_done(file_path, done_folder, logger)
+        if self.failures is not None and self._known_failure(file_path, info):
+            return 'skip'
 
-    finally:
-        if powerpoint:
+        if self.preflight:
             try:
-                powerpoint.Quit()
-            except:
-                pass
-            del powerpoint
-            gc.collect()
+                with timed(phases, 'preflight'):
+                    preflight_check(source)
+            except PreflightError as e:
+                logger.warning(f"[除外] {file_path.name}: {e}")
+                stats['rejected'] += 1
+                stats[e.reason] += 1
+                info['error'] = str(e)
+                info['reason'] = info['category'] = e.reason
+                return 'rejected'
 
-    logger.info("--- PowerPoint変換終了 ---\n")
-    return stats
+        self.ensure_office()
+        reason = self.policy.reason(office) if self.policy else None
+        if reason:
+            self._recycle(reason)
 
+        if self.split is not None and self.split.min_seconds and self.history is not None:
+            office.expected_seconds = self.estimator().estimate_file(office.kind, file_path)
+        output_path = self.staging.output_path(pdf_path) if self.staging is not None else partial_pdf_path(pdf_path)
+        timed_out = False
+        try:
+            office.documents += 1
+            if self.watchdog and office.pid is not None:
+                self.watchdog.arm(office.pid, self.timeout)
+            try:
+                # 一時ファイルへ書き出し、完了後にリネームする (書きかけを変換済みと誤認しない)
+                office.export(source, output_path)
+            finally:
+                if self.watchdog:
+                    timed_out = self.watchdog.disarm()
+                phases.update(office.timings)
+            if timed_out:
+                raise TimeoutError()
+        except Exception as e:
+            stats['error'] += 1
+            if timed_out:
+                logger.error(f"[タイムアウト] {file_path.name}: {self.timeout}秒以内に完了しませんでした")
+                stats['timeout'] += 1
+                info['error'] = f"{self.timeout}秒以内に完了しませんでした"
+                info['category'] = 'timeout'
+                self._discard(output_path)
+                return 'timeout'
+            office.log_error(file_path, e)
+            info['error'] = str(e) or type(e).__name__
+            info['category'] = type(e).__name__
+            # Officeが落ちた場合、後続のファイルまで失敗しないよう起動し直す (convertで行う)
+            info['office_lost'] = not office.responsive()
+            self._discard(output_path)
+            return 'error'
 
-def convert_excel_to_pdf(target_folder, output_folder, logger):
-    """ Excel変換 (強化版: ダイアログ抑制・非表示シート回避) """
-    files = list(Path(target_folder).glob("*.xlsx")) + \
-            list(Path(target_folder).glob("*.xlsm")) + \
-            list(Path(target_folder).glob("*.xls"))
-    
-    stats = {'success': 0, 'skip': 0, 'error': 0}
-    if not files:
-        return stats
+        logger.info(f"[成功] {file_path.name}")
+        stats['success'] += 1
+        self.outputs.add(pdf_path)
+        if self.trace:
+            info['output_bytes'] = file_size(output_path)
+        elif self.history is not None:
+            # 変換履歴のページ数は、Officeに問い合わせず出力したPDFから読む
+            info['pages'] = pdf_page_count(output_path)
+        if cache:
+            cache.record(file_path.name, pdf_path, content_hash, office.settings_key())
+        local_pdf = None
+        if self.staging is not None:
+            self.staging.hold_output(output_path)
+            local_pdf = output_path
+        # アップロード・リネームとdoneへの移動はI/Oスレッドに任せ、Officeはすぐ次のファイルへ進む
+        info['committed'] = self.io.submit(file_path.name, self._finish_output, file_path, pdf_path, done_folder,
+                                           self.postprocess is not None, local_pdf)
+        return 'success'
 
-    done_folder = target_folder / "done"
-    done_folder.mkdir(exist_ok=True)
+    def estimator(self):
+        """ 分割の要否を判断するための所要時間の見積もり (初回のみ履歴を読む) """
+        if self._estimator is None:
+            self._estimator = self.history.estimator()
+        return self._estimator
 
-    logger.info(f"--- Excel変換開始: {len(files)}件 ---")
+    def _failure_hash(self, info):
+        """ 失敗記録の照合用の内容ハッシュ (記録に同じサイズが無い場合はNone) """
+        if 'failure_hash' not in info:
+            size = file_size(info['source'])
+            info['failure_hash'] = None
+            if size is not None and self.failures.may_have_failed(size):
+                info['failure_hash'] = info.get('content_hash') or file_hash(info['source'])
+        return info['failure_hash']
 
-    excel = None
-    try:
-        excel = win32com.client.Dispatch("Excel.Application")
-        excel.Visible = False
-        excel.DisplayAlerts = False     # 警告抑制
-        excel.AskToUpdateLinks = False  # リンク更新確認抑制
-        excel.ScreenUpdating = False    # 描画停止
-    except Exception as e:
-        logger.error(f"Excel起動失敗: {e}")
-        return stats
+    def _known_failure(self, file_path, info):
+        """ 前回までに失敗した内容なら、再試行の時期まで見送るか隔離する """
+        content_hash = self._failure_hash(info)
+        known = self.failures.lookup(content_hash) if content_hash else None
+        if known is None:
+            return False
+        category, attempts, retry_at = known
+        if self.failures.should_quarantine(attempts):
+            # 隔離済みの内容が再び置かれた
+            self._quarantine(file_path, f"{category} で{attempts}回失敗済み")
+            self.stats['skip'] += 1
+            return True
+        if time.time() < retry_at:
+            retry = datetime.fromtimestamp(retry_at).strftime('%Y-%m-%d %H:%M')
+            self.logger.info(f"[スキップ] 前回までに{attempts}回失敗 ({category})、{retry}以降に再試行: {file_path.name}")
+            self.stats['skip'] += 1
+            self.stats['backoff'] += 1
+            return True
+        return False
 
-    try:
-        for i, file_path in enumerate(files):
-            if i % 10 == 0:
-                logger.info(f"Excel 処理中... {i+1}/{len(files)}")
+    def _record_failure(self, file_path, outcome, info):
+        if 'source' not in info:
+            return
+        if outcome in ('success', 'duplicate'):
+            content_hash = info.get('failure_hash')
+            if content_hash:
+                self.failures.clear(content_hash)
+            return
+        if outcome not in ('error', 'rejected') or info.get('office_lost'):
+            # タイムアウトやOfficeの異常終了は、インスタンス側の問題に巻き込まれただけの場合があるため数えない
+            return
+        try:
+            size = file_size(info['source'])
+            info['failure_hash'] = (info.get('failure_hash') or info.get('content_hash')
+                                    or file_hash(info['source']))
+            attempts = self.failures.record(info['failure_hash'], file_path.name, size,
+                                            info.get('category', outcome), info.get('error'))
+        except (OSError, sqlite3.Error) as e:
+            self.logger.warning(f"  [警告] 失敗の記録に失敗: {file_path.name} -> {e}")
+            return
+        if self.failures.should_quarantine(attempts):
+            self._quarantine(file_path, f"{attempts}回失敗")
+
+    def _quarantine(self, file_path, reason):
+        self.logger.warning(f"[隔離] {file_path.name}: {reason} -> {QUARANTINE_FOLDER_NAME}フォルダへ移動")
+        self.stats['quarantined'] += 1
+        self.io.submit(file_path.name, move_to_done, file_path, file_path.parent / QUARANTINE_FOLDER_NAME,
+                       self.logger)
 
-            abs_path = str(file_path.resolve())
-            
-            if output_folder:
-                pdf_path = str((output_folder / file_path.with_suffix('.pdf').name).resolve())
+    def _finish_lease(self, key, outcome):
+        try:
+            if outcome is None:
+                self.leases.release(key)
             else:
-                pdf_path = str(file_path.with_suffix('.pdf').resolve())
+                self.leases.complete(key, outcome)
+        except OSError as e:
+            self.logger.warning(f"  [警告] リースの完了記録に失敗: {e}")
 
-            if os.path.exists(pdf_path):
-                logger.info(f"[スキップ] PDF既存: {file_path.name}")
-                stats['skip'] += 1
-                continue
+    def _staged_source(self, file_path, abs_path):
+        """ ローカルにコピー済みならそのパス、そうでなければ元のパス """
+        try:
+            return self.staging.local_copy(file_path) or abs_path
+        except Exception as e:
+            self.logger.warning(f"  [警告] ローカルへのコピー失敗のため元の場所から開きます: {file_path.name} -> {e}")
+            return abs_path
+
+    def wanted(self, file_path):
+        """ 変換が必要になり得るか (ステージングで先読みするか)。キャッシュ使用時は内容を見るまで分からない """
+        return self.cache is not None or not self.outputs.exists(
+            pdf_path_for(file_path, self.output_folder, self.source_root))
 
-            wb = None
-            success = False
+    def _finish_output(self, file_path, pdf_path, done_folder, postprocess, local_pdf=None):
+        """ (I/Oスレッド) PDFを確定し、後処理を投入して元ファイルをdoneへ移動する """
+        if local_pdf is not None:
+            self.staging.upload(local_pdf, partial_pdf_path(pdf_path))
+        commit_output(partial_pdf_path(pdf_path), pdf_path)
+        write_journal('exported', file_path, pdf=pdf_path)
+        if postprocess:
+            # 圧縮等は後処理のスレッドに任せる
+            future = self.postprocess.submit(pdf_path, file_path.name)
+            with self._postprocessing_lock:
+                self._postprocessing.append((Path(pdf_path).name, future))
+        if move_to_done(file_path, done_folder, self.logger):
+            write_journal('moved', file_path)
+
+    def _notify_committed(self, committed, event):
+        """ (I/Oスレッド) PDFを確定できなかった場合は失敗として通知する """
+        error = committed.exception()
+        if error is not None:
+            event.type, event.outcome, event.error = 'failed', 'error', f"PDFの保存に失敗しました: {error}"
+        notify(self.on_event, event)
+
+    @staticmethod
+    def _discard(output_path):
+        """ 書きかけのPDFを残さない """
+        try:
+            os.remove(output_path)
+        except OSError:
+            pass
+
+    def finish_io(self):
+        """ 投入済みのリネーム・移動の完了を待つ。PDFを確定できなかったファイルは失敗に数え直す """
+        for name, e in self.io.drain():
+            self.logger.error(f"[失敗] {name}: PDFの保存に失敗しました -> {e}")
+            self.stats['success'] -= 1
+            self.stats['error'] += 1
+
+    def finish_postprocess(self):
+        """ 投入済みのPDF後処理の完了を待ち、削減量を集計する """
+        with self._postprocessing_lock:
+            pending, self._postprocessing = self._postprocessing, []
+        for name, future in pending:
             try:
-                # ダイアログを出させない強力なOpen設定
-                wb = excel.Workbooks.Open(
-                    abs_path, 
-                    UpdateLinks=0, 
-                    ReadOnly=True, 
-                    IgnoreReadOnlyRecommended=True,
-                    CorruptLoad=1
-                )
+                before, after = future.result()
+            except Exception as e:
+                self.logger.warning(f"  [警告] PDF後処理失敗: {name} -> {e}")
+                self.stats['postprocess_error'] += 1
+                continue
+            self.stats['postprocessed'] += 1
+            self.stats['pdf_bytes_in'] += before
+            self.stats['pdf_bytes_out'] += after
+            self.logger.info(f"[後処理] {name}: {format_bytes(before)} -> {format_bytes(after)} "
+                             f"(削減 {format_bytes(before - after)})")
 
-                # 表示されているシートのみを抽出
-                visible_sheets = []
-                for ws in wb.Worksheets:
-                    if ws.Visible == xlSheetVisible:
-                        # 印刷設定の自動調整
-                        if not ws.PageSetup.PrintArea:
-                            ws.PageSetup.Zoom = False
-                            ws.PageSetup.FitToPagesWide = 1
-                            ws.PageSetup.FitToPagesTall = False
-                        visible_sheets.append(ws.Name)
-                
-                if visible_sheets:
-                    # 可視シートのみを選択してPDF化
-                    wb.Worksheets(visible_sheets).Select()
-                    wb.ActiveSheet.ExportAsFixedFormat(xlTypePDF, pdf_path, IgnorePrintAreas=False)
-                    
-                    logger.info(f"[成功] {file_path.name}")
-                    success = True
-                    stats['success'] += 1
+    def _recycle(self, reason):
+        try:
+            seconds = self.office.recycle(reason)
+        except Exception as e:
+            self.logger.error(f"{self.office.label}再起動失敗: {e}")
+            raise _OfficeUnavailable() from e
+        self.stats['recycle_seconds'] += seconds
+        self.stats['recycle'] += 1
+        notify(self.on_event, ConversionEvent('recycled', self.office.kind, seconds=seconds))
+
+    def _record_history(self, file_path, outcome, seconds, info):
+        details = self.office.details
+        try:
+            self.history.record(self.office.kind, file_path.name, info['input_bytes'], seconds, outcome,
+                                pages=details.get('pages', details.get('slides', info.get('pages'))),
+                                sheets=details.get('visible_sheets'))
+        except sqlite3.Error as e:
+            self.logger.warning(f"  [警告] 変換履歴の記録失敗: {file_path.name} -> {e}")
+
+    def _emit_trace(self, file_path, outcome, seconds, info):
+        record = {
+            'type': 'file',
+            'ts': datetime.now().isoformat(timespec='milliseconds'),
+            'kind': self.office.kind,
+            'file': str(file_path),
+            'outcome': outcome,
+            'seconds': round(seconds, 4),
+            'phases': {name: round(value, 4) for name, value in info['phases'].items()},
+            'input_bytes': info.get('input_bytes'),
+            'output_bytes': info.get('output_bytes'),
+            'worker': f"{os.getpid()}/{threading.current_thread().name}",
+            'instance': self.office.instance_id,
+        }
+        if outcome not in ('skip', 'duplicate'):
+            record.update(self.office.details)
+        for key in ('error', 'reason'):
+            if key in info:
+                record[key] = info[key]
+        emit_trace(record)
+
+
+def convert_files(office, files, output_folder, logger, keep_open=False, stop_event=None, **options):
+    """
+    1つのOfficeインスタンスでファイル群を順に変換し、成功分を各フォルダのdoneへ移動。
+    filesはリストの他、キュー等から順次取り出すイテレータでもよい (件数不明として扱う)。
+    Officeは最初に変換が必要になった時点で起動する (起動済みならそのまま使う)。
+    cacheを指定すると、PDFの有無ではなく内容ハッシュで変換要否を判断する。
+    source_rootを指定すると、出力先に元のサブフォルダ構成を再現する。
+    keep_open=Trueの場合は終了時にOfficeを閉じない (監視モード用)。
+    recycleには形式毎のRecyclePolicyを渡す。条件を満たすと次の変換前にOfficeを再起動する。
+    timeoutには形式毎の1件あたりの制限時間 (秒) を渡す。超過するとOfficeを強制終了し、
+    タイムアウトとして記録した上で新しいインスタンスで次のファイルへ進む。
+    trace=Trueの場合、1件毎の工程別所要時間などをトレース (emit_trace) へ出力する。
+    preflight=True (既定) の場合、Officeで開く前にパスワード保護・破損などを調べ、
+    変換できないファイルは除外 (rejected) として記録する。
+    historyにConversionHistoryを渡すと、変換した各ファイルの所要時間を記録する。
+    on_eventを渡すと、1件毎に開始・結果の進捗イベント (ConversionEvent) を通知する。
+    成功の通知はPDFの確定後にI/Oスレッドから行うため、on_eventはスレッドセーフであること。
+    postprocessにPdfPostProcessorを渡すと、変換したPDFを次の変換と並行して圧縮し、
+    終了時に完了を待って削減量を集計する。
+    stagingにStagingAreaを渡すと、元ファイルを先読みしてローカルにコピーし、PDFもローカルに書き出してから出力先へ送る。
+    leasesにLeaseQueueを渡すと、1件毎にリースを取得してから変換し、複数ホストで同じフォルダを分担する。
+    failuresにFailureRegistryを渡すと、失敗した内容を記録し、再試行の時期まで見送り、繰り返し失敗したら隔離する。
+    splitにSplitPolicyを渡すと、条件を満たす大きなブックを複数のExcelインスタンスで分担して出力し、1つのPDFに結合する。
+    profileにExportProfileを渡すと、その品質設定でPDFを出力する (キャッシュキーにも含める)。
+    com_profile=Trueの場合、COM呼び出しの回数・所要時間を呼び出し箇所毎に集計し、終了時にログへ報告する
+    (1件毎の回数・秒はトレースにも含める)。python_profile=Trueの場合、Python側もcProfileで計測する。
+    tune_session=False の場合、Officeの速度に効く設定 (session_settings) を変更せずに変換する (比較用)。
+    manual_calculation=Trueの場合、Excelを手動計算にして保存されている計算結果のまま出力する (キャッシュキーにも含める)。
+    gc_policyにGcPolicyを渡すと、循環参照の回収 (gc.collect) を行う条件を変更する (既定は50件毎またはPythonのヒープが100万ブロック増加した時)。
+    stop_eventがセットされると、実行中の1件を終えた時点で中断する。
+    """
+    batch = BatchConverter(office, output_folder, logger, **options)
+    total = len(files) if hasattr(files, '__len__') else None
+    if batch.staging is not None:
+        files = batch.staging.prefetch(files, batch.wanted)
+    started = False
+
+    try:
+        for i, file_path in enumerate(files):
+            if stop_event is not None and stop_event.is_set():
+                logger.info(f"{office.label} 中断しました")
+                break
+            if not started:
+                if total is None:
+                    logger.info(f"--- {office.label}変換開始 ---")
                 else:
-                    logger.warning(f"[警告] {file_path.name}: 表示可能なシートがありません")
-                    stats['error'] += 1
+                    logger.info(f"--- {office.label}変換開始: {total}件 ---")
+                started = True
 
-            except Exception as e:
-                err_msg = str(e)
-                if "Password" in err_msg:
-                    logger.error(f"[パスワード保護] {file_path.name}: 開けませんでした")
+            if i % 10 == 0:
+                if total is None:
+                    logger.info(f"{office.label} 処理中... {i+1}件目")
                 else:
-                    logger.error(f"[エラー] {file_path.name}: {e}")
-                stats['error'] += 1
-            finally:
-                if wb:
-                    try:
-                        wb.Close(SaveChanges=False)
-                    except:
-                        pass
-                    del wb
-                gc.collect()
-            
-            if success:
-                move_to_done(file_path, done_folder, logger)
+                    logger.info(f"{office.label} 処理中... {i+1}/{total}")
 
-    finally:
-        if excel:
             try:
-                excel.ScreenUpdating = True
-                excel.DisplayAlerts = True
-                excel.Quit()
-            except:
-                pass
-            del excel
-            gc.collect()
+                batch.convert(file_path)
+            except _OfficeUnavailable:
+                return batch.stats
+
+    finally:
+        if batch.staging is not None:
+            files.close()
+        if started:
+            batch.close(keep_open)
+
+    if started:
+        logger.info(f"--- {office.label}変換終了 ---\n")
+    return batch.stats
+
+
+def _convert_format(kind, target_folder, output_folder, logger, files, recursive=False, **options):
+    target_folder = Path(target_folder) if target_folder is not None else None
+    logger = logger or logging.getLogger(LOGGER_NAME)
+    if files is None:
+        files = find_files(target_folder, kind, recursive=recursive, exclude=(output_folder,))
+    if recursive:
+        options.setdefault('source_root', target_folder)
+    return convert_files(APP_CLASSES[kind](logger), files, output_folder, logger, **options)
+
+
+def convert_ppt_to_pdf(target_folder, output_folder=None, logger=None, files=None, **options):
+    """ PowerPoint変換 """
+    return _convert_format('ppt', target_folder, output_folder, logger, files, **options)
+
 
-    logger.info("--- Excel変換終了 ---\n")
-    return stats
+def convert_excel_to_pdf(target_folder, output_folder=None, logger=None, files=None, **options):
+    """ Excel変換 (強化版: ダイアログ抑制・非表示シート回避) """
+    return _convert_format('excel', target_folder, output_folder, logger, files, **options)
 
 
-def convert_word_to_pdf(target_folder, output_folder, logger):
+def convert_word_to_pdf(target_folder, output_folder=None, logger=None, files=None, **options):
     """ Word変換 """
-    files = list(Path(target_folder).glob("*.docx")) + \
-            list(Path(target_folder).glob("*.docm")) + \
-            list(Path(target_folder).glob("*.doc"))
+    return _convert_format('word', target_folder, output_folder, logger, files, **options)
+
+
+def convert_serial(target_folder, output_folder, logger, recursive=False, dir_index=None, paths=None, **options):
+    """
+    PowerPoint -> Excel -> Word の順に1インスタンスずつ変換する (既定の実行方法)。
+    pathsを指定するとフォルダを走査せず、そのファイルを変換する (各実行方法で共通)。
+    戻り値は形式毎の統計。
+    """
+    groups = group_files(target_folder, paths, recursive=recursive, dir_index=dir_index, exclude=(output_folder,))
+    options.setdefault('outputs', OutputIndex())
+    for kind, files in groups.items():
+        for file_path in files:
+            notify_queued(options, kind, file_path)
+    return {
+        'ppt': convert_ppt_to_pdf(target_folder, output_folder, logger, files=groups['ppt'],
+                                  recursive=recursive, **options),
+        'excel': convert_excel_to_pdf(target_folder, output_folder, logger, files=groups['excel'],
+                                      recursive=recursive, **options),
+        'word': convert_word_to_pdf(target_folder, output_folder, logger, files=groups['word'],
+                                    recursive=recursive, **options),
+    }
+
+
+# --- 並列実行 (プロセスプール) ---
+
+def split_chunks(files, n):
+    """ ファイル一覧をn個のチャンクに均等に振り分ける (空のチャンクは除く) """
+    return [files[i::n] for i in range(n) if files[i::n]]
+
+
+def chunk_count(kind, workers):
+    """ 形式毎のチャンク数 (1プロセスを共有する形式は1) """
+    return 1 if APP_CLASSES[kind].single_instance else workers
+
+
+def schedule_chunks(groups, workers, estimator=None):
+    """
+    形式毎のファイルをワーカー数のチャンクに分け、投入順に (kind, チャンク, 見積もり秒) を返す。
+    PowerPointのように1プロセスを共有する形式は、1つのチャンク (1ワーカー) にまとめる。
+    estimatorがあれば見積もりの長いファイルから負荷の小さいチャンクへ割り当て (LPT法)、
+    チャンクも長い順に投入する。無ければ均等に分け、形式を交互に投入する。
+    """
+    if estimator is None:
+        chunks_by_kind = [
+            [(kind, chunk, None) for chunk in split_chunks(files, chunk_count(kind, workers))]
+            for kind, files in groups.items()
+        ]
+        # 形式を交互に投入し、PowerPoint/Excel/Wordが同時に進むようにする
+        return [task for tasks in zip_longest(*chunks_by_kind) for task in tasks if task]
+
+    tasks = []
+    for kind, files in groups.items():
+        estimates = {file_path: estimator.estimate_file(kind, file_path) for file_path in files}
+        for total, chunk in partition_longest_first(files, chunk_count(kind, workers), estimates.get):
+            tasks.append((kind, chunk, total))
+    return sorted(tasks, key=lambda task: task[2], reverse=True)
+
 
-    stats = {'success': 0, 'skip': 0, 'error': 0}
-    if not files:
-        return stats
+def _init_worker(log_queue):
+    """
+    ワーカープロセスの初期化: 専用のCOMアパートメントを用意し、ログは親プロセスへ転送
+    """
+    pythoncom.CoInitialize()
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(logging.INFO)
+    logger.handlers.clear()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    for name in (TRACE_LOGGER_NAME, EVENT_LOGGER_NAME, JOURNAL_LOGGER_NAME):
+        forward_logger = logging.getLogger(name)
+        forward_logger.setLevel(logging.INFO)
+        forward_logger.propagate = False
+        forward_logger.handlers.clear()
+        forward_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+
+
+class _LogRouter:
+    """
+    ワーカーから届いたレコードを親プロセス側へ振り分ける
+    (トレースはトレース用のロガーへ、進捗イベントはon_eventへ、それ以外は通常のログへ)
+    """
+
+    def __init__(self, logger, on_event=None):
+        self.logger = logger
+        self.on_event = on_event
+
+    def handle(self, record):
+        if record.name in (TRACE_LOGGER_NAME, JOURNAL_LOGGER_NAME):
+            logging.getLogger(record.name).handle(record)
+        elif record.name == EVENT_LOGGER_NAME:
+            notify(self.on_event, record.event)
+        else:
+            self.logger.handle(record)
+
+
+def _convert_chunk(kind, files, output_folder, options):
+    """ ワーカー側: 自プロセスのOfficeインスタンスでチャンクを変換 """
+    logger = logging.getLogger(LOGGER_NAME)
+    office = APP_CLASSES[kind](logger)
+    try:
+        return convert_files(office, files, output_folder, logger, **options)
+    finally:
+        for key in ('cache', 'history', 'postprocess', 'staging', 'leases', 'failures'):
+            if options.get(key):
+                options[key].close()
+
+
+def convert_parallel(target_folder, output_folder, logger, workers, recursive=False, dir_index=None, paths=None,
+                     **options):
+    """
+    プロセスプールによる並列変換。各ワーカーが自前のOfficeインスタンスを起動し、
+    形式毎のファイルをワーカー数で分割して処理する (PowerPointは1ワーカーで全件を処理する)。historyを指定すると、
+    過去の所要時間から見積もった長いファイル・チャンクから順に割り当てる。戻り値は形式毎の統計。
+    """
+    target_folder = Path(target_folder) if target_folder is not None else None
+    results = {kind: new_stats() for kind in APP_CLASSES}
+    groups = group_files(target_folder, paths, recursive=recursive, dir_index=dir_index, exclude=(output_folder,))
+    if recursive:
+        options.setdefault('source_root', target_folder)
+    # 中断はワーカーへ渡せないため親側で扱い、イベントはログと同じキューで親へ送る
+    stop_event = options.pop('stop_event', None)
+    on_event = options.get('on_event')
+    if on_event is not None:
+        options['on_event'] = _forward_event
+    for kind, files in groups.items():
+        for file_path in files:
+            notify_queued({'on_event': on_event}, kind, file_path)
+
+    log_queue = multiprocessing.Queue()
+    listener = logging.handlers.QueueListener(log_queue, _LogRouter(logger, on_event))
+    listener.start()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(log_queue,)) as pool:
+            history = options.get('history')
+            estimator = history.estimator() if history is not None else None
+            futures = {}
+            for kind, chunk, _ in schedule_chunks(groups, workers, estimator):
+                future = pool.submit(_convert_chunk, kind, chunk, output_folder, options)
+                futures[future] = (kind, chunk)
+
+            for future in as_completed(futures):
+                if stop_event is not None and stop_event.is_set():
+                    # 未着手のチャンクは取り消す (実行中のチャンクは最後まで変換する)
+                    for pending in futures:
+                        pending.cancel()
+                kind, chunk = futures[future]
+                if future.cancelled():
+                    continue
+                try:
+                    merge_stats(results[kind], future.result())
+                except Exception as e:
+                    logger.error(f"[エラー] {APP_CLASSES[kind].label} ワーカー異常終了 ({len(chunk)}件): {e}")
+                    results[kind]['error'] += len(chunk)
+    finally:
+        listener.stop()
+
+    return results
 
-    done_folder = target_folder / "done"
-    done_folder.mkdir(exist_ok=True)
 
-    logger.info(f"--- Word変換開始: {len(files)}件 ---")
+# --- パイプライン実行 (形式毎のレーンを同時実行) ---
 
-    word = None
+def _run_lane(kind, lane_queue, output_folder, logger, results, options):
+    """ レーン用スレッド: 専用のCOMアパートメントとOfficeインスタンスでキューを消化 """
+    pythoncom.CoInitialize()
     try:
-        word = win32com.client.Dispatch("Word.Application")
-        word.Visible = False
-        word.DisplayAlerts = False
+        office = APP_CLASSES[kind](logger)
+        results[kind] = convert_files(office, iter(lane_queue.get, None), output_folder, logger, **options)
     except Exception as e:
-        logger.error(f"Word起動失敗: {e}")
-        return stats
+        logger.error(f"[エラー] {APP_CLASSES[kind].label} レーン異常終了: {e}")
+    finally:
+        pythoncom.CoUninitialize()
+
+
+def convert_pipeline(target_folder, output_folder, logger, recursive=False, dir_index=None, paths=None, **options):
+    """
+    PowerPoint/Excel/Wordの3レーンをスレッドで同時に実行する。
+    各レーンは専用のキューとOfficeインスタンスを持ち、走査したファイルから順に変換を始める。
+    戻り値は形式毎の統計。
+    """
+    target_folder = Path(target_folder) if target_folder is not None else None
+    results = {kind: new_stats() for kind in APP_CLASSES}
+    queues = {kind: queue.Queue() for kind in APP_CLASSES}
+    stop_event = options.get('stop_event')
+    if recursive:
+        options.setdefault('source_root', target_folder)
+    # 出力先の一覧はレーン間で共有する
+    options.setdefault('outputs', OutputIndex())
+
+    lanes = [
+        threading.Thread(target=_run_lane, name=f"lane-{kind}",
+                         args=(kind, queues[kind], output_folder, logger, results, options))
+        for kind in APP_CLASSES
+    ]
+    for lane in lanes:
+        lane.start()
 
     try:
-        for i, file_path in enumerate(files):
-            if i % 10 == 0:
-                logger.info(f"Word 処理中... {i+1}/{len(files)}")
+        # 走査しながら形式毎のレーンへ振り分ける
+        for kind, file_path in source_files(target_folder, paths, recursive=recursive, dir_index=dir_index,
+                                            exclude=(output_folder,)):
+            if stop_event is not None and stop_event.is_set():
+                break
+            notify_queued(options, kind, file_path)
+            queues[kind].put(file_path)
+    finally:
+        # 終端を通知してレーンの完了を待つ
+        for lane_queue in queues.values():
+            lane_queue.put(None)
+        for lane in lanes:
+            lane.join()
 
-            abs_path = str(file_path.resolve())
+    return results
 
-            if output_folder:
-                pdf_path = str((output_folder / file_path.with_suffix('.pdf').name).resolve())
-            else:
-                pdf_path = str(file_path.with_suffix('.pdf').resolve())
 
-            if os.path.exists(pdf_path):
-                logger.info(f"[スキップ] PDF既存: {file_path.name}")
-                stats['skip'] += 1
-                continue
+# --- 監視モード (常駐してOfficeを起動したまま変換) ---
+
+class PollingNotifier:
+    """
+    一定間隔でフォルダを走査し、新規・更新ファイルを通知する (既定の通知方式)。
+    書き込み途中のファイルを拾わないよう、2回続けてサイズと更新時刻が変わらなかったものだけを通知する。
 
-            doc = None
-            success = False
+    通知方式を差し替える場合は changes(stop_event) を同じ形で実装したオブジェクトを渡す。
+    """
+
+    def __init__(self, target_folder, interval=5.0, recursive=False, exclude=()):
+        self.target_folder = target_folder
+        self.interval = interval
+        self.recursive = recursive
+        self.exclude = exclude
+        self._pending = {}  # 前回の走査で見えたファイル -> (サイズ, 更新時刻)
+        self._notified = {}  # 通知済みファイル -> (サイズ, 更新時刻)
+
+    def poll(self):
+        """ 1回走査し、通知すべき (形式, Path) の一覧を返す """
+        current = {}
+        ready = []
+        for kind, file_path in scan_files(self.target_folder, recursive=self.recursive, exclude=self.exclude):
             try:
-                doc = word.Documents.Open(abs_path)
-                doc.SaveAs2(pdf_path, FileFormat=wdFormatPDF)
-                logger.info(f"[成功] {file_path.name}")
-                success = True
-                stats['success'] += 1
-            except Exception as e:
-                logger.error(f"[エラー] {file_path.name}: {e}")
-                stats['error'] += 1
-            finally:
-                if doc:
-                    try:
-                        doc.Close()
-                    except:
-                        pass
-                    del doc
-                gc.collect()
-            
-            if success:
-                move_to_done(file_path, done_folder, logger)
+                st = file_path.stat()
+            except OSError:
+                continue
+            signature = (st.st_size, st.st_mtime_ns)
+            current[file_path] = signature
+            if self._notified.get(file_path) == signature:
+                continue
+            if self._pending.get(file_path) == signature:
+                ready.append((kind, file_path))
+                self._notified[file_path] = signature
+
+        self._pending = current
+        self._notified = {p: sig for p, sig in self._notified.items() if p in current}
+        return ready
+
+    def changes(self, stop_event):
+        """ 停止されるまで、変化のあったファイルの一覧を順次返す """
+        while not stop_event.is_set():
+            batch = self.poll()
+            if batch:
+                yield batch
+            stop_event.wait(self.interval)
+
 
+def watch_folder(target_folder, output_folder, logger, interval=5.0, notifier=None, stop_event=None,
+                 recursive=False, **options):
+    """
+    監視モード: 対象フォルダを監視し、ファイルが届くたびに変換する。
+    Officeは形式毎に一度起動したら終了まで使い回すため、起動・終了のコストは最初の1回のみ。
+    Ctrl+C または stop_event で終了し、形式毎の統計を返す。
+    """
+    target_folder = Path(target_folder)
+    stop_event = stop_event or threading.Event()
+    notifier = notifier or PollingNotifier(target_folder, interval, recursive, exclude=(output_folder,))
+    offices = {kind: app_cls(logger) for kind, app_cls in APP_CLASSES.items()}
+    results = {kind: new_stats() for kind in APP_CLASSES}
+    if recursive:
+        options.setdefault('source_root', target_folder)
+
+    logger.info("--- 監視開始 (Ctrl+Cで終了) ---")
+    try:
+        for batch in notifier.changes(stop_event):
+            groups = {kind: [] for kind in APP_CLASSES}
+            for kind, file_path in batch:
+                groups[kind].append(file_path)
+                notify_queued(options, kind, file_path)
+            # 出力先は外部で変更され得るため、バッチ毎に一覧を読み直す
+            outputs = OutputIndex()
+            for kind, files in groups.items():
+                if files:
+                    stats = convert_files(offices[kind], files, output_folder, logger, outputs=outputs,
+                                          keep_open=True, stop_event=stop_event, **options)
+                    merge_stats(results[kind], stats)
+    except KeyboardInterrupt:
+        pass
     finally:
-        if word:
+        for office in offices.values():
+            office.quit()
+        logger.info("--- 監視終了 ---\n")
+
+    return results
+
+
+# --- ライブラリ用API (進捗イベントを順次返す) ---
+
+def convert_folder(source, output_folder=None, logger=None, workers=1, pipeline=False, watch=False,
+                   interval=5.0, stop_event=None, recursive=False, dir_index=None, **options):
+    """
+    他のプログラムから使うための入口。変換を別スレッドで実行し、進捗イベント (ConversionEvent) を
+    発生順に返すジェネレータ。最後に形式毎の統計 (stats) を持つ finished イベントを返して終わる。
+
+    sourceには対象フォルダ、またはファイルパスのイテラブル (拡張子で形式を判別し、走査はしない) を渡す。
+    実行方法はCLIと同じ (watch: 監視 / workers>1: 並列 / pipeline: パイプライン / 既定: 逐次)。
+    optionsはconvert_filesと同じ (cache / recycle / timeout / trace / preflight / history)。
+    stop_eventをセットするか、Ctrl+Cで、実行中の1件を終えた時点で中断する。
+    変換中の例外は、このジェネレータから送出する。
+
+        for event in convert_folder(r"C:\\inbox", r"C:\\pdf"):
+            if event.type == 'succeeded':
+                print(event.path, "->", event.pdf_path)
+    """
+    logger = logger or logging.getLogger(LOGGER_NAME)
+    stop_event = stop_event or threading.Event()
+    if isinstance(source, (str, os.PathLike)):
+        target_folder, paths = Path(source), None
+    elif watch:
+        raise ValueError("監視モードにはフォルダを指定してください")
+    else:
+        target_folder, paths = None, source
+    events = queue.Queue()
+    options['on_event'] = events.put
+    outcome = {}
+
+    def run():
+        pythoncom.CoInitialize()  # 呼び出し元とは別のスレッドのため、専用のCOMアパートメントを用意する
+        try:
+            if watch:
+                results = watch_folder(target_folder, output_folder, logger, interval=interval,
+                                       stop_event=stop_event, recursive=recursive, **options)
+            elif workers > 1:
+                results = convert_parallel(target_folder, output_folder, logger, workers, recursive=recursive,
+                                           dir_index=dir_index, paths=paths, stop_event=stop_event, **options)
+            elif pipeline:
+                results = convert_pipeline(target_folder, output_folder, logger, recursive=recursive,
+                                           dir_index=dir_index, paths=paths, stop_event=stop_event, **options)
+            else:
+                results = convert_serial(target_folder, output_folder, logger, recursive=recursive,
+                                         dir_index=dir_index, paths=paths, stop_event=stop_event, **options)
+            events.put(ConversionEvent('finished', stats=results))
+        except BaseException as e:
+            outcome['error'] = e
+            events.put(None)
+        finally:
+            pythoncom.CoUninitialize()
+
+    runner = threading.Thread(target=run, name="convert-folder", daemon=True)
+    runner.start()
+    try:
+        while True:
             try:
-                word.Quit()
-            except:
-                pass
-            del word
-            gc.collect()
+                event = events.get(timeout=0.5)  # Ctrl+Cを受け付けるため、待ち続けない
+            except queue.Empty:
+                continue
+            except KeyboardInterrupt:
+                logger.info("中断を受け付けました。実行中のファイルの変換後に終了します...")
+                stop_event.set()
+                continue
+            if event is None:
+                break
+            yield event
+            if event.type == 'finished':
+                break
+    finally:
+        # 途中で読むのをやめた場合も、実行中の変換を中断して後始末を待つ
+        stop_event.set()
+        runner.join()
+    if 'error' in outcome:
+        raise outcome['error']
+
+
+# --- メトリクス (--metrics-port / --metrics-file) ---
+
+METRICS_PREFIX = "pdfconv"
+LATENCY_BUCKETS = (0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600)  # 所要時間ヒストグラムの境界 (秒)
+
+
+class ConversionMetrics:
+    """
+    進捗イベント (ConversionEvent) から、形式毎の待ち件数・変換中の件数・結果毎の件数・所要時間の分布・
+    Officeの再起動回数と、直近window秒の処理件数 (毎分) を集計し、Prometheusのテキスト形式で出力する。
+    所要時間はOfficeで変換したもの (success/error/timeout) のみを対象とする。
+    """
+
+    def __init__(self, window=300.0, buckets=LATENCY_BUCKETS):
+        self.window = window
+        self.buckets = tuple(buckets)
+        self.started_at = time.time()
+        self.queued = {kind: 0 for kind in APP_CLASSES}
+        self.in_flight = {kind: 0 for kind in APP_CLASSES}
+        self.outcomes = {}  # (形式, 結果) -> 件数
+        self.restarts = {kind: 0 for kind in APP_CLASSES}
+        self.latency = {kind: [[0] * len(self.buckets), 0.0, 0] for kind in APP_CLASSES}  # 境界毎の件数, 合計, 件数
+        self.last_completion = None
+        self._completions = deque()  # 直近の完了時刻 (monotonic)
+        self._lock = threading.Lock()
+
+    def observe(self, event):
+        if event.kind not in APP_CLASSES:
+            return
+        kind = event.kind
+        with self._lock:
+            if event.type == 'queued':
+                self.queued[kind] += 1
+            elif event.type == 'started':
+                self.queued[kind] = max(0, self.queued[kind] - 1)
+                self.in_flight[kind] += 1
+            elif event.type == 'recycled':
+                self.restarts[kind] += 1
+            elif event.outcome is not None:
+                self.in_flight[kind] = max(0, self.in_flight[kind] - 1)
+                key = (kind, event.outcome)
+                self.outcomes[key] = self.outcomes.get(key, 0) + 1
+                self.last_completion = time.time()
+                self._completions.append(time.monotonic())
+                if event.outcome in ('success', 'error', 'timeout') and event.seconds is not None:
+                    counts, _, _ = histogram = self.latency[kind]
+                    for i, bound in enumerate(self.buckets):
+                        if event.seconds <= bound:
+                            counts[i] += 1
+                    histogram[1] += event.seconds
+                    histogram[2] += 1
+
+    def throughput(self):
+        """ 直近window秒 (開始からwindow秒未満の間は経過時間、ただし最短1分) の1分あたりの処理件数 """
+        now = time.monotonic()
+        with self._lock:
+            while self._completions and self._completions[0] < now - self.window:
+                self._completions.popleft()
+            done = len(self._completions)
+        span = min(self.window, max(time.time() - self.started_at, 60.0))
+        return done * 60 / span if span > 0 else 0.0
+
+    def render(self):
+        """ Prometheusのテキスト形式 """
+        p = METRICS_PREFIX
+        throughput = self.throughput()
+        lines = []
+
+        def metric(name, type_, help_, samples):
+            lines.append(f"# HELP {p}_{name} {help_}")
+            lines.append(f"# TYPE {p}_{name} {type_}")
+            for labels, value in samples:
+                value = value if isinstance(value, int) else round(value, 3)
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f"{p}_{name}{{{label_text}}} {value}" if label_text else f"{p}_{name} {value}")
+
+        with self._lock:
+            metric("queue_depth", "gauge", "Files waiting to be converted.",
+                   [((("format", k),), v) for k, v in self.queued.items()])
+            metric("in_flight", "gauge", "Files being converted.",
+                   [((("format", k),), v) for k, v in self.in_flight.items()])
+            metric("files_total", "counter", "Finished files by outcome.",
+                   [((("format", k), ("outcome", o)), v) for (k, o), v in sorted(self.outcomes.items())])
+            metric("office_restarts_total", "counter", "Office instance restarts.",
+                   [((("format", k),), v) for k, v in self.restarts.items()])
+            lines.append(f"# HELP {p}_conversion_seconds Conversion latency.")
+            lines.append(f"# TYPE {p}_conversion_seconds histogram")
+            for kind, (counts, total, n) in self.latency.items():
+                for bound, c in zip(self.buckets, counts):
+                    lines.append(f'{p}_conversion_seconds_bucket{{format="{kind}",le="{bound:g}"}} {c}')
+                lines.append(f'{p}_conversion_seconds_bucket{{format="{kind}",le="+Inf"}} {n}')
+                lines.append(f'{p}_conversion_seconds_sum{{format="{kind}"}} {round(total, 3)}')
+                lines.append(f'{p}_conversion_seconds_count{{format="{kind}"}} {n}')
+            metric("throughput_files_per_minute", "gauge",
+                   f"Files finished per minute over the last {self.window:g} seconds.", [((), throughput)])
+            metric("last_completion_timestamp_seconds", "gauge", "Unix time of the last finished file.",
+                   [((), self.last_completion or 0)])
+            metric("start_time_seconds", "gauge", "Unix time the run started.", [((), self.started_at)])
+        return "\n".join(lines) + "\n"
+
+
+class MetricsExporter:
+    """
+    ConversionMetricsを公開する。portを指定するとlocalhostのHTTP (/metrics) で、
+    textfileを指定するとinterval秒毎にファイルへ書き出す (node_exporterのtextfile collector用)。
+    """
+
+    def __init__(self, metrics, port=None, textfile=None, interval=15.0):
+        self.metrics = metrics
+        self.textfile = textfile
+        self.interval = interval
+        self.server = None
+        self._stop = threading.Event()
+        self._threads = []
+        if port is not None:
+            self.server = http.server.ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+            self._threads.append(threading.Thread(target=self.server.serve_forever, name="metrics-http",
+                                                  daemon=True))
+        if textfile:
+            self._threads.append(threading.Thread(target=self._write_loop, name="metrics-textfile",
+                                                  daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def port(self):
+        return self.server.server_address[1] if self.server else None
+
+    def _handler(self):
+        metrics = self.metrics
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # アクセスログは出さない
+
+        return Handler
+
+    def write(self):
+        """ textfileへ書き出す (読み手が書きかけを読まないよう、一時ファイルから置き換える) """
+        tmp = f"{self.textfile}.tmp"
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                f.write(self.metrics.render())
+            os.replace(tmp, self.textfile)
+        except OSError as e:
+            logging.getLogger(LOGGER_NAME).warning(f"  [警告] メトリクスの書き出し失敗: {e}")
 
-    logger.info("--- Word変換終了 ---\n")
-    return stats
+    def _write_loop(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def close(self):
+        self._stop.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        for thread in self._threads:
+            thread.join()
+        if self.textfile:
+            self.write()  # 最終値を残す
+
+
+# --- 実行計画 (--plan: 変換せずに所要時間を見積もる) ---
+
+def plan_run(target_folder, output_folder, logger, history, workers=1, pipeline=False, recursive=False):
+    """
+    変換対象を走査し、変換履歴から形式毎・全体の所要時間を見積もってログに出す (変換はしない)。
+    PDFが既にあるファイルは対象外とする。戻り値は形式毎の見積もり。
+    """
+    target_folder = Path(target_folder)
+    estimator = history.estimator()
+    groups = group_files(target_folder, recursive=recursive, exclude=(output_folder,))
+    outputs = OutputIndex()
+    source_root = target_folder if recursive else None
+    for kind in groups:
+        groups[kind] = [f for f in groups[kind]
+                        if not outputs.exists(pdf_path_for(f, output_folder, source_root))]
+
+    logger.info("=== 実行計画 (見積もり) ===")
+    plan = {}
+    for kind, files in groups.items():
+        estimates = [(estimator.estimate_file(kind, f), f) for f in files]
+        entry = {'files': len(files), 'seconds': sum(e for e, _ in estimates),
+                 'history': estimator.has_history(kind)}
+        plan[kind] = entry
+        line = f"  {APP_CLASSES[kind].label:<10} -> {len(files)}件, 計 {format_seconds(entry['seconds'])}"
+        if estimates:
+            longest, longest_file = max(estimates, key=lambda e: e[0])
+            line += f" (最長: {longest_file.name} {format_seconds(longest)})"
+        if files and not entry['history']:
+            line += " ※履歴なし (仮の見積もり)"
+        logger.info(line)
+
+    total = sum(entry['seconds'] for entry in plan.values())
+    if workers > 1:
+        durations = [task[2] for task in schedule_chunks(groups, workers, estimator)]
+        expected, mode = makespan(durations, workers), f"並列{workers}"
+    elif pipeline:
+        expected, mode = max((entry['seconds'] for entry in plan.values()), default=0.0), "パイプライン"
+    else:
+        expected, mode = total, "逐次"
+    logger.info(f"  合計 (1件ずつ変換した場合): {format_seconds(total)}")
+    logger.info(f"  見込み所要時間 ({mode}): {format_seconds(expected)}")
+    logger.info("  ※ Officeの起動時間は含まない")
+    return plan
+
+
+def env_flag(name, default=False):
+    """ 環境変数を真偽値として読む (1/true/yes/on)。未設定の場合はdefault """
+    value = (os.getenv(name) or '').strip().lower()
+    if not value:
+        return default
+    return value in ('1', 'true', 'yes', 'on')
 
 
 def main():
@@ -328,6 +3725,53 @@ def main():
     parser = argparse.ArgumentParser(description='指定フォルダ内のPPT/Excel/WordファイルをPDFに一括変換し、完了ファイルをdoneフォルダに移動します。')
     parser.add_argument('folder', type=str, nargs='?', help='変換したいファイルが入っているフォルダのパス')
     parser.add_argument('--output', '-o', type=str, help='PDFの出力先フォルダ', default=None)
+    parser.add_argument('--workers', '-w', type=int, help='並列ワーカー数 (ワーカー毎にOfficeを起動)', default=None)
+    parser.add_argument('--pipeline', action='store_true', help='PowerPoint/Excel/Wordを同時に変換する')
+    parser.add_argument('--cache', action='store_true', help='内容ハッシュで変換要否を判断し、同一内容のファイルはPDFを複製する')
+    parser.add_argument('--recursive', '-r', action='store_true', help='サブフォルダも変換対象にする')
+    parser.add_argument('--recycle-after', type=str, default=None,
+                        help='指定件数を変換する毎にOfficeを再起動 (例: 200 / excel=100,word=300)')
+    parser.add_argument('--recycle-rss', type=str, default=None,
+                        help='Officeのメモリ使用量 (MB) が超えたら再起動 (例: 1500 / excel=2000)')
+    parser.add_argument('--timeout', type=str, default=None,
+                        help='1件あたりの制限時間 (秒)。超過したOfficeは強制終了 (例: 300 / excel=600)')
+    parser.add_argument('--watch', action='store_true', help='常駐してフォルダを監視し、届いたファイルを順次変換する')
+    parser.add_argument('--interval', type=float, help='監視モードの確認間隔 (秒)', default=None)
+    parser.add_argument('--trace', action='store_true', help='1件毎の工程別所要時間などをJSON Lines形式で記録する')
+    parser.add_argument('--no-preflight', action='store_true',
+                        help='Officeで開く前のパスワード保護・破損チェックを行わない')
+    parser.add_argument('--postprocess', action='store_true',
+                        help='変換したPDFを次の変換と並行して圧縮し、メタデータを付与する (pypdfが必要)')
+    parser.add_argument('--image-max-px', type=int, default=None,
+                        help='後処理で画像の最大辺をこのピクセル数まで縮小する (Pillowが必要)')
+    parser.add_argument('--stage-dir', default=None,
+                        help='元ファイルとPDFをこのローカルフォルダ経由で変換する (ネットワーク共有向け)')
+    parser.add_argument('--lease-dir', default=None,
+                        help='複数ホストで同じフォルダを分担する場合のリース置き場 (全ホストから見える共有フォルダ)')
+    parser.add_argument('--resume', action='store_true',
+                        help='前回中断した実行の続きから再開する (ジャーナルを元に、フォルダを走査し直さない)')
+    parser.add_argument('--quarantine-after', type=int, default=None,
+                        help='この回数失敗したファイルをquarantineフォルダへ移す (既定0: 移さない)')
+    parser.add_argument('--split-parts', type=int, default=None,
+                        help='大きなExcelブックをこの数のExcelインスタンスで分担して出力する (pypdfが必要)')
+    parser.add_argument('--profile', choices=sorted(EXPORT_PROFILES), default=None,
+                        help='PDFの出力品質 (screen: 画面表示向けの最小サイズ / print: 標準品質 / archive: PDF/A)')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='進捗のメトリクスをこのポートで公開する (http://127.0.0.1:PORT/metrics、Prometheus形式)')
+    parser.add_argument('--metrics-file', default=None,
+                        help='進捗のメトリクスを定期的にこのファイルへ書き出す (Prometheus形式)')
+    parser.add_argument('--com-profile', action='store_true',
+                        help='COM呼び出しの回数・所要時間を呼び出し箇所毎に集計し、形式毎に上位をログに出す')
+    parser.add_argument('--com-profile-python', action='store_true',
+                        help='--com-profileに加えて、Python側もcProfileで計測する')
+    parser.add_argument('--no-session-tuning', action='store_true',
+                        help='Officeの速度に効く設定 (マクロ無効・再ページ付け停止など) を変更しない')
+    parser.add_argument('--manual-calculation', action='store_true',
+                        help='Excelを手動計算にして、開く度の再計算をせず保存されている計算結果のまま出力する')
+    parser.add_argument('--gc-every', type=int, default=None,
+                        help='この件数の文書を閉じる毎にガベージコレクションを行う (既定50、0で件数では行わない)')
+    parser.add_argument('--plan', action='store_true',
+                        help='変換せず、過去の変換履歴から所要時間の見積もりだけを表示する')
     args = parser.parse_args()
 
     folder_str = args.folder or os.getenv('INPUT_FOLDER')
@@ -348,7 +3792,7 @@ def main():
         output_path = Path(output_str)
         try:
             output_path.mkdir(parents=True, exist_ok=True)
-            log_dir = output_path 
+            log_dir = output_path
         except Exception as e:
              print(f"エラー: 出力フォルダ作成失敗 {e}")
              sys.exit(1)
@@ -356,38 +3800,273 @@ def main():
         output_path = None
         log_dir = target_path
 
+    workers = int(args.workers or os.getenv('WORKERS') or 1)
+    pipeline = args.pipeline or env_flag('PIPELINE')
+    cache = ConversionCache(log_dir / CACHE_FILE_NAME) if args.cache or env_flag('CACHE') else None
+    recursive = args.recursive or env_flag('RECURSIVE')
+    watch = args.watch or env_flag('WATCH')
+    interval = float(args.interval or os.getenv('WATCH_INTERVAL') or 5)
+    try:
+        recycle = recycle_policies(
+            parse_per_format(args.recycle_after or os.getenv('RECYCLE_AFTER')),
+            parse_per_format(args.recycle_rss or os.getenv('RECYCLE_RSS_MB')),
+        )
+    except ValueError as e:
+        print(f"エラー: 再起動条件の指定が不正です -> {e}")
+        sys.exit(1)
+    try:
+        timeout = parse_per_format(args.timeout or os.getenv('DOCUMENT_TIMEOUT'), cast=float)
+    except ValueError as e:
+        print(f"エラー: 制限時間の指定が不正です -> {e}")
+        sys.exit(1)
+    dir_index = DirectoryIndex(log_dir / SCAN_INDEX_FILE_NAME)
+    trace = args.trace or env_flag('TRACE')
+    preflight = not args.no_preflight and env_flag('PREFLIGHT', default=True)
+    history = ConversionHistory(log_dir / HISTORY_FILE_NAME)
+    quarantine_after = args.quarantine_after
+    if quarantine_after is None:
+        quarantine_after = int(os.getenv('QUARANTINE_AFTER') or 0)
+    failures = FailureRegistry(log_dir / FAILURES_FILE_NAME, quarantine_after=quarantine_after,
+                               retry_after=float(os.getenv('RETRY_AFTER') or 3600))
+    postprocess = None
+    if args.postprocess or env_flag('POSTPROCESS'):
+        if pypdf is None:
+            print("警告: pypdfが無いためPDFの後処理は行いません (uv run --extra pdf ...)")
+        else:
+            postprocess = PdfPostProcessor(
+                workers=int(os.getenv('POSTPROCESS_WORKERS') or 2),
+                image_max_px=int(args.image_max_px or os.getenv('IMAGE_MAX_PX') or 0) or None,
+                image_quality=int(os.getenv('IMAGE_QUALITY') or 75),
+            )
+
+    split = None
+    split_parts = args.split_parts or int(os.getenv('SPLIT_PARTS') or 0)
+    if split_parts > 1:
+        if pypdf is None:
+            # 分割したPDFを結合できず、対象のブックが全て失敗するため始める前に止める
+            print("エラー: 大きなブックの分割出力にはpypdfが必要です (uv run --extra pdf ...)")
+            sys.exit(1)
+        split = SplitPolicy(split_parts, min_sheets=int(os.getenv('SPLIT_MIN_SHEETS') or 50),
+                            min_seconds=float(os.getenv('SPLIT_MIN_SECONDS') or 300))
+
+    profile_name = args.profile or os.getenv('PDF_PROFILE')
+    if profile_name and profile_name not in EXPORT_PROFILES:
+        print(f"エラー: 出力品質の指定が不正です -> {profile_name} ({' / '.join(sorted(EXPORT_PROFILES))})")
+        sys.exit(1)
+    profile = EXPORT_PROFILES[profile_name] if profile_name else None
+    gc_every = args.gc_every
+    if gc_every is None:
+        gc_every = int(os.getenv('GC_EVERY') or 50)
+    gc_policy = GcPolicy(every=gc_every, heap_blocks=int(os.getenv('GC_HEAP_BLOCKS') or 1_000_000))
+    tune_session = not args.no_session_tuning and env_flag('SESSION_TUNING', default=True)
+    manual_calculation = args.manual_calculation or env_flag('EXCEL_MANUAL_CALCULATION')
+    python_profile = args.com_profile_python or env_flag('COM_PROFILE_PYTHON')
+    com_profile = args.com_profile or env_flag('COM_PROFILE') or python_profile
+
+    staging = None
+    stage_dir = args.stage_dir or os.getenv('STAGE_DIR')
+    if stage_dir:
+        staging = StagingArea(stage_dir, ahead=int(os.getenv('STAGE_AHEAD') or 4),
+                              budget_mb=int(os.getenv('STAGE_BUDGET_MB') or 1024))
+
+    leases = None
+    lease_dir = args.lease_dir or os.getenv('LEASE_DIR')
+    if lease_dir:
+        leases = LeaseQueue(lease_dir, root=target_path.resolve(), ttl=float(os.getenv('LEASE_TTL') or 300))
+
     # ロガーセットアップ
     logger, log_file = setup_logger(log_dir)
+    trace_file, trace_summary = setup_trace(log_dir) if trace else (None, None)
+
+    if args.plan:
+        try:
+            plan_run(target_path, output_path, logger, history, workers=workers, pipeline=pipeline,
+                     recursive=recursive)
+        finally:
+            history.close()
+        return
+
+    metrics = exporter = None
+    metrics_port = args.metrics_port or int(os.getenv('METRICS_PORT') or 0) or None
+    metrics_file = args.metrics_file or os.getenv('METRICS_FILE')
+    if metrics_port or metrics_file:
+        metrics = ConversionMetrics()
+        try:
+            exporter = MetricsExporter(metrics, port=metrics_port, textfile=metrics_file,
+                                       interval=float(os.getenv('METRICS_INTERVAL') or 15))
+        except OSError as e:
+            print(f"エラー: メトリクスを公開できません -> {e}")
+            sys.exit(1)
+
+    resume = args.resume and (log_dir / JOURNAL_FILE_NAME).exists()
+    if args.resume and not resume:
+        print("警告: 前回のジャーナルが無いため、最初から実行します")
+    journal_path = setup_journal(log_dir, resume=resume)
 
     logger.info(f"=== 処理開始: {datetime.now()} ===")
     logger.info(f"対象フォルダ: {target_path.resolve()}")
     if output_path:
         logger.info(f"PDF出力先: {output_path.resolve()}")
+    if watch:
+        logger.info(f"実行モード: 監視 (確認間隔 {interval}秒)")
+    elif workers > 1:
+        logger.info(f"並列ワーカー数: {workers}")
+    elif pipeline:
+        logger.info("実行モード: パイプライン (PowerPoint/Excel/Word同時実行)")
+    if recursive:
+        logger.info("サブフォルダ: 対象に含める")
+    for kind, policy in recycle.items():
+        conditions = []
+        if policy.max_documents:
+            conditions.append(f"{policy.max_documents}件毎")
+        if policy.max_rss_mb:
+            conditions.append(f"メモリ{policy.max_rss_mb}MB超")
+        logger.info(f"再起動条件 ({APP_CLASSES[kind].label}): {' / '.join(conditions)}")
+    for kind, seconds in timeout.items():
+        logger.info(f"制限時間 ({APP_CLASSES[kind].label}): 1件 {seconds:g}秒")
+    if any(policy.max_rss_mb for policy in recycle.values()) and psutil is None:
+        logger.warning("[警告] psutilが無いためメモリ使用量による再起動は行いません")
+    if gc_policy.heap_blocks and not python_heap_blocks():
+        logger.warning("[警告] Pythonのヒープを計測できないため (PYTHONMALLOC)、メモリ増加によるガベージコレクションは行いません")
+    if cache:
+        logger.info(f"変換キャッシュ: {cache.db_path}")
+    if postprocess:
+        details = [f"並列{postprocess.workers}"]
+        if postprocess.image_max_px:
+            details.append(f"画像の最大辺 {postprocess.image_max_px}px")
+        if shutil.which("qpdf"):
+            details.append("リニアライズ (qpdf)")
+        logger.info(f"PDF後処理: {' / '.join(details)}")
+    if profile:
+        logger.info(f"出力品質: {profile.name}")
+    if not tune_session:
+        logger.info("Officeの設定: 速度向けの変更を行わない")
+    if manual_calculation:
+        logger.info("Excelの計算方法: 手動 (保存されている計算結果のまま出力)")
+    if com_profile:
+        logger.info("COM呼び出しの計測: 有効" + (" (Python側もcProfileで計測)" if python_profile else ""))
+    if split:
+        logger.info(f"大きなブックの分割出力: {split.parts}分割 (表示シート{split.min_sheets}枚以上、"
+                    f"または見積もり{split.min_seconds:g}秒以上)")
+    if staging:
+        logger.info(f"ローカル作業フォルダ: {staging.root} (先読み {staging.ahead}件 / 上限 {staging.budget_mb}MB)")
+    if leases:
+        logger.info(f"複数ホストで分担: {leases.lease_dir} (ホスト {leases.host}, リース期限 {leases.ttl:g}秒)")
+    if exporter:
+        if exporter.port:
+            logger.info(f"メトリクス: http://127.0.0.1:{exporter.port}/metrics")
+        if metrics_file:
+            logger.info(f"メトリクス: {metrics_file} ({exporter.interval:g}秒毎)")
     logger.info(f"ログファイル: {log_file}")
+    if trace:
+        logger.info(f"トレース: {trace_file}")
     logger.info("--------------------------------------------------\n")
-    
+
     # --- 実行 ---
-    ppt_stats = convert_ppt_to_pdf(target_path, output_path, logger)
-    xls_stats = convert_excel_to_pdf(target_path, output_path, logger)
-    doc_stats = convert_word_to_pdf(target_path, output_path, logger)
-    
+    source = target_path
+    if resume:
+        pending = replay_journal(journal_path, logger)
+        logger.info(f"[再開] 前回の続きから実行します: 未変換 {len(pending)}件")
+        if not watch:
+            # フォルダは走査し直さず、ジャーナル上の未変換ファイルだけを変換する
+            source = pending
+    convert_options = {'cache': cache, 'recycle': recycle, 'timeout': timeout, 'trace': trace,
+                       'preflight': preflight, 'history': history, 'postprocess': postprocess,
+                       'staging': staging, 'leases': leases, 'failures': failures,
+                       'split': split, 'profile': profile, 'com_profile': com_profile,
+                       'python_profile': python_profile, 'tune_session': tune_session,
+                       'manual_calculation': manual_calculation, 'gc_policy': gc_policy}
+    results = {kind: new_stats() for kind in APP_CLASSES}
+    try:
+        if recursive and source is not target_path:
+            convert_options['source_root'] = target_path.resolve()
+        for event in convert_folder(source, output_path, logger, workers=workers, pipeline=pipeline,
+                                    watch=watch, interval=interval, recursive=recursive, dir_index=dir_index,
+                                    **convert_options):
+            if metrics:
+                metrics.observe(event)
+            if event.type == 'finished':
+                results = event.stats
+    finally:
+        if exporter:
+            exporter.close()
+        if cache:
+            cache.close()
+        if postprocess:
+            postprocess.close()
+        if staging:
+            staging.close()
+        if leases:
+            leases.close()
+        history.close()
+        failures.close()
+        for handler in logging.getLogger(JOURNAL_LOGGER_NAME).handlers[:]:
+            handler.close()
+            logging.getLogger(JOURNAL_LOGGER_NAME).removeHandler(handler)
+        try:
+            dir_index.save()
+        except OSError as e:
+            logger.warning(f"[警告] 走査インデックス保存失敗: {e}")
+
     # --- 集計 ---
-    total_success = ppt_stats['success'] + xls_stats['success'] + doc_stats['success']
-    total_skip = ppt_stats['skip'] + xls_stats['skip'] + doc_stats['skip']
-    total_error = ppt_stats['error'] + xls_stats['error'] + doc_stats['error']
+    total_success = sum(stats['success'] for stats in results.values())
+    total_skip = sum(stats['skip'] for stats in results.values())
+    total_error = sum(stats['error'] for stats in results.values())
+    total_duplicate = sum(stats.get('duplicate', 0) for stats in results.values())
+    total_timeout = sum(stats.get('timeout', 0) for stats in results.values())
+    total_rejected = sum(stats.get('rejected', 0) for stats in results.values())
+    total_postprocessed = sum(stats.get('postprocessed', 0) for stats in results.values())
 
     logger.info("==================================================")
     logger.info("                最終処理結果サマリー               ")
     logger.info("==================================================")
     logger.info(f"  成功 (PDF作成・移動): {total_success} 件")
+    if total_duplicate:
+        logger.info(f"    うち重複PDF複製   : {total_duplicate} 件")
     logger.info(f"  スキップ (PDF既存)  : {total_skip} 件")
+    total_elsewhere = sum(stats.get('elsewhere', 0) for stats in results.values())
+    if total_elsewhere:
+        logger.info(f"    うち他ホストが処理: {total_elsewhere} 件")
+    total_backoff = sum(stats.get('backoff', 0) for stats in results.values())
+    if total_backoff:
+        logger.info(f"    うち失敗済みで見送り: {total_backoff} 件")
     logger.info(f"  エラー              : {total_error} 件")
+    if total_timeout:
+        logger.info(f"    うちタイムアウト  : {total_timeout} 件")
+    total_quarantined = sum(stats.get('quarantined', 0) for stats in results.values())
+    if total_quarantined:
+        logger.info(f"  隔離 (quarantine)   : {total_quarantined} 件")
+    if total_rejected:
+        logger.info(f"  事前チェックで除外  : {total_rejected} 件")
+        for reason, label in PREFLIGHT_REASONS.items():
+            count = sum(stats.get(reason, 0) for stats in results.values())
+            if count:
+                logger.info(f"    {label}: {count} 件")
+    if total_postprocessed:
+        bytes_in = sum(stats.get('pdf_bytes_in', 0) for stats in results.values())
+        bytes_out = sum(stats.get('pdf_bytes_out', 0) for stats in results.values())
+        logger.info(f"  PDF後処理           : {total_postprocessed} 件 ({format_bytes(bytes_in)} -> "
+                    f"{format_bytes(bytes_out)}, 削減 {format_bytes(bytes_in - bytes_out)})")
     logger.info("--------------------------------------------------")
-    logger.info(f"  PowerPoint -> 成功: {ppt_stats['success']}, エラー: {ppt_stats['error']}")
-    logger.info(f"  Excel      -> 成功: {xls_stats['success']}, エラー: {xls_stats['error']}")
-    logger.info(f"  Word       -> 成功: {doc_stats['success']}, エラー: {doc_stats['error']}")
+    for kind, app_cls in APP_CLASSES.items():
+        stats = results[kind]
+        logger.info(f"  {app_cls.label:<10} -> 成功: {stats['success']}, エラー: {stats['error']}")
+        if stats.get('recycle'):
+            logger.info(f"  {'':<10}    再起動: {stats['recycle']}回 (計 {stats['recycle_seconds']:.1f}秒, "
+                        f"平均 {stats['recycle_seconds'] / stats['recycle']:.1f}秒)")
+        if stats.get('gc'):
+            logger.info(f"  {'':<10}    ガベージコレクション: {stats['gc']}回 (計 {stats['gc_seconds']:.2f}秒)")
+    if trace:
+        summary = trace_summary.summary()
+        emit_trace(summary)
+        logger.info("--------------------------------------------------")
+        logger.info("  1件あたりの所要時間 (秒)")
+        for kind, entry in summary['formats'].items():
+            if entry['converted']:
+                logger.info(f"  {APP_CLASSES[kind].label:<10} -> p50: {entry['p50']:.2f}, p95: {entry['p95']:.2f}, "
+                            f"最大: {entry['max']:.2f} ({entry['converted']}件)")
     logger.info("==================================================")
-    
+
     print(f"\nすべての処理が完了しました。ログを確認してください: {log_file}")
 
 if __name__ == "__main__":
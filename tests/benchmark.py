@@ -0,0 +1,225 @@
+"""
+Benchmark converter.py on the simulated Office backend (tests/fake_office.py).
+
+Builds synthetic corpora, runs them through the selected execution modes and
+reports throughput, per-document latency percentiles and peak memory. Runs on
+any OS without Office; worker modes rely on the fork start method (Linux).
+
+    uv run python tests/benchmark.py --sizes 50,200 --mix ppt=2,excel=1,word=1 \\
+        --modes serial,pipeline,workers4 --startup 0.5 --page 0.01
+
+--sessions tuned,untuned runs every case with and without the Office session
+tuning on the same corpus; "manual" adds the opt-in Excel manual calculation on
+top of the tuning. The simulated cost of an untuned session is set with
+--recalc / --repaginate / --redraw / --addin (see FakeOffice).
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_office
+
+EXTENSIONS = {"ppt": ".pptx", "excel": ".xlsx", "word": ".docx"}
+
+
+def parse_mix(value):
+    """'ppt=2,excel=1' -> {'ppt': 2.0, 'excel': 1.0}"""
+    mix = {}
+    for item in value.split(","):
+        kind, weight = item.split("=")
+        if kind not in EXTENSIONS:
+            raise argparse.ArgumentTypeError(f"unknown format: {kind}")
+        mix[kind] = float(weight)
+    return mix
+
+
+def make_corpus(folder, size, mix, rng, max_pages=20, file_kb=20, fail_rate=0.0, hang_rate=0.0,
+                duplicate_rate=0.0):
+    """Write ``size`` synthetic source files into ``folder``."""
+    kinds = list(mix)
+    weights = [mix[k] for k in kinds]
+    previous = {}
+    for i in range(size):
+        kind = rng.choices(kinds, weights)[0]
+        path = folder / f"doc{i:05d}{EXTENSIONS[kind]}"
+        if kind in previous and rng.random() < duplicate_rate:
+            path.write_bytes(previous[kind])
+            continue
+
+        pages = rng.randint(1, max_pages)
+        if kind == "excel":
+            sheets = rng.randint(1, 5)
+            spec = {"sheets": [{"name": f"S{n}", "pages": max(1, pages // sheets),
+                                "visible": n == 0 or rng.random() > 0.2} for n in range(sheets)]}
+        else:
+            spec = {"pages": pages}
+        if rng.random() < hang_rate:
+            spec["hang"] = True
+        elif rng.random() < fail_rate:
+            spec["fail"] = "Simulated corrupt file"
+        spec["id"] = i  # keeps files distinct unless deliberately duplicated
+
+        # real OOXML packages, so the pre-flight check and workbook pre-scan paths are exercised
+        fake_office.write_document(path, spec, padding=file_kb * 1024)
+        previous[kind] = path.read_bytes()
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def run_case(converter, backend_options, mode, size, args, session="tuned"):
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = Path(tmp) / "in"
+        output = Path(tmp) / "out"
+        folder.mkdir()
+        output.mkdir()
+        make_corpus(folder, size, args.mix, random.Random(args.seed), args.max_pages, args.file_kb,
+                    args.fail_rate, args.hang_rate, args.duplicate_rate)
+
+        latency_log = Path(tmp) / "latency.jsonl"
+        backend = fake_office.FakeOffice(latency_log=str(latency_log), seed=args.seed, **backend_options)
+        converter.win32com.client.Dispatch = backend
+        # Never let the watchdog near real processes: fake pids are only meaningful to the backend
+        converter.kill_process = backend.kill
+
+        logger = logging.getLogger("benchmark")
+        if not logger.handlers:
+            logger.addHandler(logging.NullHandler())
+        logger.propagate = False
+        options = {"tune_session": session != "untuned", "manual_calculation": session == "manual"}
+        if args.timeout:
+            options["timeout"] = {kind: args.timeout for kind in EXTENSIONS}
+        if args.cache:
+            options["cache"] = converter.ConversionCache(Path(tmp) / converter.CACHE_FILE_NAME)
+
+        tracemalloc.start()
+        begin = time.perf_counter()
+        if mode == "serial":
+            results = converter.convert_serial(folder, output, logger, **options)
+        elif mode == "pipeline":
+            results = converter.convert_pipeline(folder, output, logger, **options)
+        elif mode.startswith("workers"):
+            results = converter.convert_parallel(folder, output, logger, int(mode[len("workers"):]), **options)
+        else:
+            raise ValueError(f"unknown mode: {mode}")
+        elapsed = time.perf_counter() - begin
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        if options.get("cache"):
+            options["cache"].close()
+
+        latencies = []
+        if latency_log.exists():
+            with open(latency_log, encoding="utf-8") as f:
+                latencies = [json.loads(line)["seconds"] for line in f if line.strip()]
+
+        totals = {}
+        for stats in results.values():
+            for key, value in stats.items():
+                totals[key] = totals.get(key, 0) + value
+        return {
+            "mode": mode,
+            "session": session,
+            "files": size,
+            "success": totals.get("success", 0),
+            "error": totals.get("error", 0),
+            "seconds": elapsed,
+            "files_per_sec": size / elapsed if elapsed else 0.0,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "mean": statistics.fmean(latencies) if latencies else 0.0,
+            "peak_mb": peak / (1024 * 1024),
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark converter.py on a simulated Office backend")
+    parser.add_argument("--sizes", default="20,100", help="comma separated corpus sizes")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("ppt=1,excel=1,word=1"),
+                        help="format weights, e.g. ppt=2,excel=1,word=1")
+    parser.add_argument("--modes", default="serial,pipeline,workers4",
+                        help="comma separated: serial, pipeline, workersN")
+    parser.add_argument("--startup", type=float, default=0.2, help="Dispatch latency (s)")
+    parser.add_argument("--open", type=float, default=0.02, help="Open latency (s)")
+    parser.add_argument("--page", type=float, default=0.002, help="export latency per page (s)")
+    parser.add_argument("--close", type=float, default=0.005, help="Close latency (s)")
+    parser.add_argument("--quit", type=float, default=0.05, help="Quit latency (s)")
+    parser.add_argument("--sessions", default="tuned", help="comma separated: tuned, untuned, manual")
+    parser.add_argument("--recalc", type=float, default=0.0,
+                        help="per-sheet recalculation on open without manual calculation (s)")
+    parser.add_argument("--repaginate", type=float, default=0.0,
+                        help="per-page background repagination on Word open (s)")
+    parser.add_argument("--redraw", type=float, default=0.0, help="per-page redraw while ScreenUpdating is on (s)")
+    parser.add_argument("--addin", type=float, default=0.0, help="per loaded Word add-in on every open (s)")
+    parser.add_argument("--word-addins", type=int, default=0, help="template add-ins loaded in each Word")
+    parser.add_argument("--max-pages", type=int, default=20)
+    parser.add_argument("--file-kb", type=int, default=20)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of files that fail to open")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="share of files that hang")
+    parser.add_argument("--duplicate-rate", type=float, default=0.0, help="share of byte-identical copies")
+    parser.add_argument("--timeout", type=float, default=None, help="per-document timeout (s)")
+    parser.add_argument("--cache", action="store_true", help="enable the content-hash cache")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print one JSON record per case")
+    args = parser.parse_args(argv)
+
+    if args.hang_rate and not args.timeout:
+        parser.error("--hang-rate needs --timeout, otherwise hung documents block until hang_timeout")
+
+    if hasattr(os, "fork"):
+        multiprocessing.set_start_method("fork", force=True)
+    fake_office.install(fake_office.FakeOffice())
+    import converter
+
+    backend_options = {
+        "startup_latency": args.startup,
+        "open_latency": args.open,
+        "page_latency": args.page,
+        "close_latency": args.close,
+        "quit_latency": args.quit,
+        "hang_timeout": max(30.0, (args.timeout or 0) * 2),
+        "recalc_latency": args.recalc,
+        "repaginate_latency": args.repaginate,
+        "redraw_latency": args.redraw,
+        "addin_latency": args.addin,
+        "word_addins": [f"AddIn{i}.dotm" for i in range(args.word_addins)],
+    }
+
+    rows = []
+    for size in (int(s) for s in args.sizes.split(",")):
+        for mode in args.modes.split(","):
+            for session in args.sessions.split(","):
+                row = run_case(converter, backend_options, mode.strip(), size, args, session.strip())
+                rows.append(row)
+                if args.json:
+                    print(json.dumps(row))
+
+    if not args.json:
+        print(f"{'mode':<10} {'session':<8} {'files':>6} {'ok':>6} {'err':>5} {'sec':>8} {'files/s':>8} "
+              f"{'p50 ms':>8} {'p95 ms':>8} {'peak MB':>8}")
+        for row in rows:
+            print(f"{row['mode']:<10} {row['session']:<8} {row['files']:>6} {row['success']:>6} {row['error']:>5} "
+                  f"{row['seconds']:>8.2f} {row['files_per_sec']:>8.1f} {row['p50'] * 1000:>8.1f} "
+                  f"{row['p95'] * 1000:>8.1f} {row['peak_mb']:>8.2f}")
+    return rows
+
+
+if __name__ == "__main__":
+    main()
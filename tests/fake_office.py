@@ -0,0 +1,697 @@
+"""
+Simulated Office automation backend for tests and benchmarks.
+
+FakeOffice replaces ``win32com.client.Dispatch`` and mimics the parts of the
+PowerPoint / Excel / Word object model that converter.py uses. Latencies are
+configurable, failures and hangs can be injected, and every export writes a
+real (blank) PDF with one page per simulated page.
+
+A source file may start with a JSON header line that describes the document:
+
+    {"pages": 12}
+    {"sheets": [{"name": "A", "pages": 2}, {"name": "B", "visible": false}]}
+    {"pages": 3, "fail": "Password required"}
+    {"pages": 3, "hang": true}
+    {"pages": 3, "crash": true}     (the app's process dies while opening it)
+
+Files without a header are treated as a single page document. ``write_document``
+packages a spec the way the real format is stored: OOXML suffixes become ZIP
+packages (carrying the spec in a private part, and for .xlsx the real workbook
+parts, so code reading the container sees the same sheets as the simulated
+object model); legacy suffixes keep the plain header.
+"""
+import itertools
+import json
+import os
+import random
+import struct
+import sys
+import threading
+import time
+import types
+import zipfile
+from xml.sax.saxutils import escape, quoteattr
+
+PPT_SAVE_AS_PDF = 32
+PPT_FIXED_FORMAT_PDF = 2
+PPT_INTENT_SCREEN = 1
+XL_TYPE_PDF = 0
+XL_QUALITY_MINIMUM = 1
+XL_CALCULATION_AUTOMATIC = -4105
+XL_CALCULATION_MANUAL = -4135
+XL_SHEET_VISIBLE = -1
+XL_SHEET_HIDDEN = 0
+WD_FORMAT_PDF = 17
+WD_EXPORT_PDF = 17
+WD_OPTIMIZE_FOR_SCREEN = 1
+
+PROG_IDS = {
+    "PowerPoint.Application": "ppt",
+    "Excel.Application": "excel",
+    "Word.Application": "word",
+}
+# Dispatch attaches to the running process instead of starting another one
+SINGLE_INSTANCE = {"ppt"}
+
+
+class FakeComError(Exception):
+    """Raised where the real backend would raise pywintypes.com_error."""
+
+
+def placeholder_pdf(pages=1, labels=None):
+    """
+    A minimal valid PDF with the given number of blank pages. ``labels`` (one per page)
+    are stored as a /FakeLabel entry on each page, e.g. the sheet a page came from.
+    """
+    pages = max(1, int(pages))
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % (3 + i) for i in range(pages))
+        + b"] /Count %d >>" % pages,
+    ]
+    for i in range(pages):
+        label = b" /FakeLabel (%s)" % labels[i].encode("ascii") if labels else b""
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842]%s >>" % label)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+SPEC_PART = "fake/spec.json"
+OOXML_SUFFIXES = (".pptx", ".pptm", ".xlsx", ".xlsm", ".docx", ".docm")
+CONTENT_TYPES = (
+    "<?xml version=\"1.0\" encoding=\"UTF-8\" standalone=\"yes\"?>"
+    "<Types xmlns=\"http://schemas.openxmlformats.org/package/2006/content-types\"/>"
+)
+# Fixed timestamps keep packages of the same spec byte-identical (content-hash tests rely on it)
+ZIP_DATE = (1980, 1, 1, 0, 0, 0)
+
+
+def read_spec(path):
+    """Parse the optional JSON header line (or xlsx spec part) of a synthetic source file."""
+    try:
+        if zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as package:
+                first = package.read(SPEC_PART)
+        else:
+            with open(path, "rb") as f:
+                first = f.readline()
+        spec = json.loads(first.decode("utf-8"))
+        return spec if isinstance(spec, dict) else {}
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+        return {}
+
+
+def _write_package(path, parts, padding=0):
+    with zipfile.ZipFile(path, "w") as package:
+        package.writestr(zipfile.ZipInfo("[Content_Types].xml", ZIP_DATE), CONTENT_TYPES)
+        for name, data in parts.items():
+            package.writestr(zipfile.ZipInfo(name, ZIP_DATE), data)
+        if padding:
+            package.writestr(zipfile.ZipInfo("fake/padding.bin", ZIP_DATE), b"\0" * padding)
+
+
+def write_document(path, spec=None, padding=0):
+    """Write a synthetic source file for ``spec``, packaged according to its suffix."""
+    spec = spec or {}
+    suffix = os.path.splitext(str(path))[1].lower()
+    if suffix in (".xlsx", ".xlsm"):
+        write_xlsx(path, spec, padding)
+    elif suffix in OOXML_SUFFIXES:
+        _write_package(path, {SPEC_PART: json.dumps(spec)}, padding)
+    else:
+        header = (json.dumps(spec) + "\n").encode("utf-8")
+        with open(path, "wb") as f:
+            f.write(header + b"\0" * max(0, padding - len(header)))
+
+
+def write_xlsx(path, spec, padding=0):
+    """
+    Write ``spec`` as a minimal OOXML workbook package.
+
+    Sheet entries may set "visible" (false means hidden), "state" (e.g.
+    "veryHidden"), "print_area" and "chart": true for a chart sheet, which
+    Excel lists in workbook.xml but not in Worksheets.
+    """
+    sheets = spec.get("sheets") or [{"pages": int(spec.get("pages", 1))}]
+    sheet_xml, rel_xml, names_xml = [], [], []
+    for i, sheet in enumerate(sheets):
+        name = sheet.get("name", f"Sheet{i + 1}")
+        state = sheet.get("state") or ("visible" if sheet.get("visible", True) else "hidden")
+        state_attr = "" if state == "visible" else f" state={quoteattr(state)}"
+        sheet_xml.append(f"<sheet name={quoteattr(name)} sheetId=\"{i + 1}\"{state_attr} r:id=\"rId{i + 1}\"/>")
+        part = "chartsheet" if sheet.get("chart") else "worksheet"
+        rel_xml.append(f"<Relationship Id=\"rId{i + 1}\" Type=\"http://schemas.openxmlformats.org/"
+                       f"officeDocument/2006/relationships/{part}\" Target=\"{part}s/sheet{i + 1}.xml\"/>")
+        if sheet.get("print_area"):
+            names_xml.append(f"<definedName name=\"_xlnm.Print_Area\" localSheetId=\"{i}\">"
+                             f"{escape(name)}!{escape(sheet['print_area'])}</definedName>")
+    workbook = (
+        "<?xml version=\"1.0\" encoding=\"UTF-8\" standalone=\"yes\"?>"
+        "<workbook xmlns=\"http://schemas.openxmlformats.org/spreadsheetml/2006/main\" "
+        "xmlns:r=\"http://schemas.openxmlformats.org/officeDocument/2006/relationships\">"
+        f"<sheets>{''.join(sheet_xml)}</sheets>"
+        + (f"<definedNames>{''.join(names_xml)}</definedNames>" if names_xml else "")
+        + "</workbook>"
+    )
+    rels = (
+        "<?xml version=\"1.0\" encoding=\"UTF-8\" standalone=\"yes\"?>"
+        "<Relationships xmlns=\"http://schemas.openxmlformats.org/package/2006/relationships\">"
+        f"{''.join(rel_xml)}</Relationships>"
+    )
+    # Chart sheets are not part of Worksheets, so keep them out of the simulated model
+    fake_spec = dict(spec, sheets=[sheet for sheet in sheets if not sheet.get("chart")])
+    _write_package(path, {
+        "xl/workbook.xml": workbook,
+        "xl/_rels/workbook.xml.rels": rels,
+        SPEC_PART: json.dumps(fake_spec),
+    }, padding)
+
+
+def write_ole(path, streams):
+    """
+    Write a minimal compound file (512-byte sectors) whose root storage lists
+    ``streams``. Only the directory is meaningful; every stream is empty.
+    """
+    free, end, fat_marker = 0xFFFFFFFF, 0xFFFFFFFE, 0xFFFFFFFD
+    entries = ["Root Entry"] + list(streams)
+    dir_sectors = (len(entries) + 3) // 4
+    header = (
+        b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1" + b"\0" * 16
+        + struct.pack("<HHHH", 0x3E, 3, 0xFFFE, 9) + struct.pack("<H", 6) + b"\0" * 6
+        + struct.pack("<IIIIIIIII", 0, 1, 1, 0, 4096, end, 0, end, 0)
+        + struct.pack("<109I", 0, *[free] * 108)
+    )
+    fat = [fat_marker] + list(range(2, dir_sectors + 1)) + [end]
+    directory = b""
+    for i, name in enumerate(entries):
+        encoded = name.encode("utf-16-le")
+        # Root has the streams as a right-leaning chain of siblings under its child
+        child = 1 if i == 0 and len(entries) > 1 else free
+        right = i + 1 if 0 < i < len(entries) - 1 else free
+        directory += (
+            encoded.ljust(64, b"\0") + struct.pack("<HBB", len(encoded) + 2, 5 if i == 0 else 2, 1)
+            + struct.pack("<III", free, right, child) + b"\0" * 36 + struct.pack("<IQ", end, 0)
+        )
+    with open(path, "wb") as f:
+        f.write(header)
+        f.write(struct.pack(f"<{len(fat)}I", *fat).ljust(512, b"\xff"))
+        f.write(directory.ljust(dir_sectors * 512, b"\0"))
+
+
+class FakeComApartments:
+    """
+    pythoncom stand-in that tracks which threads have called CoInitialize.
+    Give it to FakeOffice(com=...) to make Dispatch fail on threads without COM.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def CoInitialize(self):
+        self._local.depth = getattr(self._local, "depth", 0) + 1
+
+    def CoUninitialize(self):
+        self._local.depth -= 1
+
+    @property
+    def initialized(self):
+        return getattr(self._local, "depth", 0) > 0
+
+
+class FakeProcess:
+    """Stands in for the Office process behind one app instance."""
+    _pids = itertools.count(50000)
+
+    def __init__(self):
+        self.pid = next(self._pids)
+        self.killed = threading.Event()
+        self.exited = False  # set by Quit
+
+    @property
+    def alive(self):
+        return not (self.killed.is_set() or self.exited)
+
+
+class FakeOffice:
+    """
+    Dispatch replacement. Call it with a ProgID to get an app instance.
+
+    Excel and Word start a new instance per call. PowerPoint is single-instance
+    like the real one: while it runs, every call returns the same app, so Quit
+    or kill from any client ends it for all of them.
+
+    startup_latency   seconds spent in Dispatch
+    open_latency      seconds per Open call
+    page_latency      seconds per exported page
+    screen_factor     share of page_latency spent on screen-quality exports
+
+    Costs of an untuned application session (all 0 unless set):
+
+    recalc_latency      seconds per sheet when Excel opens a book in automatic calculation
+    repaginate_latency  seconds per page when Word opens with background repagination on
+    redraw_latency      seconds per exported page while ScreenUpdating is on (Excel/Word)
+    addin_latency       seconds per loaded Word add-in on every Open
+    word_addins         names of the template add-ins loaded in each Word instance
+    com                 optional FakeComApartments; Dispatch then requires CoInitialize
+                        on the calling thread (CO_E_NOTINITIALIZED otherwise)
+    close_latency     seconds per document Close
+    quit_latency      seconds spent in Quit
+    failure_rate      probability that an export raises FakeComError
+    hang_timeout      how long an injected hang blocks unless killed
+    latency_log       optional JSON Lines file that receives one record per
+                      document (useful when documents run in worker processes)
+    """
+
+    def __init__(self, startup_latency=0.0, open_latency=0.0, page_latency=0.0, close_latency=0.0,
+                 quit_latency=0.0, failure_rate=0.0, hang_timeout=30.0, seed=None, latency_log=None,
+                 screen_factor=0.5, recalc_latency=0.0, repaginate_latency=0.0, redraw_latency=0.0,
+                 addin_latency=0.0, word_addins=(), com=None):
+        self.startup_latency = startup_latency
+        self.open_latency = open_latency
+        self.page_latency = page_latency
+        self.screen_factor = screen_factor
+        self.recalc_latency = recalc_latency
+        self.repaginate_latency = repaginate_latency
+        self.redraw_latency = redraw_latency
+        self.addin_latency = addin_latency
+        self.word_addins = tuple(word_addins)
+        self.com = com
+        self.close_latency = close_latency
+        self.quit_latency = quit_latency
+        self.failure_rate = failure_rate
+        self.hang_timeout = hang_timeout
+        self.latency_log = latency_log
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.apps = []
+        self.processes = {}
+        self.records = []
+        self.shared = {}  # kind -> running app of a SINGLE_INSTANCE kind
+        self.shared_lock = threading.Lock()
+
+    def __call__(self, prog_id):
+        kind = PROG_IDS.get(prog_id)
+        if kind is None:
+            raise FakeComError(f"Invalid class string: {prog_id}")
+        if self.com is not None and not self.com.initialized:
+            raise FakeComError("CoInitialize has not been called.")
+        if kind not in SINGLE_INSTANCE:
+            return self._start(kind)
+        # A client dispatching while the process starts waits for it, as with the real server
+        with self.shared_lock:
+            app = self.shared.get(kind)
+            if app is None or not app._process.alive:
+                app = self.shared[kind] = self._start(kind)
+            return app
+
+    def _start(self, kind):
+        time.sleep(self.startup_latency)
+        process = FakeProcess()
+        app = APP_TYPES[kind](self, process)
+        with self.lock:
+            self.apps.append(app)
+            self.processes[process.pid] = process
+        return app
+
+    @property
+    def dispatch_count(self):
+        """Number of app instances (processes) started."""
+        return len(self.apps)
+
+    def kill(self, pid):
+        """Simulate TerminateProcess on the app with this pid."""
+        self.processes[pid].killed.set()
+
+    def record(self, kind, path, pages, started, outcome, options=None):
+        entry = {
+            "kind": kind,
+            "file": os.path.basename(path),
+            "pages": pages,
+            "seconds": time.perf_counter() - started,
+            "outcome": outcome,
+        }
+        if options:
+            entry["options"] = options
+        with self.lock:
+            self.records.append(entry)
+            if self.latency_log:
+                with open(self.latency_log, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry) + "\n")
+
+    # --- behaviour shared by all document types ---
+
+    def check_alive(self, process):
+        if not process.alive:
+            raise FakeComError("The RPC server is unavailable.")
+
+    def open_document(self, process, path):
+        self.check_alive(process)
+        if not os.path.exists(path):
+            raise FakeComError(f"File not found: {path}")
+        time.sleep(self.open_latency)
+        spec = read_spec(path)
+        if spec.get("crash"):
+            process.killed.set()
+            raise FakeComError("The RPC server is unavailable.")
+        if spec.get("hang"):
+            process.killed.wait(self.hang_timeout)
+            raise FakeComError("The RPC server is unavailable.")
+        if spec.get("fail"):
+            raise FakeComError(spec["fail"])
+        return spec
+
+    def export(self, process, pdf_path, pages, labels=None, screen=False, redraw=False):
+        self.check_alive(process)
+        if self.failure_rate and self.random.random() < self.failure_rate:
+            raise FakeComError("Simulated export failure")
+        time.sleep(self.page_latency * pages * (self.screen_factor if screen else 1.0))
+        if redraw:
+            time.sleep(self.redraw_latency * pages)
+        with open(pdf_path, "wb") as f:
+            f.write(placeholder_pdf(pages, labels))
+
+
+class FakeApp:
+    kind = None
+    name = None
+
+    def __init__(self, backend, process):
+        self._backend = backend
+        self._process = process
+        self.Visible = True
+        self.DisplayAlerts = True
+        self.AutomationSecurity = 1  # msoAutomationSecurityLow, the automation default
+        self.quit_called = False
+
+    @property
+    def pid(self):
+        return self._process.pid
+
+    @property
+    def Name(self):
+        self._backend.check_alive(self._process)
+        return self.name
+
+    def Quit(self):
+        self._backend.check_alive(self._process)
+        time.sleep(self._backend.quit_latency)
+        self.quit_called = True
+        self._process.exited = True
+
+
+class FakeDocumentBase:
+    def __init__(self, app, path, spec):
+        self._app = app
+        self._path = path
+        self._spec = spec
+        self._started = time.perf_counter()
+        self.closed = False
+
+    @property
+    def _backend(self):
+        return self._app._backend
+
+    def _close(self):
+        time.sleep(self._backend.close_latency)
+        self.closed = True
+
+    def _export_pages(self, kind, path, options=None, screen=False):
+        pages = int(self._spec.get("pages", 1))
+        try:
+            self._backend.export(self._app._process, path, pages, screen=screen,
+                                 redraw=getattr(self._app, "ScreenUpdating", False))
+        except FakeComError:
+            self._backend.record(kind, self._path, pages, self._started, "error", options)
+            raise
+        self._backend.record(kind, self._path, pages, self._started, "success", options)
+
+
+# --- PowerPoint ---
+
+class FakePresentation(FakeDocumentBase):
+    @property
+    def Slides(self):
+        return types.SimpleNamespace(Count=int(self._spec.get("pages", 1)))
+
+    def SaveAs(self, path, file_format):
+        if file_format != PPT_SAVE_AS_PDF:
+            raise FakeComError(f"Unsupported format: {file_format}")
+        self._export_pages("ppt", path)
+
+    def ExportAsFixedFormat(self, path, fixed_format_type, Intent=2, **options):
+        if fixed_format_type != PPT_FIXED_FORMAT_PDF:
+            raise FakeComError(f"Unsupported type: {fixed_format_type}")
+        self._export_pages("ppt", path, dict(options, Intent=Intent), screen=Intent == PPT_INTENT_SCREEN)
+
+    def Close(self):
+        self._close()
+
+
+class FakePresentations:
+    def __init__(self, app):
+        self._app = app
+
+    def Open(self, path, ReadOnly=False, Untitled=False, WithWindow=True):
+        spec = self._app._backend.open_document(self._app._process, path)
+        return FakePresentation(self._app, path, spec)
+
+
+class FakePowerPoint(FakeApp):
+    kind = "ppt"
+    name = "Microsoft PowerPoint"
+
+    def __init__(self, backend, process):
+        super().__init__(backend, process)
+        self.Presentations = FakePresentations(self)
+        self.HWND = process.pid
+
+
+# --- Excel ---
+
+class FakePageSetup:
+    def __init__(self, print_area):
+        self.PrintArea = print_area
+        self.Zoom = 100
+        self.FitToPagesWide = False
+        self.FitToPagesTall = False
+
+
+class FakeWorksheet:
+    def __init__(self, name, visible, print_area, pages):
+        self.Name = name
+        self.Visible = XL_SHEET_VISIBLE if visible else XL_SHEET_HIDDEN
+        self.PageSetup = FakePageSetup(print_area)
+        self.pages = pages
+
+
+class FakeSheetSelection:
+    def __init__(self, workbook, sheets):
+        self._workbook = workbook
+        self._sheets = sheets
+
+    def Select(self):
+        self._workbook._selected = self._sheets
+
+
+class FakeWorksheets:
+    def __init__(self, workbook, sheets):
+        self._workbook = workbook
+        self._sheets = sheets
+
+    def __iter__(self):
+        return iter(self._sheets)
+
+    def __len__(self):
+        return len(self._sheets)
+
+    @property
+    def Count(self):
+        return len(self._sheets)
+
+    def __call__(self, key):
+        if isinstance(key, (list, tuple)):
+            by_name = {ws.Name: ws for ws in self._sheets}
+            return FakeSheetSelection(self._workbook, [by_name[name] for name in key])
+        if isinstance(key, int):
+            return self._sheets[key - 1]
+        return next(ws for ws in self._sheets if ws.Name == key)
+
+
+class FakeActiveSheet:
+    def __init__(self, workbook):
+        self._workbook = workbook
+
+    def ExportAsFixedFormat(self, file_type, path, IgnorePrintAreas=False, **options):
+        if file_type != XL_TYPE_PDF:
+            raise FakeComError(f"Unsupported type: {file_type}")
+        wb = self._workbook
+        pages = sum(ws.pages for ws in wb._selected)
+        labels = [ws.Name for ws in wb._selected for _ in range(ws.pages)]
+        screen = options.get("Quality") == XL_QUALITY_MINIMUM
+        try:
+            wb._backend.export(wb._app._process, path, pages, labels, screen=screen, redraw=wb._app.ScreenUpdating)
+        except FakeComError:
+            wb._backend.record("excel", wb._path, pages, wb._started, "error", options)
+            raise
+        wb._backend.record("excel", wb._path, pages, wb._started, "success", options)
+
+
+class FakeWorkbook(FakeDocumentBase):
+    def __init__(self, app, path, spec):
+        super().__init__(app, path, spec)
+        sheet_specs = spec.get("sheets") or [{"pages": int(spec.get("pages", 1))}]
+        sheets = [
+            FakeWorksheet(s.get("name", f"Sheet{i + 1}"), s.get("visible", True),
+                          s.get("print_area", ""), int(s.get("pages", 1)))
+            for i, s in enumerate(sheet_specs)
+        ]
+        self.Worksheets = FakeWorksheets(self, sheets)
+        self._selected = sheets[:1]
+        self.ActiveSheet = FakeActiveSheet(self)
+
+    def Close(self, SaveChanges=True):
+        self._close()
+
+
+class FakeWorkbooks:
+    def __init__(self, app):
+        self._app = app
+        self.opened = []
+
+    def Open(self, path, UpdateLinks=None, ReadOnly=False, IgnoreReadOnlyRecommended=False,
+             CorruptLoad=0, **options):
+        spec = self._app._backend.open_document(self._app._process, path)
+        workbook = FakeWorkbook(self._app, path, spec)
+        self.opened.append(workbook)
+        if self._app.Calculation != XL_CALCULATION_MANUAL:
+            time.sleep(self._app._backend.recalc_latency * len(workbook.Worksheets._sheets))
+        return workbook
+
+    def Add(self):
+        self._app._backend.check_alive(self._app._process)
+        workbook = FakeWorkbook(self._app, "Book1", {})
+        self.opened.append(workbook)
+        return workbook
+
+
+class FakeExcel(FakeApp):
+    kind = "excel"
+    name = "Microsoft Excel"
+
+    def __init__(self, backend, process):
+        super().__init__(backend, process)
+        self.Workbooks = FakeWorkbooks(self)
+        self.Hwnd = process.pid
+        self.AskToUpdateLinks = True
+        self.ScreenUpdating = True
+        self.EnableEvents = True
+        self._calculation = XL_CALCULATION_AUTOMATIC
+
+    @property
+    def Calculation(self):
+        return self._calculation
+
+    @Calculation.setter
+    def Calculation(self, value):
+        # Like Excel, the calculation mode can only be changed while a workbook is open
+        if not any(not workbook.closed for workbook in self.Workbooks.opened):
+            raise FakeComError("Unable to set the Calculation property of the Application class")
+        self._calculation = value
+
+
+# --- Word ---
+
+class FakeDocument(FakeDocumentBase):
+    @property
+    def ActiveWindow(self):
+        return types.SimpleNamespace(Hwnd=self._app._process.pid)
+
+    def ComputeStatistics(self, statistic):
+        return int(self._spec.get("pages", 1))
+
+    def SaveAs2(self, path, FileFormat=None, **options):
+        if FileFormat != WD_FORMAT_PDF:
+            raise FakeComError(f"Unsupported format: {FileFormat}")
+        self._export_pages("word", path)
+
+    def ExportAsFixedFormat(self, path, export_format, OptimizeFor=0, **options):
+        if export_format != WD_EXPORT_PDF:
+            raise FakeComError(f"Unsupported format: {export_format}")
+        self._export_pages("word", path, dict(options, OptimizeFor=OptimizeFor),
+                           screen=OptimizeFor == WD_OPTIMIZE_FOR_SCREEN)
+
+    def Close(self, SaveChanges=None):
+        self._close()
+
+
+class FakeDocuments:
+    def __init__(self, app):
+        self._app = app
+        self.added = []  # blank documents from Add
+
+    def Open(self, path, **options):
+        spec = self._app._backend.open_document(self._app._process, path)
+        backend = self._app._backend
+        if self._app.Options.Pagination:
+            time.sleep(backend.repaginate_latency * int(spec.get("pages", 1)))
+        time.sleep(backend.addin_latency * sum(1 for addin in self._app.AddIns if addin.Installed))
+        return FakeDocument(self._app, path, spec)
+
+    def Add(self, Template=None, NewTemplate=False, DocumentType=0, Visible=True):
+        self._app._backend.check_alive(self._app._process)
+        document = FakeDocument(self._app, "", {})
+        self.added.append(document)
+        return document
+
+
+class FakeWord(FakeApp):
+    kind = "word"
+    name = "Microsoft Word"
+
+    def __init__(self, backend, process):
+        super().__init__(backend, process)
+        self.Documents = FakeDocuments(self)
+        self.ScreenUpdating = True
+        self.Options = types.SimpleNamespace(
+            Pagination=True, BackgroundSave=True, CheckSpellingAsYouType=True, CheckGrammarAsYouType=True,
+            ConfirmConversions=True, UpdateLinksAtOpen=True)
+        self.AddIns = [types.SimpleNamespace(Name=name, Installed=True) for name in backend.word_addins]
+
+
+APP_TYPES = {"ppt": FakePowerPoint, "excel": FakeExcel, "word": FakeWord}
+
+
+def fake_win32process():
+    """A win32process stand-in whose window handles are the fake pids."""
+    module = types.ModuleType("win32process")
+    module.GetWindowThreadProcessId = lambda hwnd: (0, hwnd)
+    return module
+
+
+def install(backend):
+    """
+    Register fake pywin32 modules so that converter.py can be imported and run
+    off Windows with ``backend`` as its Dispatch. Returns the client module.
+    """
+    client = types.ModuleType("win32com.client")
+    client.Dispatch = backend
+    win32com = types.ModuleType("win32com")
+    win32com.client = client
+    pythoncom = types.ModuleType("pythoncom")
+    pythoncom.CoInitialize = lambda: None
+    pythoncom.CoUninitialize = lambda: None
+    sys.modules["win32com"] = win32com
+    sys.modules["win32com.client"] = client
+    sys.modules["pythoncom"] = pythoncom
+    sys.modules["win32process"] = fake_win32process()
+    return client
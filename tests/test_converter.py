@@ -2,30 +2,103 @@ import unittest
 from unittest.mock import MagicMock, patch
 import sys
 import os
+import io
+import re
+import json
+import logging
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import weakref
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # Mock win32com.client before importing converter
 sys.modules["win32com"] = MagicMock()
 sys.modules["win32com.client"] = MagicMock()
+sys.modules["pythoncom"] = MagicMock()
 
 # Now we can import the module to be tested
 # We need to add the parent directory to sys.path to import converter
+import fake_office
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import converter
 
-class TestConverter(unittest.TestCase):
+
+# Command-line options as main() sees them when none are given
+DEFAULT_ARGS = {
+    "folder": None, "output": None, "workers": None, "pipeline": False, "cache": False,
+    "recursive": False, "watch": False, "interval": None, "recycle_after": None, "recycle_rss": None,
+    "timeout": None, "trace": False, "no_preflight": False, "plan": False, "postprocess": False,
+    "image_max_px": None, "stage_dir": None, "lease_dir": None, "resume": False,
+    "quarantine_after": None, "split_parts": None, "profile": None, "metrics_port": None,
+    "metrics_file": None, "com_profile": False, "com_profile_python": False,
+    "no_session_tuning": False, "gc_every": None, "manual_calculation": False,
+}
+
+
+def make_args(**overrides):
+    """Parsed arguments for main(), with the given options set."""
+    args = MagicMock()
+    for name, value in {**DEFAULT_ARGS, **overrides}.items():
+        setattr(args, name, value)
+    return args
+
+
+class MockOfficeTestCase(unittest.TestCase):
+    """Runs against the MagicMock Dispatch installed above, reset for every test."""
+
+    # The mocked files have no content for the pre-flight check to inspect
+    patch_preflight = True
+
     def setUp(self):
-        # Use the mock object that converter module is actually using
         self.mock_dispatch = converter.win32com.client.Dispatch
+        self.mock_dispatch.reset_mock()
+        self.mock_dispatch.side_effect = None
         self.mock_app = MagicMock()
         self.mock_dispatch.return_value = self.mock_app
-        
-        # Reset mocks to clear history from previous tests
-        self.mock_dispatch.reset_mock()
-        self.mock_app.reset_mock()
+        self.logger = logging.getLogger("test")
+        if self.patch_preflight:
+            self.start_patch(patch("converter.preflight_check"))
+        # MagicMock Office never writes the temp PDF, so there is nothing to rename
+        self.start_patch(patch("converter.commit_output"))
+
+    def start_patch(self, patcher):
+        mock = patcher.start()
+        self.addCleanup(patcher.stop)
+        return mock
+
+
+class FakeOfficeTestCase(unittest.TestCase):
+    """Runs against a fresh simulated Office (fake_office.py) with temporary input and output folders."""
+
+    backend_options = {}
+
+    def setUp(self):
+        self.backend = fake_office.FakeOffice(**self.backend_options)
+        patcher = patch.object(converter.win32com.client, "Dispatch", self.backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.folder = Path(self.tmp.name) / "in"
+        self.output = Path(self.tmp.name) / "out"
+        self.folder.mkdir()
+        self.output.mkdir()
+        self.logger = logging.getLogger("test")
+
+
+class TestConverter(MockOfficeTestCase):
+    def setUp(self):
+        super().setUp()
+        # Folder scanning is replaced by the file list each test sets up
+        self.mock_find = self.start_patch(patch("converter.find_files", return_value=[]))
 
     @patch("converter.Path")
-    @patch("os.path.exists")
+    @patch("converter.OutputIndex.exists")
     def test_convert_ppt_to_pdf(self, mock_exists, mock_path_cls):
         # Setup mocks
         mock_path_instance = mock_path_cls.return_value
@@ -39,8 +112,7 @@ class TestConverter(unittest.TestCase):
         mock_pdf_path.resolve.return_value = "/abs/path/to/test.pdf"
         mock_ppt_file.with_suffix.return_value = mock_pdf_path
         
-        # glob side effect: .pptx, .pptm, .ppt
-        mock_path_instance.glob.side_effect = [[mock_ppt_file], [], []]
+        self.mock_find.return_value = [mock_ppt_file]
         
         mock_exists.return_value = False # PDF does not exist, so proceed
         
@@ -59,7 +131,7 @@ class TestConverter(unittest.TestCase):
         self.mock_app.Quit.assert_called()
 
     @patch("converter.Path")
-    @patch("os.path.exists")
+    @patch("converter.OutputIndex.exists")
     def test_convert_excel_to_pdf(self, mock_exists, mock_path_cls):
         # Setup mocks
         mock_path_instance = mock_path_cls.return_value
@@ -73,8 +145,7 @@ class TestConverter(unittest.TestCase):
         mock_pdf_path.resolve.return_value = "/abs/path/to/test.pdf"
         mock_excel_file.with_suffix.return_value = mock_pdf_path
 
-        # glob side effect: .xlsx, .xlsm, .xls
-        mock_path_instance.glob.side_effect = [[mock_excel_file], [], []]
+        self.mock_find.return_value = [mock_excel_file]
         
         mock_exists.return_value = False
         
@@ -88,9 +159,11 @@ class TestConverter(unittest.TestCase):
         
         # Create individual sheet mocks
         mock_ws1 = MagicMock()
+        mock_ws1.Visible = converter.xlSheetVisible
         mock_ws1.PageSetup.PrintArea = "A1:B10" # Has print area
         
         mock_ws2 = MagicMock()
+        mock_ws2.Visible = converter.xlSheetVisible
         mock_ws2.PageSetup.PrintArea = None # No print area
         
         # When iterated, yield the sheets
@@ -103,8 +176,9 @@ class TestConverter(unittest.TestCase):
         self.mock_dispatch.assert_called_with("Excel.Application")
         self.mock_app.Workbooks.Open.assert_called()
         
-        # Verify Select was called on the Worksheets collection object
-        mock_worksheets.Select.assert_called()
+        # Verify Select was called on the Worksheets(visible_sheets) collection object
+        mock_worksheets.assert_called_with([mock_ws1.Name, mock_ws2.Name])
+        mock_worksheets.return_value.Select.assert_called()
         
         mock_workbook.ActiveSheet.ExportAsFixedFormat.assert_called()
         mock_workbook.Close.assert_called()
@@ -116,7 +190,7 @@ class TestConverter(unittest.TestCase):
         self.assertEqual(mock_ws2.PageSetup.FitToPagesTall, False)
 
     @patch("converter.Path")
-    @patch("os.path.exists")
+    @patch("converter.OutputIndex.exists")
     def test_convert_word_to_pdf(self, mock_exists, mock_path_cls):
         # Setup mocks
         mock_path_instance = mock_path_cls.return_value
@@ -130,8 +204,7 @@ class TestConverter(unittest.TestCase):
         mock_pdf_path.resolve.return_value = "/abs/path/to/test.pdf"
         mock_word_file.with_suffix.return_value = mock_pdf_path
 
-        # glob side effect: .docx, .docm, .doc
-        mock_path_instance.glob.side_effect = [[mock_word_file], [], []]
+        self.mock_find.return_value = [mock_word_file]
         
         mock_exists.return_value = False
         
@@ -146,22 +219,21 @@ class TestConverter(unittest.TestCase):
         self.mock_dispatch.assert_called_with("Word.Application")
         self.mock_app.Documents.Open.assert_called()
         # 17 = wdFormatPDF
-        mock_document.SaveAs2.assert_called_with(mock_pdf_path.resolve.return_value, FileFormat=17)
+        mock_document.SaveAs2.assert_called_with("/abs/path/to/test.converting.pdf", FileFormat=17)
         mock_document.Close.assert_called()
         self.mock_app.Quit.assert_called()
 
-    @patch("converter.convert_word_to_pdf")
-    @patch("converter.convert_ppt_to_pdf")
-    @patch("converter.convert_excel_to_pdf")
+    @patch("converter.convert_word_to_pdf", return_value=converter.new_stats())
+    @patch("converter.convert_ppt_to_pdf", return_value=converter.new_stats())
+    @patch("converter.convert_excel_to_pdf", return_value=converter.new_stats())
+    @patch("converter.setup_logger", return_value=(MagicMock(), "log.txt"))
     @patch("argparse.ArgumentParser.parse_args")
     @patch("converter.Path")
     @patch("converter.load_dotenv")
-    def test_main_basic(self, mock_load_dotenv, mock_path_cls, mock_parse_args, mock_ppt, mock_excel, mock_word):
+    @patch("converter.DirectoryIndex")
+    def test_main_basic(self, mock_dir_index, mock_load_dotenv, mock_path_cls, mock_parse_args, mock_setup_logger, mock_ppt, mock_excel, mock_word):
         # Setup mocks
-        mock_args = MagicMock()
-        mock_args.folder = "dummy_folder"
-        mock_args.output = None
-        mock_parse_args.return_value = mock_args
+        mock_parse_args.return_value = make_args(folder="dummy_folder")
         
         mock_path_instance = mock_path_cls.return_value
         mock_path_instance.exists.return_value = True
@@ -175,18 +247,19 @@ class TestConverter(unittest.TestCase):
         mock_ppt.assert_called()
         mock_excel.assert_called()
         mock_word.assert_called()
+        # The scan index is saved through the mock, never to a path built from the patched Path
+        mock_dir_index.return_value.save.assert_called_once()
 
-    @patch("converter.convert_ppt_to_pdf")
-    @patch("converter.convert_excel_to_pdf")
+    @patch("converter.convert_ppt_to_pdf", return_value=converter.new_stats())
+    @patch("converter.convert_excel_to_pdf", return_value=converter.new_stats())
+    @patch("converter.setup_logger", return_value=(MagicMock(), "log.txt"))
     @patch("argparse.ArgumentParser.parse_args")
     @patch("converter.Path")
     @patch("converter.load_dotenv")
-    def test_main_use_env_vars(self, mock_load_dotenv, mock_path_cls, mock_parse_args, mock_ppt, mock_excel):
+    @patch("converter.DirectoryIndex")
+    def test_main_use_env_vars(self, mock_dir_index, mock_load_dotenv, mock_path_cls, mock_parse_args, mock_setup_logger, mock_ppt, mock_excel):
         # Case: Argument is None, Env Var is Set
-        mock_args = MagicMock()
-        mock_args.folder = None
-        mock_args.output = None
-        mock_parse_args.return_value = mock_args
+        mock_parse_args.return_value = make_args()
         
         mock_path_instance = mock_path_cls.return_value
         mock_path_instance.exists.return_value = True
@@ -202,17 +275,16 @@ class TestConverter(unittest.TestCase):
         
         mock_ppt.assert_called()
 
-    @patch("converter.convert_ppt_to_pdf")
-    @patch("converter.convert_excel_to_pdf")
+    @patch("converter.convert_ppt_to_pdf", return_value=converter.new_stats())
+    @patch("converter.convert_excel_to_pdf", return_value=converter.new_stats())
+    @patch("converter.setup_logger", return_value=(MagicMock(), "log.txt"))
     @patch("argparse.ArgumentParser.parse_args")
     @patch("converter.Path")
     @patch("converter.load_dotenv")
-    def test_main_priority(self, mock_load_dotenv, mock_path_cls, mock_parse_args, mock_ppt, mock_excel):
+    @patch("converter.DirectoryIndex")
+    def test_main_priority(self, mock_dir_index, mock_load_dotenv, mock_path_cls, mock_parse_args, mock_setup_logger, mock_ppt, mock_excel):
         # Case: Argument is Set, Env Var is Set -> Argument wins
-        mock_args = MagicMock()
-        mock_args.folder = "/arg/path"
-        mock_args.output = "/arg/out"
-        mock_parse_args.return_value = mock_args
+        mock_parse_args.return_value = make_args(folder="/arg/path", output="/arg/out")
         
         mock_path_instance = mock_path_cls.return_value
         mock_path_instance.exists.return_value = True
@@ -225,17 +297,16 @@ class TestConverter(unittest.TestCase):
         # Output path from arg
         mock_path_cls.assert_any_call("/arg/out")
 
-    @patch("converter.convert_ppt_to_pdf")
-    @patch("converter.convert_excel_to_pdf")
+    @patch("converter.convert_ppt_to_pdf", return_value=converter.new_stats())
+    @patch("converter.convert_excel_to_pdf", return_value=converter.new_stats())
+    @patch("converter.setup_logger", return_value=(MagicMock(), "log.txt"))
     @patch("argparse.ArgumentParser.parse_args")
     @patch("converter.Path")
     @patch("converter.load_dotenv")
-    def test_main_missing_config(self, mock_load_dotenv, mock_path_cls, mock_parse_args, mock_ppt, mock_excel):
+    @patch("converter.DirectoryIndex")
+    def test_main_missing_config(self, mock_dir_index, mock_load_dotenv, mock_path_cls, mock_parse_args, mock_setup_logger, mock_ppt, mock_excel):
         # Case: No Arg, No Env -> Exit
-        mock_args = MagicMock()
-        mock_args.folder = None
-        mock_args.output = None
-        mock_parse_args.return_value = mock_args
+        mock_parse_args.return_value = make_args()
 
         with patch.dict(os.environ, {}, clear=True):
             with self.assertRaises(SystemExit) as cm:
@@ -245,8 +316,7 @@ class TestConverter(unittest.TestCase):
     def test_no_files_found(self):
         # Setup mocks
         with patch("converter.Path") as mock_path_cls:
-            mock_path_instance = mock_path_cls.return_value
-            mock_path_instance.glob.side_effect = [[], [], [], [], [], [], [], [], []] # All empty
+            self.mock_find.return_value = [] # All empty
 
             # Run functions
             converter.convert_ppt_to_pdf("dummy")
@@ -259,10 +329,9 @@ class TestConverter(unittest.TestCase):
     def test_app_launch_failure(self):
         # Setup mocks
         with patch("converter.Path") as mock_path_cls:
-            mock_path_instance = mock_path_cls.return_value
             # Return dummy files to trigger dispatch
             mock_file = MagicMock()
-            mock_path_instance.glob.return_value = [mock_file]
+            self.mock_find.return_value = [mock_file]
             
             # Dispatch raises exception
             self.mock_dispatch.side_effect = Exception("Launch failed")
@@ -276,13 +345,13 @@ class TestConverter(unittest.TestCase):
             self.mock_dispatch.side_effect = None
 
     @patch("converter.Path")
-    @patch("os.path.exists")
+    @patch("converter.OutputIndex.exists")
     def test_pdf_already_exists(self, mock_exists, mock_path_cls):
         # Setup mocks
         mock_path_instance = mock_path_cls.return_value
         mock_file = MagicMock()
         mock_file.name = "test.pptx"
-        mock_path_instance.glob.side_effect = [[mock_file], [], []] # PPT only
+        self.mock_find.return_value = [mock_file]
         
         mock_exists.return_value = True # PDF exists
 
@@ -292,13 +361,13 @@ class TestConverter(unittest.TestCase):
         self.mock_app.Presentations.Open.assert_not_called()
 
     @patch("converter.Path")
-    @patch("os.path.exists")
+    @patch("converter.OutputIndex.exists")
     def test_conversion_exception(self, mock_exists, mock_path_cls):
         # Setup mocks
         mock_path_instance = mock_path_cls.return_value
         mock_file = MagicMock()
         mock_file.name = "test.pptx"
-        mock_path_instance.glob.side_effect = [[mock_file], [], []]
+        self.mock_find.return_value = [mock_file]
         mock_exists.return_value = False
 
         # Open raises exception
@@ -310,14 +379,14 @@ class TestConverter(unittest.TestCase):
         self.mock_app.Quit.assert_called()
 
     @patch("converter.Path")
-    @patch("os.path.exists")
+    @patch("converter.OutputIndex.exists")
     def test_output_folder_logic(self, mock_exists, mock_path_cls):
         # Setup mocks
         mock_path_instance = mock_path_cls.return_value
         mock_file = MagicMock()
         mock_file.name = "test.pptx"
         mock_file.with_suffix.return_value.name = "test.pdf" # correctly handle with_suffix().name
-        mock_path_instance.glob.side_effect = [[mock_file], [], []]
+        self.mock_find.return_value = [mock_file]
         mock_exists.return_value = False
         
         output_folder = MagicMock()
@@ -331,7 +400,1413 @@ class TestConverter(unittest.TestCase):
         # Check if SaveAs called with expected path
         # We need to drill down to the mock presentation created by Open
         mock_presentation = self.mock_app.Presentations.Open.return_value
-        mock_presentation.SaveAs.assert_called_with("/out/test.pdf", 32)
+        mock_presentation.SaveAs.assert_called_with("/out/test.converting.pdf", 32)
+
+
+class TestParallel(MockOfficeTestCase):
+    patch_preflight = False
+
+    def test_split_chunks(self):
+        self.assertEqual(converter.split_chunks([1, 2, 3, 4, 5], 2), [[1, 3, 5], [2, 4]])
+        # Empty chunks are dropped when there are fewer files than workers
+        self.assertEqual(converter.split_chunks([1], 3), [[1]])
+
+    def test_merge_stats(self):
+        total = converter.new_stats()
+        converter.merge_stats(total, {'success': 2, 'skip': 1, 'error': 0})
+        converter.merge_stats(total, {'success': 1, 'skip': 0, 'error': 3})
+        self.assertEqual(total['success'], 3)
+        self.assertEqual(total['skip'], 1)
+        self.assertEqual(total['error'], 3)
+
+    @patch("converter._init_worker")
+    @patch("converter.ProcessPoolExecutor", ThreadPoolExecutor)
+    def test_convert_parallel_merges_stats(self, mock_init_worker):
+        with tempfile.TemporaryDirectory() as tmp:
+            folder = Path(tmp)
+            for name in ["a.pptx", "b.pptx", "c.pptx", "d.docx"]:
+                fake_office.write_document(folder / name)
+
+            results = converter.convert_parallel(folder, None, logging.getLogger("test"), 2)
+
+            self.assertEqual(results['ppt']['success'], 3)
+            self.assertEqual(results['word']['success'], 1)
+            self.assertEqual(results['excel'], converter.new_stats())
+            # PowerPoint is one shared process, so all decks go to a single chunk: 1 PowerPoint + 1 Word
+            self.assertEqual(self.mock_dispatch.call_count, 2)
+            self.assertEqual(sorted(p.name for p in (folder / "done").iterdir()),
+                             ["a.pptx", "b.pptx", "c.pptx", "d.docx"])
+
+    def test_convert_pipeline_runs_lanes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            folder = Path(tmp)
+            for name in ["a.pptx", "b.docx", "c.docx"]:
+                fake_office.write_document(folder / name)
+
+            results = converter.convert_pipeline(folder, None, logging.getLogger("test"))
+
+            self.assertEqual(results['ppt']['success'], 1)
+            self.assertEqual(results['word']['success'], 2)
+            self.assertEqual(results['excel'], converter.new_stats())
+            # Lanes without files never start Office
+            self.assertEqual(sorted(c.args[0] for c in self.mock_dispatch.call_args_list),
+                             ["PowerPoint.Application", "Word.Application"])
+
+
+class TestScanner(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = Path(self.tmp.name)
+        for name in ["a.pptx", "b.XLSX", "c.doc", "notes.txt", "sub/d.docx", "done/e.pptx"]:
+            path = self.folder / name
+            path.parent.mkdir(exist_ok=True)
+            path.write_bytes(b"dummy")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def names(self, groups):
+        return {kind: sorted(p.name for p in files) for kind, files in groups.items()}
+
+    def test_routes_files_by_extension(self):
+        groups = converter.group_files(self.folder)
+        self.assertEqual(self.names(groups), {'ppt': ["a.pptx"], 'excel': ["b.XLSX"], 'word': ["c.doc"]})
+
+    def test_recursive_skips_done_folder(self):
+        groups = converter.group_files(self.folder, recursive=True)
+        self.assertEqual(self.names(groups)['word'], ["c.doc", "d.docx"])
+        self.assertEqual(self.names(groups)['ppt'], ["a.pptx"])
+
+    def test_recursive_output_mirrors_subfolders(self):
+        output = Path(self.tmp.name) / "out"
+        pdf_path = converter.pdf_path_for(self.folder / "sub" / "d.docx", output, self.folder)
+        self.assertEqual(pdf_path, str((output / "sub" / "d.pdf").resolve()))
+
+    def test_dir_index_skips_unchanged_folders(self):
+        empty = self.folder / "empty"
+        empty.mkdir()
+        index = converter.DirectoryIndex(self.folder / converter.SCAN_INDEX_FILE_NAME)
+        converter.group_files(self.folder, recursive=True, dir_index=index)
+        index.save()
+
+        index = converter.DirectoryIndex(self.folder / converter.SCAN_INDEX_FILE_NAME)
+        with patch("converter.os.scandir", wraps=os.scandir) as mock_scandir:
+            groups = converter.group_files(self.folder, recursive=True, dir_index=index)
+        listed = [Path(c.args[0]).name for c in mock_scandir.call_args_list]
+        # Folders without pending files are not listed again, the rest are
+        self.assertNotIn("empty", listed)
+        self.assertIn("sub", listed)
+        self.assertEqual(self.names(groups)['word'], ["c.doc", "d.docx"])
+
+    def test_output_index_lists_folder_once(self):
+        (self.folder / "a.pdf").write_bytes(b"%PDF")
+        index = converter.OutputIndex()
+        with patch("converter.os.scandir", wraps=os.scandir) as mock_scandir:
+            self.assertTrue(index.exists(str(self.folder / "a.pdf")))
+            self.assertFalse(index.exists(str(self.folder / "b.pdf")))
+            index.add(str(self.folder / "b.pdf"))
+            self.assertTrue(index.exists(str(self.folder / "b.pdf")))
+        self.assertEqual(mock_scandir.call_count, 1)
+
+
+class TestWatch(MockOfficeTestCase):
+    patch_preflight = False
+
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_polling_reports_files_once_settled(self):
+        notifier = converter.PollingNotifier(self.folder)
+        (self.folder / "a.pptx").write_bytes(b"dummy")
+
+        # First sighting only marks the file as pending
+        self.assertEqual(notifier.poll(), [])
+        self.assertEqual(notifier.poll(), [('ppt', self.folder / "a.pptx")])
+        # Already reported and unchanged
+        self.assertEqual(notifier.poll(), [])
+
+        # Still being written: size changes between polls
+        (self.folder / "b.docx").write_bytes(b"x")
+        notifier.poll()
+        (self.folder / "b.docx").write_bytes(b"xx")
+        self.assertEqual(notifier.poll(), [])
+        self.assertEqual(notifier.poll(), [('word', self.folder / "b.docx")])
+
+    def test_watch_keeps_office_warm_between_batches(self):
+        for name in ["a.pptx", "b.pptx"]:
+            fake_office.write_document(self.folder / name)
+
+        class FakeNotifier:
+            def changes(inner, stop_event):
+                yield [('ppt', self.folder / "a.pptx")]
+                yield [('ppt', self.folder / "b.pptx")]
+
+        results = converter.watch_folder(self.folder, None, logging.getLogger("test"),
+                                         notifier=FakeNotifier())
+
+        self.assertEqual(results['ppt']['success'], 2)
+        # Dispatched once and quit once, despite two batches
+        self.mock_dispatch.assert_called_once_with("PowerPoint.Application")
+        self.mock_app.Quit.assert_called_once()
+
+
+class TestRecycle(MockOfficeTestCase):
+    def files(self, n):
+        files = []
+        for i in range(n):
+            f = MagicMock()
+            f.name = f"{i}.pptx"
+            f.with_suffix.return_value.resolve.return_value = f"/nonexistent/{i}.pdf"
+            files.append(f)
+        return files
+
+    def test_parse_per_format(self):
+        self.assertEqual(converter.parse_per_format("200"), {'ppt': 200, 'excel': 200, 'word': 200})
+        self.assertEqual(converter.parse_per_format("excel=100, word=300"), {'excel': 100, 'word': 300})
+        self.assertEqual(converter.parse_per_format(None), {})
+        with self.assertRaises(ValueError):
+            converter.parse_per_format("visio=1")
+
+    def test_recycle_after_document_count(self):
+        recycle = converter.recycle_policies(max_documents={'ppt': 2})
+        office = converter.PowerPointApp(self.logger)
+
+        stats = converter.convert_files(office, self.files(5), None, self.logger, recycle=recycle)
+
+        self.assertEqual(stats['success'], 5)
+        # Restarted before the 3rd and 5th file, never after the last one
+        self.assertEqual(stats['recycle'], 2)
+        self.assertEqual(self.mock_dispatch.call_count, 3)
+        self.assertEqual(self.mock_app.Quit.call_count, 3)
+
+    def test_recycle_on_memory_threshold(self):
+        recycle = converter.recycle_policies(max_rss_mb={'ppt': 100})
+        office = converter.PowerPointApp(self.logger)
+
+        with patch.object(converter.PowerPointApp, "memory_rss", return_value=200 * 1024 * 1024):
+            stats = converter.convert_files(office, self.files(3), None, self.logger, recycle=recycle)
+
+        self.assertEqual(stats['recycle'], 2)
+        self.assertGreaterEqual(stats['recycle_seconds'], 0)
+
+    def test_no_policy_for_other_formats(self):
+        recycle = converter.recycle_policies(max_documents={'excel': 1})
+        office = converter.PowerPointApp(self.logger)
+
+        stats = converter.convert_files(office, self.files(3), None, self.logger, recycle=recycle)
+
+        self.assertEqual(stats['recycle'], 0)
+        self.mock_dispatch.assert_called_once()
+
+
+class TestHangWatchdog(MockOfficeTestCase):
+    def test_hung_document_is_killed_and_batch_continues(self):
+        killed = threading.Event()
+
+        def open_presentation(path, ReadOnly, WithWindow):
+            if path.endswith("hang.pptx"):
+                # Blocks like a modal dialog until the process is killed
+                killed.wait(5)
+                raise Exception("The RPC server is unavailable")
+            return MagicMock()
+
+        self.mock_app.Presentations.Open.side_effect = open_presentation
+        files = []
+        for name in ["hang.pptx", "ok.pptx"]:
+            f = MagicMock()
+            f.name = name
+            f.resolve.return_value = f"/nonexistent/{name}"
+            f.with_suffix.return_value.resolve.return_value = f"/nonexistent/{name}.pdf"
+            files.append(f)
+
+        office = converter.PowerPointApp(self.logger)
+        with patch.object(converter.PowerPointApp, "_window_pid", return_value=4321), \
+                patch("converter.kill_process", side_effect=lambda pid: killed.set()) as mock_kill:
+            stats = converter.convert_files(office, files, None, self.logger, timeout={'ppt': 0.2})
+
+        mock_kill.assert_called_once_with(4321)
+        self.assertEqual(stats['timeout'], 1)
+        self.assertEqual(stats['error'], 1)
+        self.assertEqual(stats['success'], 1)
+        # A fresh instance was started for the next file
+        self.assertEqual(self.mock_dispatch.call_count, 2)
+
+    def test_fast_document_is_not_killed(self):
+        files = [MagicMock()]
+        files[0].resolve.return_value = "/nonexistent/a.pptx"
+        files[0].with_suffix.return_value.resolve.return_value = "/nonexistent/a.pdf"
+        office = converter.PowerPointApp(self.logger)
+        with patch.object(converter.PowerPointApp, "_window_pid", return_value=4321), \
+                patch("converter.kill_process") as mock_kill:
+            stats = converter.convert_files(office, files, None, self.logger, timeout={'ppt': 5})
+
+        mock_kill.assert_not_called()
+        self.assertEqual(stats['success'], 1)
+        self.assertEqual(stats['timeout'], 0)
+
+
+class TestFakeOfficeBackend(FakeOfficeTestCase):
+    def write(self, name, spec):
+        fake_office.write_document(self.folder / name, spec)
+
+    def page_count(self, pdf_name):
+        data = (self.output / pdf_name).read_bytes()
+        return int(re.search(rb"/Count (\d+)", data).group(1))
+
+    def test_serial_conversion_end_to_end(self):
+        self.write("deck.pptx", {"pages": 3})
+        self.write("memo.docx", {"pages": 2})
+        self.write("broken.docx", {"fail": "Document is corrupt"})
+
+        results = converter.convert_serial(self.folder, self.output, self.logger)
+
+        self.assertEqual(results['ppt']['success'], 1)
+        self.assertEqual(results['word']['success'], 1)
+        self.assertEqual(results['word']['error'], 1)
+        self.assertEqual(self.page_count("deck.pdf"), 3)
+        self.assertTrue((self.folder / "done" / "memo.docx").exists())
+        self.assertTrue((self.folder / "broken.docx").exists())
+        self.assertTrue(all(app.quit_called for app in self.backend.apps))
+
+    def test_powerpoint_is_shared_by_every_client(self):
+        self.write("deck.pptx", {"pages": 1})
+        path = str(self.folder / "deck.pptx")
+        first = self.backend("PowerPoint.Application")
+        second = self.backend("PowerPoint.Application")
+        self.assertIs(first, second)
+        self.assertIsNot(self.backend("Excel.Application"), self.backend("Excel.Application"))
+
+        # Quit from one client ends the process for the other as well
+        first.Quit()
+        with self.assertRaises(fake_office.FakeComError):
+            second.Presentations.Open(path)
+
+        third = self.backend("PowerPoint.Application")
+        self.assertIsNot(third, first)
+        fourth = self.backend("PowerPoint.Application")
+        self.backend.kill(third.pid)
+        with self.assertRaises(fake_office.FakeComError):
+            fourth.Presentations.Open(path)
+        self.assertEqual(sum(app.kind == "ppt" for app in self.backend.apps), 2)
+
+    def test_excel_exports_only_visible_sheets(self):
+        self.write("book.xlsx", {"sheets": [
+            {"name": "A", "pages": 2},
+            {"name": "Hidden", "pages": 5, "visible": False},
+            {"name": "B", "pages": 1, "print_area": "$A$1:$C$9"},
+        ]})
+
+        stats = converter.convert_excel_to_pdf(self.folder, self.output, self.logger)
+
+        self.assertEqual(stats['success'], 1)
+        self.assertEqual(self.page_count("book.pdf"), 3)
+
+    def test_xlsx_prescan_skips_per_sheet_com_calls(self):
+        fake_office.write_xlsx(self.folder / "book.xlsx", {"sheets": [
+            {"name": "A", "pages": 2},
+            {"name": "Hidden", "pages": 5, "visible": False},
+            {"name": "Chart", "chart": True},
+            {"name": "B", "pages": 1, "print_area": "$A$1:$C$9"},
+            {"name": "Secret", "state": "veryHidden"},
+        ]})
+
+        plan = converter.scan_workbook(self.folder / "book.xlsx")
+        self.assertEqual(plan.visible_sheets, ["A", "B"])
+        self.assertEqual(plan.fit_sheets, ["A"])
+        self.assertEqual(plan.sheet_count, 4)
+
+        with patch.object(fake_office.FakeWorksheets, "__iter__", side_effect=AssertionError("COM scan")):
+            stats = converter.convert_excel_to_pdf(self.folder, self.output, self.logger)
+
+        self.assertEqual(stats['success'], 1)
+        self.assertEqual(self.page_count("book.pdf"), 3)
+
+    def test_prescan_falls_back_for_legacy_and_broken_files(self):
+        self.write("legacy.xls", {"pages": 1})
+        (self.folder / "broken.xlsx").write_bytes(b"PK\x03\x04 not really a zip")
+
+        self.assertIsNone(converter.scan_workbook(self.folder / "legacy.xls"))
+        self.assertIsNone(converter.scan_workbook(self.folder / "broken.xlsx"))
+
+    def test_split_policy_and_sheet_groups(self):
+        self.assertEqual(converter.split_sheet_groups(list("abcdefg"), 3), [list("abc"), list("de"), list("fg")])
+        self.assertEqual(converter.split_sheet_groups(["a"], 4), [["a"]])
+        policy = converter.SplitPolicy(parts=4, min_sheets=10, min_seconds=60)
+        plan = converter.ExcelExportPlan([f"S{i}" for i in range(3)], [], 3)
+        self.assertEqual(policy.parts_for(plan), 1)
+        self.assertEqual(policy.parts_for(plan, expected_seconds=120), 3)
+        self.assertEqual(policy.parts_for(converter.ExcelExportPlan([f"S{i}" for i in range(12)], [], 12)), 4)
+        # .xls files have no pre-scan plan and are never split
+        self.assertEqual(policy.parts_for(None, expected_seconds=999), 1)
+
+    @unittest.skipUnless(converter.pypdf, "pypdf is not installed")
+    def test_large_workbook_is_split_and_merged_in_sheet_order(self):
+        sheets = [{"name": f"S{i:02d}", "pages": 1 + i % 2} for i in range(10)]
+        sheets.insert(3, {"name": "Hidden", "visible": False})
+        self.write("big.xlsx", {"sheets": sheets})
+        self.write("small.xlsx", {"sheets": [{"name": "A"}, {"name": "B"}]})
+        split = converter.SplitPolicy(parts=3, min_sheets=5)
+
+        results = converter.convert_serial(self.folder, self.output, self.logger, split=split)
+
+        self.assertEqual(results['excel']['success'], 2)
+        reader = converter.pypdf.PdfReader(self.output / "big.pdf")
+        expected = [s["name"] for s in sheets if s.get("visible", True) for _ in range(s["pages"])]
+        self.assertEqual([str(page["/FakeLabel"]) for page in reader.pages], expected)
+        self.assertEqual(self.page_count("small.pdf"), 2)
+        # One batch instance plus two helpers for the big workbook only
+        self.assertEqual(self.backend.dispatch_count, 3)
+        self.assertEqual(sorted(p.name for p in self.output.iterdir()), ["big.pdf", "small.pdf"])
+
+    def test_split_requires_pypdf(self):
+        split = converter.SplitPolicy(parts=2, min_sheets=5)
+        with patch.object(converter, "pypdf", None):
+            with self.assertRaises(ValueError):
+                converter.BatchConverter(converter.ExcelApp(self.logger), None, self.logger, split=split)
+            # Only Excel workbooks are split, so other formats do not need it
+            converter.BatchConverter(converter.WordApp(self.logger), None, self.logger, split=split)
+
+    @unittest.skipUnless(converter.pypdf, "pypdf is not installed")
+    def test_helpers_share_the_batch_session_settings(self):
+        self.write("big.xlsx", {"sheets": [{"name": f"S{i}"} for i in range(6)]})
+        split = converter.SplitPolicy(parts=3, min_sheets=5)
+        helpers = []
+
+        def export_group(helper, *args):
+            helpers.append((helper.tune_session, helper.manual_calculation))
+            return original(helper, *args)
+
+        original = converter._export_sheet_group
+        with patch("converter._export_sheet_group", side_effect=export_group):
+            results = converter.convert_serial(self.folder, self.output, self.logger, split=split,
+                                               tune_session=False, manual_calculation=True)
+
+        self.assertEqual(results['excel']['success'], 1)
+        self.assertEqual(helpers, [(False, True), (False, True)])
+
+    @unittest.skipUnless(converter.pypdf, "pypdf is not installed")
+    def test_failed_sheet_group_fails_the_workbook(self):
+        self.write("big.xlsx", {"sheets": [{"name": f"S{i}"} for i in range(6)]})
+        split = converter.SplitPolicy(parts=2, min_sheets=5)
+
+        with patch("converter._export_sheet_group", side_effect=RuntimeError("helper crashed")):
+            results = converter.convert_serial(self.folder, self.output, self.logger, split=split)
+
+        self.assertEqual(results['excel']['error'], 1)
+        self.assertEqual(list(self.output.iterdir()), [])
+        self.assertTrue((self.folder / "big.xlsx").exists())
+
+    def test_outputs_are_renamed_into_place_after_export(self):
+        self.write("deck.pptx", {"pages": 2})
+        # Left behind by a crash mid-export: must not count as converted
+        (self.output / "deck.converting.pdf").write_bytes(b"%PDF-1.4 trunc")
+        self.write("broken.docx", {"fail": "Document is corrupt"})
+
+        results = converter.convert_serial(self.folder, self.output, self.logger)
+
+        self.assertEqual(results['ppt']['success'], 1)
+        self.assertEqual(self.page_count("deck.pdf"), 2)
+        self.assertEqual(sorted(p.name for p in self.output.iterdir()), ["deck.pdf"])
+        self.assertEqual(sorted(p.name for p in (self.folder / "done").iterdir()), ["deck.pptx"])
+
+    def test_failed_rename_counts_as_error(self):
+        self.write("deck.pptx", {"pages": 1})
+
+        with patch("converter.commit_output", side_effect=PermissionError("locked")):
+            results = converter.convert_serial(self.folder, self.output, self.logger)
+
+        self.assertEqual(results['ppt']['success'], 0)
+        self.assertEqual(results['ppt']['error'], 1)
+        self.assertFalse((self.output / "deck.pdf").exists())
+
+    def test_hosts_share_a_folder_without_duplicate_work(self):
+        names = [f"d{i}.docx" for i in range(12)]
+        for name in names:
+            self.write(name, {"pages": 1})
+        lease_dir = Path(self.tmp.name) / "leases"
+        self.backend.open_latency = 0.01
+        results = {}
+
+        def host(name):
+            leases = converter.LeaseQueue(lease_dir, root=self.folder, host=name)
+            files = [self.folder / n for n in names]
+            try:
+                results[name] = converter.convert_files(converter.WordApp(self.logger), files, self.output,
+                                                        self.logger, leases=leases)
+            finally:
+                leases.close()
+
+        threads = [threading.Thread(target=host, args=(name,)) for name in ("host-a", "host-b")]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sum(r['success'] for r in results.values()), len(names))
+        self.assertEqual(sum(r['elsewhere'] for r in results.values()), len(names))
+        self.assertEqual(sorted(r["file"] for r in self.backend.records), sorted(names))
+        self.assertEqual(sorted(p.name for p in (self.folder / "done").iterdir()), sorted(names))
+        self.assertEqual(list(lease_dir.glob("*.lease")), [])
+
+    def test_staging_opens_local_copies_and_uploads_pdfs(self):
+        for name in ["a.pptx", "b.pptx", "c.pptx"]:
+            self.write(name, {"pages": 2})
+        self.write("done.docx", {"pages": 1})
+        (self.output / "done.pdf").write_bytes(b"%PDF")  # already converted: never staged
+        stage_root = Path(self.tmp.name) / "stage"
+        staging = converter.StagingArea(stage_root, ahead=1, budget_mb=1)
+        copied = []
+        real_copy = converter.StagingArea._copy
+
+        def copy(area, file_path):
+            copied.append(file_path.name)
+            return real_copy(area, file_path)
+
+        with patch.object(converter.StagingArea, "_copy", copy):
+            results = converter.convert_serial(self.folder, self.output, self.logger, staging=staging)
+
+        self.assertEqual(results['ppt']['success'], 3)
+        self.assertEqual(results['word']['skip'], 1)
+        self.assertEqual(sorted(copied), ["a.pptx", "b.pptx", "c.pptx"])
+        # Office saw only the local copies
+        opened = [r["file"] for r in self.backend.records]
+        self.assertEqual(len(opened), 3)
+        self.assertTrue(all(re.fullmatch(r"\d+-[abc]\.pptx", name) for name in opened))
+        self.assertEqual(self.page_count("c.pdf"), 2)
+        # Nothing is left in the scratch directory once the batch is done
+        self.assertEqual([p for p in stage_root.rglob("*") if p.is_file()], [])
+        staging.close()
+        self.assertEqual(list(stage_root.iterdir()), [])
+
+    @unittest.skipUnless(converter.pypdf, "pypdf is not installed")
+    def test_postprocess_rewrites_pdfs_alongside_conversion(self):
+        self.write("deck.pptx", {"pages": 3})
+        self.write("memo.docx", {"pages": 2})
+        self.write("broken.docx", {"fail": "Document is corrupt"})
+
+        postprocess = converter.PdfPostProcessor()
+        self.addCleanup(postprocess.close)
+        results = converter.convert_serial(self.folder, self.output, self.logger, postprocess=postprocess)
+
+        self.assertEqual(results['ppt']['postprocessed'], 1)
+        self.assertEqual(results['word']['postprocessed'], 1)
+        self.assertEqual(results['word']['postprocess_error'], 0)
+        self.assertGreater(results['ppt']['pdf_bytes_in'], 0)
+        reader = converter.pypdf.PdfReader(self.output / "deck.pdf")
+        self.assertEqual(len(reader.pages), 3)
+        self.assertEqual(reader.metadata["/Creator"], converter.PDF_CREATOR)
+        self.assertEqual(reader.metadata["/SourceFile"], "deck.pptx")
+        self.assertEqual(list(self.output.glob("*.tmp")), [])
+
+    @unittest.skipUnless(converter.pypdf, "pypdf is not installed")
+    def test_duplicates_are_postprocessed_like_their_original(self):
+        self.write("a.pptx", {"pages": 2})
+        self.write("b.pptx", {"pages": 2})
+        cache = converter.ConversionCache(Path(self.tmp.name) / converter.CACHE_FILE_NAME)
+        self.addCleanup(cache.close)
+        postprocess = converter.PdfPostProcessor()
+        self.addCleanup(postprocess.close)
+
+        results = converter.convert_serial(self.folder, self.output, self.logger, cache=cache,
+                                           postprocess=postprocess)
+
+        self.assertEqual(results['ppt']['duplicate'], 1)
+        self.assertEqual(results['ppt']['postprocessed'], 2)
+        for name in ("a", "b"):
+            reader = converter.pypdf.PdfReader(self.output / f"{name}.pdf")
+            self.assertEqual(reader.metadata["/SourceFile"], f"{name}.pptx")
+
+    def test_trace_records_phases_and_summary(self):
+        self.write("deck.pptx", {"pages": 4})
+        self.write("book.xlsx", {"sheets": [{"name": "A"}, {"name": "Hidden", "visible": False}]})
+        self.write("broken.docx", {"fail": "Document is corrupt"})
+        (self.output / "old.pdf").write_bytes(b"%PDF")
+        self.write("old.docx", {"pages": 1})
+
+        trace_file, summary = converter.setup_trace(Path(self.tmp.name))
+        trace_logger = logging.getLogger(converter.TRACE_LOGGER_NAME)
+        self.addCleanup(trace_logger.handlers.clear)
+        for handler in trace_logger.handlers:
+            self.addCleanup(handler.close)
+        converter.convert_serial(self.folder, self.output, self.logger, trace=True)
+        for handler in trace_logger.handlers:
+            handler.flush()
+
+        with open(trace_file, encoding="utf-8") as f:
+            records = {Path(r["file"]).name: r for r in map(json.loads, f)}
+        deck = records["deck.pptx"]
+        self.assertEqual(deck["outcome"], "success")
+        self.assertEqual(deck["slides"], 4)
+        self.assertTrue({"open", "export", "close"} <= set(deck["phases"]))
+        self.assertGreater(deck["output_bytes"], 0)
+        self.assertTrue(deck["instance"].startswith("ppt#1@"))
+        self.assertEqual(records["book.xlsx"]["visible_sheets"], 1)
+        self.assertIn("prepare", records["book.xlsx"]["phases"])
+        self.assertEqual(records["broken.docx"]["outcome"], "error")
+        self.assertIn("corrupt", records["broken.docx"]["error"])
+        self.assertEqual(records["old.docx"]["outcome"], "skip")
+
+        formats = summary.summary()["formats"]
+        self.assertEqual(formats["word"]["files"], 2)
+        self.assertEqual(formats["word"]["converted"], 1)
+        self.assertIn("p95", formats["ppt"])
+
+    def test_word_process_is_found_from_a_document_window(self):
+        # Word's Application has no window handle, and without psutil there is no other way to find its pid
+        self.write("hang.docx", {"hang": True})
+        self.write("ok.docx", {"pages": 1})
+        with patch.object(converter, "psutil", None), \
+                patch.dict(sys.modules, {"win32process": fake_office.fake_win32process()}), \
+                patch("converter.kill_process", side_effect=self.backend.kill):
+            stats = converter.convert_word_to_pdf(self.folder, self.output, self.logger, timeout={'word': 0.2})
+
+        first = self.backend.apps[0]
+        self.assertTrue(first._process.killed.is_set())
+        # The blank document used to find the window is closed again right away
+        self.assertTrue(first.Documents.added)
+        self.assertTrue(all(doc.closed for doc in first.Documents.added))
+        self.assertEqual(stats['timeout'], 1)
+        self.assertEqual(stats['success'], 1)
+        self.assertTrue((self.output / "ok.pdf").exists())
+
+
+class TestPreflight(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.folder = Path(self.tmp.name)
+
+    def reason(self, name):
+        try:
+            converter.preflight_check(self.folder / name)
+        except converter.PreflightError as e:
+            return e.reason
+        return None
+
+    def test_classifies_containers(self):
+        fake_office.write_document(self.folder / "ok.docx")
+        (self.folder / "empty.pptx").write_bytes(b"")
+        (self.folder / "text.pptx").write_bytes(b"hello")
+        (self.folder / "truncated.xlsx").write_bytes(b"PK\x03\x04" + b"\0" * 64)
+        with zipfile.ZipFile(self.folder / "archive.docx", "w") as z:
+            z.writestr("readme.txt", "not a document")
+        (self.folder / "report.xls").write_bytes(b"<html><table></table></html>")
+
+        self.assertIsNone(self.reason("ok.docx"))
+        self.assertEqual(self.reason("empty.pptx"), "corrupt")
+        self.assertEqual(self.reason("text.pptx"), "mismatch")
+        self.assertEqual(self.reason("truncated.xlsx"), "corrupt")
+        self.assertEqual(self.reason("archive.docx"), "mismatch")
+        # Office opens HTML saved as .xls, so legacy suffixes are not judged by content
+        self.assertIsNone(self.reason("report.xls"))
+
+    def test_encrypted_ooxml_without_olefile(self):
+        fake_office.write_ole(self.folder / "secret.xlsx", ["EncryptionInfo", "EncryptedPackage"])
+        # Enough entries that the directory spans two sectors
+        fake_office.write_ole(self.folder / "long.docx", ["a", "b", "c", "d", "EncryptionInfo"])
+        fake_office.write_ole(self.folder / "legacy.docx", ["WordDocument", "1Table"])
+        (self.folder / "unreadable.pptx").write_bytes(converter.OLE_MAGIC + b"\0" * 504)
+        with patch.object(converter, "olefile", None):
+            self.assertEqual(self.reason("secret.xlsx"), "encrypted")
+            self.assertEqual(self.reason("long.docx"), "encrypted")
+            # Not provably encrypted, so Office gets to decide
+            self.assertIsNone(self.reason("legacy.docx"))
+            self.assertIsNone(self.reason("unreadable.pptx"))
+
+    def test_missing_olefile_is_reported_once(self):
+        fake_office.write_ole(self.folder / "a.doc", ["WordDocument"])
+        fake_office.write_ole(self.folder / "b.doc", ["WordDocument"])
+        converter._warn_without_olefile.cache_clear()
+        self.addCleanup(converter._warn_without_olefile.cache_clear)
+
+        with patch.object(converter, "olefile", None), \
+                self.assertLogs(converter.LOGGER_NAME, level="WARNING") as logs:
+            self.assertIsNone(self.reason("a.doc"))
+            self.assertIsNone(self.reason("b.doc"))
+
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn("olefile", logs.output[0])
+
+    def test_encrypted_legacy_files(self):
+        def ole_with(streams):
+            ole = MagicMock()
+            ole.__enter__.return_value = ole
+            ole.exists.side_effect = lambda name: name in streams
+            ole.openstream.side_effect = lambda name: io.BytesIO(streams[name])
+            return MagicMock(OleFileIO=MagicMock(return_value=ole))
+
+        bof = (0x0809).to_bytes(2, "little") + (16).to_bytes(2, "little") + b"\0" * 16
+        filepass = (0x002F).to_bytes(2, "little") + (4).to_bytes(2, "little") + b"\0" * 4
+        fib = b"\xec\xa5" + b"\0" * 8 + (0x0100).to_bytes(2, "little")
+        cases = [
+            ("book.xls", {"Workbook": bof + filepass}, "encrypted"),
+            ("plain.xls", {"Workbook": bof}, None),
+            ("memo.doc", {"WordDocument": fib}, "encrypted"),
+            ("deck.ppt", {"PowerPoint Document": b"", "EncryptedSummary": b""}, "encrypted"),
+            ("wrong.doc", {"Workbook": bof}, "mismatch"),
+        ]
+        for name, streams, expected in cases:
+            (self.folder / name).write_bytes(converter.OLE_MAGIC + b"\0" * 504)
+            with self.subTest(name), patch.object(converter, "olefile", ole_with(streams)):
+                self.assertEqual(self.reason(name), expected)
+
+    def test_rejected_files_never_start_office(self):
+        backend = fake_office.FakeOffice()
+        fake_office.write_ole(self.folder / "secret.docx", ["EncryptionInfo", "EncryptedPackage"])
+        (self.folder / "broken.docx").write_bytes(b"")
+        with patch.object(converter.win32com.client, "Dispatch", backend), \
+                patch.object(converter, "olefile", None):
+            stats = converter.convert_word_to_pdf(self.folder, None, logging.getLogger("test"))
+
+        self.assertEqual(stats['rejected'], 2)
+        self.assertEqual(stats['encrypted'], 1)
+        self.assertEqual(stats['corrupt'], 1)
+        self.assertEqual(stats['error'], 0)
+        self.assertEqual(backend.dispatch_count, 0)
+        self.assertTrue((self.folder / "secret.docx").exists())
+
+
+class TestHistoryScheduling(FakeOfficeTestCase):
+    def setUp(self):
+        super().setUp()
+        self.history = converter.ConversionHistory(Path(self.tmp.name) / converter.HISTORY_FILE_NAME)
+        self.addCleanup(self.history.close)
+
+    def test_estimator(self):
+        estimator = converter.RunTimeEstimator([
+            ("ppt", "a.pptx", 1000, 2.0),
+            ("ppt", "b.pptx", 3000, 4.0),
+            ("word", "c.docx", 500, 1.5),
+        ])
+        # Same name and size: the recorded time
+        self.assertEqual(estimator.estimate("ppt", "a.pptx", 1000), 2.0)
+        # Otherwise a linear fit on size within the format
+        self.assertAlmostEqual(estimator.estimate("ppt", "new.pptx", 2000), 3.0)
+        # A single size falls back to the median
+        self.assertEqual(estimator.estimate("word", "d.docx", 9000), 1.5)
+        # Formats without history use the model over all formats
+        self.assertFalse(estimator.has_history("excel"))
+        self.assertGreater(estimator.estimate("excel", "e.xlsx", 1000), 0)
+
+    @unittest.skipUnless(converter.pypdf, "pypdf is not installed")
+    def test_history_reads_pages_from_the_pdf_without_extra_com_calls(self):
+        fake_office.write_document(self.folder / "memo.docx", {"pages": 7})
+
+        with patch.object(fake_office.FakeDocument, "ComputeStatistics") as statistics:
+            converter.convert_word_to_pdf(self.folder, None, self.logger, history=self.history)
+
+        statistics.assert_not_called()
+        rows = list(self.history.conn.execute("SELECT source_name, pages FROM history"))
+        self.assertEqual(rows, [("memo.docx", 7)])
+
+    def test_partition_longest_first_balances_load(self):
+        chunks = converter.partition_longest_first([2, 5, 3, 6, 2, 4], 2, lambda d: d)
+        self.assertEqual([total for total, _ in chunks], [11, 11])
+        self.assertEqual([chunk for _, chunk in chunks], [[6, 3, 2], [5, 4, 2]])
+        self.assertEqual(converter.makespan([2, 5, 3, 6, 2, 4], 3), 8)
+
+    def test_history_is_recorded_and_drives_schedule(self):
+        fake_office.write_document(self.folder / "big.pptx", {"pages": 40}, padding=50000)
+        fake_office.write_document(self.folder / "small.pptx", {"pages": 1})
+        converter.convert_ppt_to_pdf(self.folder, None, self.logger, history=self.history)
+
+        rows = dict(self.history.conn.execute("SELECT source_name, pages FROM history"))
+        # Page counts come from the exported PDF, which needs pypdf
+        pages = (40, 1) if converter.pypdf else (None, None)
+        self.assertEqual(rows, {"big.pptx": pages[0], "small.pptx": pages[1]})
+
+        with patch.object(converter.RunTimeEstimator, "estimate_file",
+                          lambda self, kind, f: {"a": 1.0, "b": 9.0, "c": 2.0, "d": 30.0}[f]):
+            tasks = converter.schedule_chunks({"ppt": ["a", "b", "c"], "word": ["d"]}, 2,
+                                              self.history.estimator())
+        # PowerPoint is never split across workers; its single chunk is still ordered longest first
+        self.assertEqual([(kind, chunk) for kind, chunk, _ in tasks],
+                         [("word", ["d"]), ("ppt", ["b", "c", "a"])])
+
+        tasks = converter.schedule_chunks({"ppt": ["a", "b", "c"], "excel": ["x", "y", "z"]}, 2)
+        self.assertEqual([(kind, len(chunk)) for kind, chunk, _ in tasks], [("ppt", 3), ("excel", 2), ("excel", 1)])
+
+    def test_plan_does_not_convert(self):
+        self.history.record("ppt", "deck.pptx", 1234, 42.0, "success")
+        (self.folder / "deck.pptx").write_bytes(b"\0" * 1234)
+        fake_office.write_document(self.folder / "memo.docx")
+
+        with self.assertLogs("test", level="INFO") as logs:
+            plan = converter.plan_run(self.folder, None, self.logger, self.history, workers=2)
+
+        self.assertEqual(plan["ppt"]["seconds"], 42.0)
+        self.assertFalse(plan["word"]["history"])
+        self.assertTrue(any("42秒" in line for line in logs.output))
+        self.assertEqual(self.backend.dispatch_count, 0)
+        self.assertTrue((self.folder / "deck.pptx").exists())
+
+
+class TestStreamingApi(FakeOfficeTestCase):
+    def test_events_for_explicit_paths(self):
+        paths = [self.folder / "a.pptx", self.folder / "b.docx", self.folder / "notes.txt"]
+        fake_office.write_document(paths[0], {"pages": 2})
+        fake_office.write_document(paths[1], {"fail": "Document is corrupt"})
+        paths[2].write_text("ignored")
+        fake_office.write_document(self.folder / "not-listed.pptx")
+
+        events = list(converter.convert_folder(paths, logger=self.logger, pipeline=True))
+
+        by_path = {}
+        for event in events[:-1]:
+            by_path.setdefault(event.path.name, []).append(event.type)
+        self.assertEqual(by_path, {"a.pptx": ["queued", "started", "succeeded"],
+                                   "b.docx": ["queued", "started", "failed"]})
+        done = [e for e in events if e.type == "succeeded"][0]
+        self.assertEqual(done.pdf_path, str((self.folder / "a.pdf").resolve()))
+        self.assertIn("export", done.phases)
+        self.assertIn("corrupt", [e for e in events if e.type == "failed"][0].error)
+        self.assertEqual(events[-1].type, "finished")
+        self.assertEqual(events[-1].stats['ppt']['success'], 1)
+        self.assertFalse((self.folder / "not-listed.pdf").exists())
+
+    def test_success_is_reported_after_the_pdf_is_committed(self):
+        fake_office.write_document(self.folder / "a.docx")
+        fake_office.write_document(self.folder / "b.pptx")
+
+        def commit(tmp_path, pdf_path):
+            if pdf_path.endswith("b.pdf"):
+                raise OSError("disk full")
+            time.sleep(0.2)  # a slow rename on a network share
+            os.replace(tmp_path, pdf_path)
+
+        events, committed = [], []
+        with patch("converter.commit_output", side_effect=commit):
+            for event in converter.convert_folder(self.folder, logger=self.logger):
+                events.append(event)
+                if event.type == "succeeded":
+                    committed.append(Path(event.pdf_path).exists())
+
+        self.assertEqual(committed, [True])
+        failed = [e for e in events if e.type == "failed"]
+        self.assertEqual([e.path.name for e in failed], ["b.pptx"])
+        self.assertIn("disk full", failed[0].error)
+        self.assertEqual(events[-1].stats['ppt']['error'], 1)
+
+    def test_stop_event_ends_after_current_file(self):
+        for name in ["a.docx", "b.docx", "c.docx"]:
+            fake_office.write_document(self.folder / name)
+        self.backend.open_latency = 0.2
+        stop = threading.Event()
+
+        types = []
+        for event in converter.convert_folder(self.folder, logger=self.logger, stop_event=stop):
+            types.append(event.type)
+            if event.type == "succeeded":
+                stop.set()
+
+        # The file already being converted when stop was requested still completes
+        self.assertLessEqual(types.count("succeeded"), 2)
+        self.assertEqual(len(list(self.folder.glob("*.docx"))), 3 - types.count("succeeded"))
+        self.assertEqual(types[-1], "finished")
+        self.assertTrue(self.backend.apps[0].quit_called)
+
+    def test_runner_thread_initializes_com(self):
+        fake_office.write_document(self.folder / "a.docx")
+        fake_office.write_document(self.folder / "b.pptx")
+        com = fake_office.FakeComApartments()
+        self.backend.com = com
+
+        with patch.object(converter, "pythoncom", com):
+            events = list(converter.convert_folder(self.folder, logger=self.logger))
+
+        self.assertEqual(events[-1].stats['word']['success'], 1)
+        self.assertEqual(events[-1].stats['ppt']['success'], 1)
+        self.assertEqual(len(self.backend.apps), 2)
+
+    def test_worker_events_are_routed_to_on_event(self):
+        received = []
+        router = converter._LogRouter(self.logger, received.append)
+        event = converter.ConversionEvent("started", "ppt", Path("a.pptx"))
+        record = logging.makeLogRecord({"name": converter.EVENT_LOGGER_NAME, "event": event})
+
+        router.handle(record)
+
+        self.assertEqual(received, [event])
+
+
+class TestLeaseQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.folder = Path(self.tmp.name) / "in"
+        self.folder.mkdir()
+        self.lease_dir = Path(self.tmp.name) / "leases"
+
+    def host(self, name, ttl=60):
+        leases = converter.LeaseQueue(self.lease_dir, root=self.folder, host=name, ttl=ttl)
+        self.addCleanup(leases.close)
+        return leases
+
+    def test_only_one_host_holds_a_lease(self):
+        a, b = self.host("a"), self.host("b")
+        path = self.folder / "deck.pptx"
+        path.write_bytes(b"v1")
+
+        key = a.claim(path)
+        self.assertIsNotNone(key)
+        self.assertIsNone(b.claim(path))
+
+        a.complete(key, 'success')
+        # Recorded as finished: nobody picks up the same content again
+        self.assertIsNone(b.claim(path))
+        self.assertIsNone(a.claim(path))
+        # A new version of the file is new work
+        path.write_bytes(b"version 2")
+        self.assertIsNotNone(b.claim(path))
+
+    def test_released_lease_is_not_recorded_as_done(self):
+        a, b = self.host("a"), self.host("b")
+        path = self.folder / "deck.pptx"
+        path.write_bytes(b"v1")
+
+        a.release(a.claim(path))
+        self.assertIsNotNone(b.claim(path))
+
+    def test_expired_lease_is_taken_over(self):
+        a, b = self.host("a"), self.host("b")
+        path = self.folder / "deck.pptx"
+        path.write_bytes(b"v1")
+        key = a.claim(path)
+
+        # Host a stopped renewing two minutes ago
+        lease = self.lease_dir / (key + ".lease")
+        old = time.time() - 120
+        os.utime(lease, (old, old))
+
+        self.assertEqual(b.claim(path), key)
+        # The late host must not drop the lease it lost
+        a.release(key)
+        self.assertTrue(lease.exists())
+        b.complete(key, 'success')
+        self.assertFalse(lease.exists())
+
+    def test_keys_are_relative_to_the_shared_root(self):
+        other_mount = Path(self.tmp.name) / "mnt"
+        (other_mount / "sub").mkdir(parents=True)
+        a = converter.LeaseQueue(self.lease_dir, root=self.folder)
+        b = converter.LeaseQueue(self.lease_dir, root=other_mount)
+        self.assertEqual(a.key(self.folder / "sub" / "x.docx"), b.key(other_mount / "sub" / "x.docx"))
+
+
+class TestJournal(FakeOfficeTestCase):
+    def setUp(self):
+        super().setUp()
+        self.journal = converter.setup_journal(Path(self.tmp.name))
+        journal_logger = logging.getLogger(converter.JOURNAL_LOGGER_NAME)
+        self.addCleanup(journal_logger.handlers.clear)
+        for handler in journal_logger.handlers:
+            self.addCleanup(handler.close)
+
+    def states(self):
+        records = []
+        with open(self.journal, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    pass  # the line cut off by the simulated crash
+        return [(Path(r["file"]).name, r["state"]) for r in records]
+
+    def test_records_each_transition(self):
+        fake_office.write_document(self.folder / "a.docx", {"pages": 1})
+        fake_office.write_document(self.folder / "b.docx", {"fail": "Document is corrupt"})
+
+        converter.convert_serial(self.folder, self.output, self.logger)
+
+        states = self.states()
+        self.assertEqual([s for name, s in states if name == "a.docx"], ["queued", "claimed", "exported", "moved"])
+        self.assertEqual([s for name, s in states if name == "b.docx"], ["queued", "claimed", "finished"])
+        self.assertEqual(converter.replay_journal(self.journal, self.logger), [])
+
+    def test_replay_finishes_moves_and_requeues_interrupted_files(self):
+        names = ["exported.docx", "claimed.docx", "queued.docx", "failed.docx"]
+        for name in names:
+            fake_office.write_document(self.folder / name, {"pages": 1})
+        pdf = {name: str(self.output / name.replace(".docx", ".pdf")) for name in names}
+        Path(pdf["exported.docx"]).write_bytes(fake_office.placeholder_pdf())
+        Path(converter.partial_pdf_path(pdf["claimed.docx"])).write_bytes(b"%PDF-1.4 trunc")
+        # The journal as a crashed run left it, the last line cut off mid-write
+        lines = [{"state": "queued", "file": str(self.folder / name)} for name in names]
+        lines += [
+            {"state": "claimed", "file": str(self.folder / "exported.docx"), "pdf": pdf["exported.docx"]},
+            {"state": "exported", "file": str(self.folder / "exported.docx"), "pdf": pdf["exported.docx"]},
+            {"state": "claimed", "file": str(self.folder / "failed.docx"), "pdf": pdf["failed.docx"]},
+            {"state": "finished", "file": str(self.folder / "failed.docx"), "outcome": "error"},
+            {"state": "claimed", "file": str(self.folder / "claimed.docx"), "pdf": pdf["claimed.docx"]},
+        ]
+        with open(self.journal, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(line) + "\n" for line in lines)
+            f.write('{"state": "exported", "file": ')
+        for handler in logging.getLogger(converter.JOURNAL_LOGGER_NAME).handlers:
+            handler.close()
+        converter.setup_journal(Path(self.tmp.name), resume=True)
+
+        pending = converter.replay_journal(self.journal, self.logger)
+
+        self.assertEqual([p.name for p in pending], ["claimed.docx", "queued.docx"])
+        self.assertTrue((self.folder / "done" / "exported.docx").exists())
+        self.assertFalse(os.path.exists(converter.partial_pdf_path(pdf["claimed.docx"])))
+        states = self.states()
+        self.assertEqual(states[:len(lines)], [(Path(l["file"]).name, l["state"]) for l in lines])
+        self.assertIn(("exported.docx", "moved"), states)
+
+        results = converter.convert_serial(None, self.output, self.logger, paths=pending)
+        self.assertEqual(results['word']['success'], 2)
+        self.assertEqual(sorted(r["file"] for r in self.backend.records), ["claimed.docx", "queued.docx"])
+
+
+class TestFailureRegistry(FakeOfficeTestCase):
+    def registry(self, **options):
+        failures = converter.FailureRegistry(Path(self.tmp.name) / converter.FAILURES_FILE_NAME, **options)
+        self.addCleanup(failures.close)
+        return failures
+
+    def run_once(self, failures):
+        self.backend.records.clear()
+        return converter.convert_serial(self.folder, None, self.logger, failures=failures)['word']
+
+    def test_failed_content_waits_for_backoff(self):
+        fake_office.write_document(self.folder / "broken.docx", {"fail": "Document is corrupt"})
+        failures = self.registry(retry_after=3600)
+
+        self.assertEqual(self.run_once(failures)['error'], 1)
+        category, attempts, retry_at = failures.lookup(converter.file_hash(self.folder / "broken.docx"))
+        self.assertEqual((category, attempts), ("FakeComError", 1))
+        self.assertGreater(retry_at, time.time() + 3000)
+
+        # Healthy files are never hashed: no failure of their size is on record
+        fake_office.write_document(self.folder / "ok.docx", {"pages": 1}, padding=4096)
+        with patch("converter.file_hash", wraps=converter.file_hash) as hashed:
+            stats = self.run_once(failures)
+        self.assertEqual(stats['backoff'], 1)
+        self.assertEqual(stats['success'], 1)
+        self.assertEqual([r["file"] for r in self.backend.records], ["ok.docx"])
+        self.assertEqual([Path(c.args[0]).name for c in hashed.call_args_list], ["broken.docx"])
+
+    def test_repeated_failures_are_quarantined(self):
+        fake_office.write_document(self.folder / "broken.docx", {"fail": "Document is corrupt"})
+        broken = (self.folder / "broken.docx").read_bytes()
+        failures = self.registry(quarantine_after=2, retry_after=0)
+
+        self.assertEqual(self.run_once(failures)['quarantined'], 0)
+        stats = self.run_once(failures)
+        self.assertEqual(stats['error'], 1)
+        self.assertEqual(stats['quarantined'], 1)
+        self.assertTrue((self.folder / "quarantine" / "broken.docx").exists())
+        self.assertEqual(self.run_once(failures), converter.new_stats())
+
+        # The same content dropped in again goes straight to quarantine without opening Office
+        (self.folder / "copy.docx").write_bytes(broken)
+        stats = self.run_once(failures)
+        self.assertEqual(stats['quarantined'], 1)
+        self.assertEqual(self.backend.records, [])
+        self.assertTrue((self.folder / "quarantine" / "copy.docx").exists())
+
+    def test_office_crash_is_not_counted_against_the_document(self):
+        fake_office.write_document(self.folder / "a.docx", {"crash": True})
+        fake_office.write_document(self.folder / "b.docx", {"pages": 1})
+        failures = self.registry(quarantine_after=1, retry_after=3600)
+
+        stats = self.run_once(failures)
+
+        self.assertEqual(stats['error'], 1)
+        self.assertEqual(stats['recycle'], 1)
+        # The next file runs on a fresh instance instead of inheriting the dead one
+        self.assertEqual(stats['success'], 1)
+        self.assertEqual(stats['quarantined'], 0)
+        self.assertIsNone(failures.lookup(converter.file_hash(self.folder / "a.docx")))
+
+    def test_success_clears_the_record(self):
+        path = self.folder / "flaky.docx"
+        fake_office.write_document(path, {"pages": 1})
+        failures = self.registry(retry_after=0)
+        content_hash = converter.file_hash(path)
+        failures.record(content_hash, path.name, path.stat().st_size, "com_error", "RPC server unavailable")
+
+        self.assertEqual(self.run_once(failures)['success'], 1)
+        self.assertIsNone(failures.lookup(content_hash))
+
+
+class TestExportProfiles(FakeOfficeTestCase):
+    def options_by_kind(self):
+        return {record["kind"]: record.get("options") for record in self.backend.records}
+
+    def test_profile_options_reach_each_format(self):
+        fake_office.write_document(self.folder / "deck.pptx")
+        fake_office.write_document(self.folder / "book.xlsx")
+        fake_office.write_document(self.folder / "memo.docx")
+
+        converter.convert_serial(self.folder, self.output, self.logger,
+                                 profile=converter.EXPORT_PROFILES["screen"])
+
+        options = self.options_by_kind()
+        self.assertEqual(options["ppt"]["Intent"], converter.ppFixedFormatIntentScreen)
+        self.assertFalse(options["ppt"]["DocStructureTags"])
+        self.assertEqual(options["excel"]["Quality"], converter.xlQualityMinimum)
+        self.assertFalse(options["excel"]["IncludeDocProperties"])
+        self.assertEqual(options["word"]["OptimizeFor"], converter.wdExportOptimizeForOnScreen)
+        self.assertFalse(options["word"]["UseISO19005_1"])
+        for name in ("deck.pdf", "book.pdf", "memo.pdf"):
+            self.assertTrue((self.output / name).exists())
+
+    def test_archive_requests_pdfa(self):
+        fake_office.write_document(self.folder / "memo.docx")
+
+        converter.convert_serial(self.folder, self.output, self.logger,
+                                 profile=converter.EXPORT_PROFILES["archive"])
+
+        options = self.options_by_kind()["word"]
+        self.assertTrue(options["UseISO19005_1"])
+        self.assertEqual(options["OptimizeFor"], converter.wdExportOptimizeForPrint)
+
+    def test_without_profile_default_export_is_used(self):
+        fake_office.write_document(self.folder / "memo.docx")
+
+        converter.convert_serial(self.folder, self.output, self.logger)
+
+        self.assertIsNone(self.options_by_kind()["word"])
+
+    def test_profile_is_part_of_the_cache_key(self):
+        cache = converter.ConversionCache(self.output / converter.CACHE_FILE_NAME)
+        self.addCleanup(cache.close)
+
+        def run(profile):
+            # converted sources move to done, so every run re-sends the same content
+            fake_office.write_document(self.folder / "memo.docx", {"id": "same"})
+            return converter.convert_word_to_pdf(self.folder, self.output, self.logger, cache=cache,
+                                                 profile=profile)
+
+        self.assertEqual(run(converter.EXPORT_PROFILES["print"])['success'], 1)
+        self.assertEqual(run(converter.EXPORT_PROFILES["print"])['skip'], 1)
+        # Same source, different quality: the stored PDF does not match and is regenerated
+        self.assertEqual(run(converter.EXPORT_PROFILES["screen"])['success'], 1)
+        self.assertEqual(len(self.backend.records), 2)
+
+
+class TestMetrics(FakeOfficeTestCase):
+    @staticmethod
+    def sample(text, name):
+        match = re.search(rf"^{re.escape(name)} (\S+)$", text, re.MULTILINE)
+        return float(match.group(1)) if match else None
+
+    def test_events_drive_counters_gauges_and_histogram(self):
+        for name in ("a.docx", "b.docx", "c.docx"):
+            fake_office.write_document(self.folder / name, {"pages": 1})
+        fake_office.write_document(self.folder / "d.docx", {"fail": "Document is corrupt"})
+        metrics = converter.ConversionMetrics()
+        recycle = {"word": converter.RecyclePolicy(max_documents=2)}
+
+        for event in converter.convert_folder(self.folder, None, self.logger, recycle=recycle):
+            metrics.observe(event)
+
+        text = metrics.render()
+        self.assertEqual(self.sample(text, 'pdfconv_files_total{format="word",outcome="success"}'), 3)
+        self.assertEqual(self.sample(text, 'pdfconv_files_total{format="word",outcome="error"}'), 1)
+        self.assertEqual(self.sample(text, 'pdfconv_queue_depth{format="word"}'), 0)
+        self.assertEqual(self.sample(text, 'pdfconv_in_flight{format="word"}'), 0)
+        self.assertEqual(self.sample(text, 'pdfconv_office_restarts_total{format="word"}'), 1)
+        self.assertEqual(self.sample(text, 'pdfconv_conversion_seconds_count{format="word"}'), 4)
+        self.assertEqual(self.sample(text, 'pdfconv_conversion_seconds_bucket{format="word",le="+Inf"}'), 4)
+        self.assertEqual(self.sample(text, 'pdfconv_throughput_files_per_minute'), 4)
+        self.assertIn("# TYPE pdfconv_conversion_seconds histogram", text)
+
+    def test_queued_and_started_files_are_visible_while_running(self):
+        metrics = converter.ConversionMetrics()
+        for name in ("a.pptx", "b.pptx"):
+            metrics.observe(converter.ConversionEvent('queued', 'ppt', Path(name)))
+        metrics.observe(converter.ConversionEvent('started', 'ppt', Path("a.pptx")))
+
+        text = metrics.render()
+        self.assertEqual(self.sample(text, 'pdfconv_queue_depth{format="ppt"}'), 1)
+        self.assertEqual(self.sample(text, 'pdfconv_in_flight{format="ppt"}'), 1)
+        self.assertEqual(self.sample(text, 'pdfconv_last_completion_timestamp_seconds'), 0)
+
+    def test_exporter_serves_http_and_writes_textfile(self):
+        metrics = converter.ConversionMetrics()
+        metrics.observe(converter.ConversionEvent('queued', 'excel', Path("book.xlsx")))
+        textfile = Path(self.tmp.name) / "pdfconv.prom"
+        exporter = converter.MetricsExporter(metrics, port=0, textfile=str(textfile), interval=60)
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{exporter.port}/metrics") as response:
+                body = response.read().decode("utf-8")
+            self.assertEqual(self.sample(body, 'pdfconv_queue_depth{format="excel"}'), 1)
+            with self.assertRaises(urllib.error.HTTPError):
+                urllib.request.urlopen(f"http://127.0.0.1:{exporter.port}/other")
+        finally:
+            exporter.close()
+
+        # The final values are written on close even before the first interval elapses
+        self.assertEqual(self.sample(textfile.read_text(encoding="utf-8"),
+                                     'pdfconv_queue_depth{format="excel"}'), 1)
+        self.assertFalse(Path(f"{textfile}.tmp").exists())
+
+
+class TestComProfiler(FakeOfficeTestCase):
+    def test_com_calls_are_counted_per_site_and_document(self):
+        # Legacy .xls is not pre-scanned, so every sheet is inspected over COM
+        fake_office.write_document(self.folder / "book.xls", {"sheets": [
+            {"name": "A"}, {"name": "B", "visible": False}, {"name": "C"}]})
+        office = converter.ExcelApp(self.logger)
+        batch = converter.BatchConverter(office, None, self.logger, com_profile=True, preflight=False)
+
+        self.assertEqual(batch.convert(self.folder / "book.xls"), 'success')
+        details = dict(office.details)
+        with self.assertLogs("test", level="INFO") as logs:
+            batch.close()
+
+        sites = batch.profiler.sites
+        self.assertEqual(sites[("Excel.Workbooks.Open", "call")][0], 1)
+        self.assertEqual(sites[("Excel.Workbooks.Open().Worksheets[]", "next")][0], 4)  # 3 sheets + end
+        self.assertEqual(sites[("Excel.Workbooks.Open().Worksheets[].Visible", "get")][0], 3)
+        self.assertEqual(sites[("Excel.DisplayAlerts", "set")][0], 2)  # configure and restore
+        self.assertGreater(details["com_calls"], 10)
+        self.assertEqual(batch.profiler.documents[0][0], "book.xls")
+        self.assertTrue((self.folder / "book.pdf").exists())
+        self.assertTrue(any("[COMプロファイル] Excel" in line for line in logs.output))
+
+    def test_proxy_is_transparent(self):
+        profiler = converter.ComProfiler()
+        target = MagicMock()
+        target.Name = "Sheet1"
+        target.Item.return_value.Value = 3
+        target.Fail.side_effect = RuntimeError("com_error")
+        proxy = converter.ComProxy(target, profiler, "App")
+
+        self.assertEqual(proxy.Name, "Sheet1")
+        self.assertEqual(proxy.Item(1).Value, 3)
+        proxy.Visible = False
+        self.assertFalse(target.Visible)
+        with self.assertRaises(RuntimeError):
+            proxy.Fail()
+        # Proxies passed back into COM are unwrapped
+        other = converter.ComProxy(target.Other, profiler, "App.Other")
+        proxy.Use(other)
+        target.Use.assert_called_with(target.Other)
+
+        self.assertEqual(profiler.sites[("App.Item", "call")][0], 1)
+        self.assertEqual(profiler.sites[("App.Item().Value", "get")][0], 1)
+        self.assertEqual(profiler.sites[("App.Visible", "set")][0], 1)
+        self.assertEqual(profiler.sites[("App.Fail", "call")][0], 1)
+
+    def test_python_profile_is_reported(self):
+        fake_office.write_document(self.folder / "memo.docx")
+        with self.assertLogs("test", level="INFO") as logs:
+            converter.convert_word_to_pdf(self.folder, None, self.logger, python_profile=True)
+        self.assertTrue(any("[Pythonプロファイル] Word" in line for line in logs.output))
+
+
+class TestSessionTuning(FakeOfficeTestCase):
+    backend_options = {"word_addins": ("Startup.dotm",)}
+
+    def test_excel_session_is_tuned_and_restored(self):
+        office = converter.ExcelApp(self.logger)
+        office.start()
+        app = office.app
+
+        self.assertFalse(app.EnableEvents)
+        self.assertFalse(app.ScreenUpdating)
+        self.assertEqual(app.AutomationSecurity, converter.msoAutomationSecurityForceDisable)
+        # Manual calculation changes what gets exported, so it is opt-in
+        self.assertEqual(app.Calculation, fake_office.XL_CALCULATION_AUTOMATIC)
+        self.assertEqual(app.Workbooks.opened, [])
+
+        office.quit()
+        self.assertTrue(app.EnableEvents)
+        self.assertTrue(app.ScreenUpdating)
+        self.assertTrue(app.DisplayAlerts)
+        self.assertEqual(app.AutomationSecurity, 1)
+
+    def test_manual_calculation_is_opt_in_and_restored(self):
+        office = converter.ExcelApp(self.logger)
+        office.manual_calculation = True
+        office.start()
+        app = office.app
+
+        self.assertEqual(app.Calculation, fake_office.XL_CALCULATION_MANUAL)
+        holder = app.Workbooks.opened[0]
+        self.assertFalse(holder.closed)
+
+        office.quit()
+        self.assertEqual(app.Calculation, fake_office.XL_CALCULATION_AUTOMATIC)
+        self.assertTrue(holder.closed)
+
+    def test_settings_that_change_output_are_part_of_cache_key(self):
+        keys = set()
+        for tune_session, manual_calculation in [(True, False), (False, False), (True, True)]:
+            office = converter.ExcelApp(self.logger)
+            converter.BatchConverter(office, None, self.logger, tune_session=tune_session,
+                                     manual_calculation=manual_calculation)
+            keys.add(office.settings_key())
+        self.assertEqual(len(keys), 3)
+        self.assertEqual(converter.ExcelApp(self.logger).settings_key(), f"excel:v{converter.CACHE_VERSION}")
+
+    def test_untuned_session_only_applies_required_settings(self):
+        office = converter.ExcelApp(self.logger)
+        office.tune_session = False
+        office.start()
+        app = office.app
+
+        self.assertFalse(app.DisplayAlerts)
+        self.assertFalse(app.AskToUpdateLinks)
+        self.assertTrue(app.ScreenUpdating)
+        self.assertEqual(app.Calculation, fake_office.XL_CALCULATION_AUTOMATIC)
+        self.assertEqual(app.Workbooks.opened, [])
+        office.quit()
+
+    def test_word_options_and_addins_are_restored(self):
+        office = converter.WordApp(self.logger)
+        office.start()
+        app = office.app
+
+        self.assertFalse(app.Options.Pagination)
+        self.assertFalse(app.Options.BackgroundSave)
+        self.assertFalse(app.AddIns[0].Installed)
+
+        office.quit()
+        # Word keeps Options in the user's profile, so leaving them changed would outlive the run
+        self.assertTrue(app.Options.Pagination)
+        self.assertTrue(app.Options.BackgroundSave)
+        self.assertTrue(app.AddIns[0].Installed)
+        self.assertFalse(app.Visible)
+
+    def test_unsupported_setting_is_skipped(self):
+        office = converter.PowerPointApp(self.logger)
+        office.start()
+
+        self.assertFalse(office.apply_setting("Options.Pagination", False))
+        self.assertEqual(office.app.DisplayAlerts, converter.ppAlertsNone)
+        office.quit()
+
+
+class TestComLifecycle(FakeOfficeTestCase):
+    def test_collection_follows_policy_and_is_counted(self):
+        for i in range(5):
+            fake_office.write_document(self.folder / f"memo{i}.docx", {"id": i})
+
+        with patch("converter.gc.collect") as collect:
+            stats = converter.convert_word_to_pdf(self.folder, None, self.logger,
+                                                  gc_policy=converter.GcPolicy(every=2, heap_blocks=0))
+
+        self.assertEqual(stats['success'], 5)
+        # After the 2nd and 4th document, then once at Quit for the 5th
+        self.assertEqual(collect.call_count, 3)
+        self.assertEqual(stats['gc'], 3)
+        self.assertGreaterEqual(stats['gc_seconds'], 0.0)
+
+    def test_heap_growth_triggers_collection(self):
+        with patch("converter.python_heap_blocks", side_effect=[1000, 1100, 2000, 2000, 2100]), \
+                patch("converter.gc.collect") as collect:
+            lifecycle = converter.ComLifecycle(converter.GcPolicy(every=0, heap_blocks=500))
+            lifecycle.document_closed()  # +100 blocks
+            lifecycle.document_closed()  # +1000 blocks: collected, new baseline 2000
+            lifecycle.document_closed()  # +100 blocks
+
+        self.assertEqual(collect.call_count, 1)
+        self.assertEqual(lifecycle.drain()[0], 1)
+        self.assertEqual(lifecycle.pending, 1)
+
+    def test_closed_document_is_released_without_collection(self):
+        fake_office.write_document(self.folder / "deck.pptx", {"pages": 2})
+        opened = []
+        original_open = fake_office.FakePresentations.Open
+
+        def open_presentation(presentations, path, **options):
+            deck = original_open(presentations, path, **options)
+            opened.append(weakref.ref(deck))
+            return deck
+
+        gc_was_enabled = converter.gc.isenabled()
+        converter.gc.disable()
+        self.addCleanup(lambda: converter.gc.enable() if gc_was_enabled else None)
+        office = converter.PowerPointApp(self.logger)
+        office.lifecycle.policy = converter.GcPolicy(every=0, heap_blocks=0)
+        with patch.object(fake_office.FakePresentations, "Open", open_presentation), \
+                patch("converter.gc.collect") as collect:
+            office.start()
+            office.export(str(self.folder / "deck.pptx"), str(self.folder / "deck.pdf"))
+
+            # Reference counting alone released the presentation
+            collect.assert_not_called()
+            self.assertIsNone(opened[0]())
+            self.assertEqual(office.lifecycle.pending, 1)
+            office.quit()
+        # Quitting with closed documents pending collects once before a new instance could start
+        collect.assert_called_once()
+
+
+class TestConversionCache(unittest.TestCase):
+    def setUp(self):
+        self.mock_dispatch = converter.win32com.client.Dispatch
+        self.mock_dispatch.reset_mock()
+        self.mock_dispatch.side_effect = None
+        self.mock_app = MagicMock()
+        self.mock_dispatch.return_value = self.mock_app
+        # SaveAs writes a real PDF so that the cache can find it later
+        deck = self.mock_app.Presentations.Open.return_value
+        deck.SaveAs.side_effect = lambda path, fmt: Path(path).write_bytes(b"%PDF-1.4")
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = Path(self.tmp.name) / "in"
+        self.output = Path(self.tmp.name) / "out"
+        self.folder.mkdir()
+        self.output.mkdir()
+        self.cache = converter.ConversionCache(self.output / converter.CACHE_FILE_NAME)
+        self.logger = logging.getLogger("test")
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp.cleanup()
+
+    def convert(self):
+        return converter.convert_ppt_to_pdf(self.folder, self.output, self.logger, cache=self.cache)
+
+    def test_duplicates_are_copied_instead_of_converted(self):
+        fake_office.write_document(self.folder / "a.pptx", {"id": "same"})
+        fake_office.write_document(self.folder / "b.pptx", {"id": "same"})
+
+        stats = self.convert()
+
+        self.assertEqual(stats['success'], 2)
+        self.assertEqual(stats['duplicate'], 1)
+        self.assertEqual(self.mock_app.Presentations.Open.call_count, 1)
+        self.assertTrue((self.output / "a.pdf").exists())
+        self.assertTrue((self.output / "b.pdf").exists())
+
+    def test_unchanged_source_is_skipped_and_changed_source_reconverted(self):
+        fake_office.write_document(self.folder / "a.pptx", {"id": "v1"})
+        self.convert()
+
+        # Same content re-sent: skipped
+        fake_office.write_document(self.folder / "a.pptx", {"id": "v1"})
+        stats = self.convert()
+        self.assertEqual(stats['skip'], 1)
+        self.assertEqual(self.mock_app.Presentations.Open.call_count, 1)
+
+        # Content changed: the existing PDF is stale and gets reconverted
+        fake_office.write_document(self.folder / "a.pptx", {"id": "v2"})
+        stats = self.convert()
+        self.assertEqual(stats['success'], 1)
+        self.assertEqual(self.mock_app.Presentations.Open.call_count, 2)
+
+    def test_existing_pdf_without_record_is_adopted(self):
+        fake_office.write_document(self.folder / "a.pptx", {"id": "v1"})
+        (self.output / "a.pdf").write_bytes(b"%PDF-1.4")
+
+        stats = self.convert()
+
+        self.assertEqual(stats['skip'], 1)
+        self.mock_app.Presentations.Open.assert_not_called()
+        self.assertIsNotNone(self.cache.lookup(str((self.output / "a.pdf").resolve())))
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file